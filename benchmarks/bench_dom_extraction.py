@@ -0,0 +1,126 @@
+import os
+import statistics
+import sys
+import time
+
+from playwright._impl._connection import Connection
+from playwright.sync_api import sync_playwright
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from html_playwright.dom_extraction import extract_company_listings, extract_sub_page  # noqa: E402
+
+SITE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "sample_data",
+                              "site")
+REPEATS = 50
+
+
+def element_by_element_listings(page):
+    # The original listing extraction, one protocol call per element and per text
+    company_table = page.query_selector("//*[@id='content']/div[2]/div/div/div[2]/ul")
+    data = []
+    for row in company_table.query_selector_all("li.items-center"):
+        parts = row.query_selector_all("span.flex-1")
+        if len(parts) > 4:
+            link_element = parts[0].query_selector("a")
+            portfolio_exit = parts[5].text_content() if len(parts) > 5 else None
+            data.append({
+                "title": parts[0].text_content().strip(),
+                "sector": parts[1].text_content().strip(),
+                "country": parts[2].text_content().strip(),
+                "fund": parts[3].text_content().strip(),
+                "entry": parts[4].text_content().strip(),
+                "exit": portfolio_exit.strip() if portfolio_exit else None,
+                "company_details_path": link_element.get_attribute("href") if link_element else None,
+            })
+    return data
+
+
+def element_by_element_sub_page(page):
+    # The original detail page extraction
+    left_column = page.query_selector("//*[@id='gatsby-focus-wrapper']/main/div[1]")
+    heading = left_column.query_selector("h2.font-h3")
+    preamble = left_column.query_selector("p.font-preamble")
+    result = {
+        "heading": heading.text_content() if heading else None,
+        "preamble": preamble.text_content() if preamble else None,
+    }
+    for item in left_column.query_selector_all("li.flex"):
+        parts = item.query_selector_all("div.flex-1")
+        if len(parts) > 1:
+            key = parts[0].text_content().strip().lower().replace(" ", "_")
+            value = parts[1].text_content()
+            if key in result:
+                if not isinstance(result[key], list):
+                    result[key] = [result[key]]
+                result[key].append(value)
+            else:
+                result[key] = value
+    description_text = ""
+    description = page.query_selector("//*[@id='gatsby-focus-wrapper']/main/div[4]")
+    if description:
+        for part in description.query_selector_all("p.font-body"):
+            description_text += part.text_content()
+    result["description"] = description_text
+    return result
+
+
+def count_round_trips():
+    # Every message the client sends to the Playwright driver is one round trip to the browser process
+    counter = {"messages": 0}
+    send_message_to_server = Connection._send_message_to_server
+
+    def counting_send(self, *args, **kwargs):
+        counter["messages"] += 1
+        return send_message_to_server(self, *args, **kwargs)
+
+    Connection._send_message_to_server = counting_send
+    return counter
+
+
+def measure(page, func, counter):
+    counter["messages"] = 0
+    result = func(page)
+    round_trips = counter["messages"]
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(page)
+        timings.append(time.perf_counter() - start)
+    return result, round_trips, timings
+
+
+def main():
+    counter = count_round_trips()
+    try:
+        playwright = sync_playwright().start()
+        browser = playwright.chromium.launch(headless=True)
+    except Exception as error:
+        print(f"Could not launch a Playwright browser, run `playwright install chromium` first ({error})")
+        return
+
+    page = browser.new_page()
+    print(f"{'page':<10} {'extraction':<20} {'round trips':>12} {'median ms':>10} {'p99 ms':>10}")
+    for fixture, strategies in (
+            ("listing", (("element by element", element_by_element_listings),
+                         ("single evaluate", extract_company_listings))),
+            ("company", (("element by element", element_by_element_sub_page),
+                         ("single evaluate", extract_sub_page)))):
+        with open(os.path.join(SITE_DIRECTORY, f"{fixture}.html"), encoding="utf-8") as file:
+            page.set_content(file.read())
+
+        results = []
+        for name, func in strategies:
+            result, round_trips, timings = measure(page, func, counter)
+            results.append(result)
+            p99 = statistics.quantiles(timings, n=100)[98]
+            print(f"{fixture:<10} {name:<20} {round_trips:>12} {statistics.median(timings) * 1000:>10.2f} "
+                  f"{p99 * 1000:>10.2f}")
+        assert results[0] == results[1], f"Extractions differ for {fixture}"
+
+    browser.close()
+    playwright.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import gzip
+import io
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pandas  # noqa: E402
+
+from gcs_client import ORGANIZATION_DTYPES, read_enrichment_ndjson  # noqa: E402
+from utils import get_peak_rss_mb  # noqa: E402
+
+ROW_COUNT = 500_000
+
+
+def write_synthetic_organizations(path, row_count):
+    random.seed(0)
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        for i in range(row_count):
+            file.write(json.dumps({
+                "uuid": f"00000000-0000-0000-0000-{i:012d}",
+                "name": f"Company {i}",
+                "homepage_url": f"https://company-{i}.com/" if random.random() > 0.3 else None,
+                "country_code": random.choice(["USA", "SWE", "GBR", "DEU"]),
+                "city": random.choice(["Stockholm", "London", "Berlin", "New York"]),
+                "founded_on": "2001-01-01",
+                "short_description": "A company that does things " * 4,
+                "employee_count": random.choice(["1-10", "11-50", "51-100", "1001-5000"]),
+                "num_funding_rounds": random.choice([None, 1.0, 2.0]),
+                "last_funding_on": "2020-01-01",
+                "total_funding_usd": random.random() * 1e6,
+                # Columns that main never uses
+                "facebook_url": f"https://facebook.com/company-{i}",
+                "linkedin_url": f"https://linkedin.com/company/company-{i}",
+                "long_description": "A much longer description of the company " * 10,
+            }) + "\n")
+
+
+def load_full(path):
+    with open(path, "rb") as file:
+        file_buffer = io.BytesIO(file.read())
+    df = pandas.read_json(file_buffer, lines=True, compression="gzip")
+    return df.dropna(subset=["homepage_url"])
+
+
+def load_streaming(path):
+    with open(path, "rb") as file:
+        return read_enrichment_ndjson(file, ORGANIZATION_DTYPES, ["homepage_url"])
+
+
+def run(loader, path, queue):
+    start = time.perf_counter()
+    df = loader(path)
+    seconds = time.perf_counter() - start
+    queue.put((seconds, get_peak_rss_mb(), len(df.index), df.memory_usage(deep=True).sum() / 1024 / 1024))
+
+
+def main():
+    # Every loader runs in a fresh process, peak RSS is a high-water mark for the whole process
+    context = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "organizations.json.gz")
+        write_synthetic_organizations(path, ROW_COUNT)
+        print(f"{ROW_COUNT} synthetic organizations, {os.path.getsize(path) / 1024 / 1024:.1f} MB gzipped")
+        print(f"{'loader':>10} {'time (s)':>10} {'peak RSS (MB)':>14} {'rows':>8} {'frame (MB)':>11}")
+        for name, loader in [("full", load_full), ("streaming", load_streaming)]:
+            queue = context.Queue()
+            process = context.Process(target=run, args=(loader, path, queue))
+            process.start()
+            seconds, peak_rss, rows, frame_size = queue.get()
+            process.join()
+            print(f"{name:>10} {seconds:>10.2f} {peak_rss:>14.1f} {rows:>8} {frame_size:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+import pandas  # noqa: E402
+
+from domains import get_registered_domains  # noqa: E402
+from enrichment_store import EnrichmentStore  # noqa: E402
+from gcs_client import BUCKET_NAME  # noqa: E402
+from enrichment import (FUNDING_ROUNDS_BLOB, ORGANIZATIONS_BLOB, add_funding_rounds, load_funding_rounds,  # noqa: E402
+                        load_organizations, lookup_company_data, lookup_funding_rounds, merge_company_data,
+                        prepare_funding_rounds, prepare_organizations)
+from tests.fake_storage import FakeBlob, FakeStorageClient  # noqa: E402
+from tests.synthetic_data import synthetic_data  # noqa: E402
+from utils import get_peak_rss_mb  # noqa: E402
+
+COMPANY_COUNT = 500
+ORGANIZATION_COUNT = 300_000
+
+
+def write_blobs(directory):
+    _, _, blobs = synthetic_data(COMPANY_COUNT, ORGANIZATION_COUNT)
+    for (_, blob_name), data in blobs.items():
+        with open(os.path.join(directory, blob_name), "wb") as file:
+            file.write(data)
+
+
+def create_storage_client(directory):
+    storage_client = FakeStorageClient()
+    for blob_name in (ORGANIZATIONS_BLOB, FUNDING_ROUNDS_BLOB):
+        with open(os.path.join(directory, blob_name), "rb") as file:
+            storage_client.bucket(BUCKET_NAME).blobs[blob_name] = FakeBlob(blob_name, file.read(), 1)
+    return storage_client
+
+
+def create_companies():
+    listings, details, _ = synthetic_data(COMPANY_COUNT, 0)
+    companies = pandas.DataFrame([{"title": company["title"], "website": company["website"]}
+                                  for company in details.values()])
+    companies["registered_domain"] = get_registered_domains(companies["website"])
+    return companies
+
+
+def enrich_with_merge(companies, storage_client, store_path):
+    return add_funding_rounds(merge_company_data(companies, load_organizations(storage_client=storage_client)),
+                              load_funding_rounds(storage_client=storage_client))
+
+
+def enrich_with_store(companies, storage_client, store_path):
+    store = EnrichmentStore(store_path)
+    prepare_organizations(store, storage_client=storage_client)
+    prepare_funding_rounds(store, storage_client=storage_client)
+    return lookup_funding_rounds(lookup_company_data(companies, store), store)
+
+
+def run(enrich, directory, queue):
+    # The gzipped blobs and the companies are loaded before the clock starts, and count toward the baseline RSS
+    storage_client = create_storage_client(directory)
+    companies = create_companies()
+    store_path = os.path.join(directory, "enrichment.sqlite3")
+    baseline_rss = get_peak_rss_mb()
+    start = time.perf_counter()
+    df = enrich(companies, storage_client, store_path)
+    seconds = time.perf_counter() - start
+    queue.put((seconds, get_peak_rss_mb() - baseline_rss, int(df["uuid"].notna().sum())))
+
+
+def main():
+    # Every run is a fresh process, the store runs share one SQLite file, so the first one builds it. Linux keeps the
+    # peak RSS of a process across exec, so even the blobs are generated in a process of their own
+    context = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        process = context.Process(target=write_blobs, args=(directory,))
+        process.start()
+        process.join()
+        print(f"{COMPANY_COUNT} companies, {ORGANIZATION_COUNT} other organizations")
+        print(f"{'enrichment':>16} {'time (s)':>10} {'RSS growth (MB)':>16} {'matched':>8}")
+        for name, enrich in [("merge", enrich_with_merge), ("store, building", enrich_with_store),
+                             ("store, built", enrich_with_store)]:
+            queue = context.Queue()
+            process = context.Process(target=run, args=(enrich, directory, queue))
+            process.start()
+            seconds, rss_growth, matched = queue.get()
+            process.join()
+            print(f"{name:>16} {seconds:>10.3f} {rss_growth:>16.1f} {matched:>8}")
+        print(f"Store size {os.path.getsize(os.path.join(directory, 'enrichment.sqlite3')) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+import numpy
+import pandas
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from enrichment import FUNDING_ROUND_COLUMNS, attach_funding_rounds  # noqa: E402
+
+ROUNDS_PER_ORG = 3
+
+
+def synthetic_data(company_count, org_count):
+    rng = numpy.random.default_rng(0)
+    org_uuids = [f"org-{i}" for i in range(org_count)]
+    funding_uuids = rng.choice(org_uuids, size=org_count * ROUNDS_PER_ORG)
+    funding_rounds = pandas.DataFrame({
+        "org_uuid": funding_uuids,
+        "investor_count": rng.integers(1, 10, size=len(funding_uuids)).astype(float),
+        "announced_on": "2020-01-01",
+        "investment_type": rng.choice(["seed", "series_a", "series_b"], size=len(funding_uuids)),
+        "raised_amount_usd": rng.random(len(funding_uuids)) * 1e6,
+    })
+    companies = pandas.DataFrame({"uuid": rng.choice(org_uuids, size=company_count)})
+    return companies, funding_rounds
+
+
+def query_funding_rounds(companies_data, funding_rounds):
+    result = []
+    for company in companies_data.itertuples():
+        rounds = funding_rounds.query(f'org_uuid == "{company.uuid}"')
+        result.append(rounds[FUNDING_ROUND_COLUMNS].to_dict("records") if not rounds.empty else [])
+    return result
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    org_count = 100_000
+    print(f"Funding table: {org_count * ROUNDS_PER_ORG} rows")
+    print(f"{'companies':>10} {'query (s)':>12} {'grouped (s)':>12} {'speedup':>9}")
+    for company_count in (100, 300, 1_000, 3_000, 10_000, 30_000):
+        companies, funding_rounds = synthetic_data(company_count, org_count)
+        # The per company query is too slow to run to the end at larger sizes, extrapolate from a sample
+        sample = companies.head(300)
+        query_seconds = measure(query_funding_rounds, sample, funding_rounds) * company_count / len(sample)
+        grouped_seconds = measure(attach_funding_rounds, companies, funding_rounds)
+        print(f"{company_count:>10} {query_seconds:>12.3f} {grouped_seconds:>12.3f} "
+              f"{query_seconds / grouped_seconds:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
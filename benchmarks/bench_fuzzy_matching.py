@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pandas  # noqa: E402
+
+from enrichment_store import ORGANIZATION_COLUMNS, EnrichmentStore  # noqa: E402
+from fuzzy_matching import BlockIndex, best_match, match_companies  # noqa: E402
+
+SYLLABLES = ["al", "be", "co", "da", "el", "fi", "ga", "ho", "in", "jo", "ka", "lu", "mo", "no", "pe", "qu", "ra",
+             "si", "to", "ur", "ve", "wi", "xe", "yo", "ze"]
+WORDS = ["Capital", "Technologies", "Health", "Systems", "Partners", "Energy", "Software", "Labs", "Foods", "Media"]
+SUFFIXES = ["Inc", "AB", "Ltd", "GmbH", "Group"]
+TLDS = [".com", ".io", ".se", ".de", ".co.uk"]
+
+
+def synthetic_organizations(count, rng):
+    names = set()
+    while len(names) < count:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        names.add(f"{word.capitalize()} {rng.choice(WORDS)}" if rng.random() < 0.5 else word.capitalize())
+    return pandas.DataFrame({
+        "registered_domain": [f"{name.split()[0].lower()}{rng.choice(TLDS)}" for name in names],
+        "uuid": [f"{index:036d}" for index in range(count)],
+        "name": list(names),
+    }).reindex(columns=["registered_domain", *ORGANIZATION_COLUMNS])
+
+
+def perturbed_companies(organizations, count, rng):
+    # The kind of differences that make the exact merge fail
+    companies = []
+    for row in organizations.sample(count, random_state=rng.randrange(1 << 31)).itertuples():
+        change = rng.choice(["suffix", "domain", "typo"])
+        title, domain = row.name, row.registered_domain
+        if change == "suffix":
+            title = f"{title} {rng.choice(SUFFIXES)}"
+        elif change == "domain":
+            domain = domain.partition(".")[0] + rng.choice([tld for tld in TLDS if not domain.endswith(tld)])
+        else:
+            position = rng.randrange(1, len(title))
+            title = title[:position] + title[position + 1:]
+        companies.append((title, domain, (row.registered_domain, row.name)))
+    return companies
+
+
+def recall(matches, companies):
+    return sum(1 for match, (_, _, expected) in zip(matches, companies) if match and match[0] == expected) / len(
+        companies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times fuzzy matching through blocking indexes against all-pairs "
+                                                 "comparison on synthetic organizations")
+    parser.add_argument("--organizations", type=int, default=1_000_000)
+    parser.add_argument("--companies", type=int, default=200, help="Companies without an exact match")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    organizations = synthetic_organizations(args.organizations, rng)
+    companies = perturbed_companies(organizations, args.companies, rng)
+    titles = [title for title, _, _ in companies]
+    domains = [domain for _, domain, _ in companies]
+    print(f"{args.organizations} organizations, {args.companies} companies without an exact match")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = EnrichmentStore(os.path.join(directory, "enrichment.sqlite3"))
+        blob = SimpleNamespace(name="organizations", generation=1, md5_hash="")
+        store.replace_organizations(blob, organizations)
+        start = time.perf_counter()
+        store.replace_organization_blocks(blob)
+        print(f"Building the store's blocking index: {time.perf_counter() - start:.1f} s, once per blob generation")
+
+        start = time.perf_counter()
+        matches = match_companies(titles, domains, store.find_candidates)
+        print(f"Matching through the store: {time.perf_counter() - start:.3f} s, "
+              f"recall {recall(matches, companies):.2f}")
+
+    start = time.perf_counter()
+    index = BlockIndex(organizations["registered_domain"], organizations["name"])
+    print(f"Building the in-memory blocking index: {time.perf_counter() - start:.1f} s, on every run")
+    start = time.perf_counter()
+    matches = match_companies(titles, domains, index.find_candidates)
+    print(f"Matching through the in-memory index: {time.perf_counter() - start:.3f} s, "
+          f"recall {recall(matches, companies):.2f}")
+
+    # Scoring every organization for every company, timed on a slice and extrapolated
+    sample = list(zip(organizations["registered_domain"][:10_000], organizations["name"][:10_000]))
+    start = time.perf_counter()
+    for title, domain in zip(titles[:5], domains[:5]):
+        best_match(title, domain, sample)
+    seconds = (time.perf_counter() - start) / 5 / len(sample) * args.organizations * args.companies
+    print(f"All pairs, extrapolated: {seconds:.0f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import copy
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from domains import get_registered_domain  # noqa: E402
+from page_data.page_data_extraction import (decode_details, decode_listing, extract_details,  # noqa: E402
+                                            get_listing_data)
+
+
+def dict_get_description(raw_body):
+    # The original extraction, on the dicts json.loads builds for the whole payload
+    if not raw_body:
+        return None
+    description = ""
+    for part in raw_body:
+        for sub_part in part.get("children", []):
+            description += sub_part.get("text", "")
+    return description
+
+
+def dict_get_logo_url(logo):
+    if logo is None:
+        return None
+    if logo.get("asset") is None:
+        return None
+    return logo.get("asset").get("url")
+
+
+def dict_decode_details(body):
+    return json.loads(body)["result"]["data"]["sanityCompanyPage"]
+
+
+def dict_extract_details(company_details):
+    return {
+        "description": dict_get_description(company_details.get("_rawBody", [])),
+        "preamble": company_details.get("preamble"),
+        "heading": company_details.get("heading"),
+        "responsible_advisors": [advisor.get("title") for advisor in company_details.get("responsibleAdvisors", [])],
+        "website": company_details.get("website"),
+        "registered_domain": get_registered_domain(company_details.get("website")),
+        "board": company_details.get("board", []),
+        "management": company_details.get("management", []),
+        "logo": dict_get_logo_url(company_details.get("logo")),
+    }
+
+
+def dict_decode_listing(body):
+    return json.loads(body)["result"]["data"]["allSanityCompanyPage"]["nodes"]
+
+
+def dict_get_listing_data(company):
+    return {
+        "title": company.get("title"),
+        "sector": company.get("sector"),
+        "country": company.get("country"),
+        "fund": [fund.get("title", "") for fund in company.get("fund", [])],
+        "entry": company.get("entryDate"),
+        "exit": company.get("exitDate"),
+        "company_details_path": company.get("path"),
+    }
+
+
+def page_data(path, data):
+    # Shaped like the page-data.json Gatsby serves, with the fields the scrapers never read
+    return json.dumps({
+        "componentChunkName": "component---src-templates-company-page-tsx",
+        "path": path,
+        "result": {"data": data, "pageContext": {"id": "-".join(["0" * 8, "0" * 4, "0" * 4, "0" * 4, "0" * 12]),
+                                                 "language": "en"}},
+        "staticQueryHashes": ["1234567890", "2345678901", "3456789012"],
+        "slicesMap": {},
+    }).encode("utf-8")
+
+
+def time_per_company(function, bodies, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for body in bodies:
+            function(body)
+        timings.append((time.perf_counter() - start) / len(bodies))
+    return statistics.median(timings)
+
+
+def memory_per_company(function, bodies):
+    # Bytes allocated for, and held by, what the decoder returns for a company
+    gc.collect()
+    tracemalloc.start()
+    decoded = [function(body) for body in bodies]
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del decoded
+    return held / len(bodies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares decoding page data into dicts with json.loads with "
+                                                 "decoding it into msgspec structs")
+    parser.add_argument("--companies", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(os.path.join(REPO_DIR, "tests/sample_data/company_details.json"), encoding="utf-8") as file:
+        details_template = json.load(file)
+    with open(os.path.join(REPO_DIR, "tests/sample_data/current_portfolio_sample.json"), encoding="utf-8") as file:
+        listing_template = json.load(file)[0]
+
+    details_bodies = []
+    for index in range(args.companies):
+        details = copy.deepcopy(details_template) | {"title": f"Company {index}",
+                                                     "website": f"https://www.company-{index}.com/"}
+        details_bodies.append(page_data(f"/current-portfolio/company-{index}/", {"sanityCompanyPage": details}))
+    nodes = [listing_template | {"title": f"Company {index}", "path": f"/current-portfolio/company-{index}/"}
+             for index in range(args.companies)]
+    listing_body = page_data("/current-portfolio/", {"allSanityCompanyPage": {"nodes": nodes}})
+
+    paths = {
+        "dicts (json.loads)": (lambda body: dict_extract_details(dict_decode_details(body)),
+                               dict_decode_details,
+                               lambda body: [dict_get_listing_data(company) for company in dict_decode_listing(body)]),
+        "structs (msgspec)": (lambda body: extract_details(decode_details(body)),
+                              decode_details,
+                              lambda body: [get_listing_data(company) for company in decode_listing(body)]),
+    }
+    dict_path, struct_path = paths.values()
+    if [dict_path[0](body) for body in details_bodies] != [struct_path[0](body) for body in details_bodies]:
+        raise RuntimeError("The struct path extracts different details")
+    if dict_path[2](listing_body) != struct_path[2](listing_body):
+        raise RuntimeError("The struct path extracts a different listing")
+
+    print(f"{args.companies} companies, {len(details_bodies[0]) / 1024:.1f} KB of page data per company")
+    print(f"{'path':<20} {'details µs':>11} {'listing µs':>11} {'decoded KB':>11}")
+    for name, (decode_and_extract, decode, decode_listing_data) in paths.items():
+        details_seconds = time_per_company(decode_and_extract, details_bodies, args.repeats)
+        listing_seconds = time_per_company(decode_listing_data, [listing_body], args.repeats) / args.companies
+        held = memory_per_company(decode, details_bodies)
+        print(f"{name:<20} {details_seconds * 1e6:>11.1f} {listing_seconds * 1e6:>11.2f} {held / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
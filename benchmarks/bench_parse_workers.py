@@ -0,0 +1,50 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from benchmarks.bench_enrichment_loader import write_synthetic_organizations  # noqa: E402
+from gcs_client import ORGANIZATION_DTYPES, read_enrichment_ndjson  # noqa: E402
+
+
+def worker_counts(max_workers):
+    counts = [1]
+    while counts[-1] * 2 < max_workers:
+        counts.append(counts[-1] * 2)
+    return counts + [max_workers] if max_workers > 1 else counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times parsing synthetic gzipped NDJSON organizations with 1 to N "
+                                                 "parse workers")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "organizations.json.gz")
+        write_synthetic_organizations(path, args.rows)
+        print(f"{args.rows} synthetic organizations, {os.path.getsize(path) / 1024 / 1024:.1f} MB gzipped, "
+              f"{os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'time (s)':>10} {'speedup':>8} {'identical':>10}")
+
+        serial = None
+        serial_seconds = None
+        for workers in worker_counts(args.max_workers):
+            # Worker start up is part of the time, it is paid on every run
+            start = time.perf_counter()
+            with open(path, "rb") as file:
+                df = read_enrichment_ndjson(file, ORGANIZATION_DTYPES, ["homepage_url"], workers=workers)
+            seconds = time.perf_counter() - start
+            if serial is None:
+                serial, serial_seconds = df, seconds
+            print(f"{workers:>8} {seconds:>10.2f} {serial_seconds / seconds:>8.2f} {str(df.equals(serial)):>10}")
+
+
+if __name__ == "__main__":
+    main()
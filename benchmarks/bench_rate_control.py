@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from page_data import page_data_async, page_data_sync  # noqa: E402
+from rate_control import RateController  # noqa: E402
+from tests.standin_server import StandInSite  # noqa: E402
+from tests.synthetic_data import synthetic_data  # noqa: E402
+
+PORTFOLIO_PATH = "/current-portfolio/"
+
+
+def scrape_async(base_url, args, rate_controller):
+    return asyncio.run(page_data_async.scrape([PORTFOLIO_PATH], base_url=base_url,
+                                              max_concurrent_requests=args.concurrency,
+                                              max_connections_per_host=args.concurrency,
+                                              max_retries=args.max_retries, rate_controller=rate_controller))
+
+
+def scrape_sync(base_url, args, rate_controller):
+    with page_data_sync.create_session(pool_size=args.concurrency, max_retries=args.max_retries,
+                                       rate_controller=rate_controller) as session:
+        companies = page_data_sync.fetch_companies(f"{base_url}/page-data{PORTFOLIO_PATH}page-data.json", session)
+        return page_data_sync.get_company_data(companies, session, threads=args.concurrency, base_url=base_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrapes a local stand-in that queues requests above its capacity "
+                                                 "and answers 429 with Retry-After above a higher limit, with fixed "
+                                                 "and adaptive concurrency")
+    parser.add_argument("--companies", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--capacity", type=int, default=8, help="Requests the stand-in handles at the same time")
+    parser.add_argument("--throttle-above", type=int, default=12,
+                        help="Requests in flight above which the stand-in answers 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="Requests in flight, or threads, without adaptive concurrency and the most with it")
+    parser.add_argument("--max-rps", type=float, default=100)
+    parser.add_argument("--max-retries", type=int, default=3)
+    args = parser.parse_args()
+    # Companies that run out of retries are counted below instead
+    logging.basicConfig(level=logging.ERROR)
+
+    listings, details, _ = synthetic_data(args.companies, 0)
+    listings = {PORTFOLIO_PATH: listings[PORTFOLIO_PATH]}
+    site = StandInSite(listings, details, delay=args.latency, capacity=args.capacity,
+                       throttle_above=args.throttle_above, retry_after=args.retry_after)
+    base_url = site.start_in_thread()
+
+    runs = {
+        "async, fixed": (scrape_async, lambda: None),
+        "async, adaptive": (scrape_async, lambda: RateController(args.concurrency)),
+        f"async, adaptive, {args.max_rps:g} rps": (scrape_async, lambda: RateController(args.concurrency,
+                                                                                        max_rps=args.max_rps)),
+        "sync, fixed": (scrape_sync, lambda: None),
+        "sync, adaptive": (scrape_sync, lambda: RateController(args.concurrency)),
+    }
+
+    print(f"{len(listings[PORTFOLIO_PATH])} companies, {args.latency * 1000:.0f} ms latency, capacity "
+          f"{args.capacity}, 429 above {args.throttle_above} in flight, Retry-After {args.retry_after} s, "
+          f"concurrency {args.concurrency}")
+    print(f"{'run':<28} {'wall s':>7} {'companies/s':>12} {'429s':>6} {'failed':>7} {'max in flight':>14} "
+          f"{'final limit':>12}")
+    try:
+        for name, (scrape, create_controller) in runs.items():
+            site.reset()
+            rate_controller = create_controller()
+            start = time.perf_counter()
+            company_data = scrape(base_url, args, rate_controller)
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for company in company_data if not company.get("description"))
+            final_limit = f"{rate_controller.limit:.1f}" if rate_controller else "-"
+            print(f"{name:<28} {elapsed:>7.2f} {len(company_data) / elapsed:>12.1f} {site.throttled:>6} "
+                  f"{failed:>7} {site.max_in_flight:>14} {final_limit:>12}")
+    finally:
+        site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import random
+import sys
+import time
+
+import pandas
+import tldextract
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from domains import get_registered_domain_for_host, get_registered_domains  # noqa: E402
+
+
+def synthetic_urls(row_count, host_count):
+    random.seed(0)
+    suffixes = ["com", "co.uk", "se", "io", "com.au"]
+    prefixes = ["", "www.", "shop."]
+    # Every company has one host, so host_count is the number of unique hosts
+    companies = (random.randrange(host_count) for _ in range(row_count))
+    return pandas.Series(
+        [f"https://{prefixes[company % 3]}company-{company}.{suffixes[company % 5]}/"
+         f"{random.choice(['', 'about', 'en/'])}" for company in companies],
+        dtype="string[pyarrow]")
+
+
+def apply_per_row(urls):
+    # The original implementation, one tldextract call per row
+    extract = tldextract.TLDExtract(cache_dir=None, suffix_list_urls=())
+    return urls.apply(lambda url: extract(url).registered_domain if isinstance(url, str) else None)
+
+
+def measure(func, urls):
+    start = time.perf_counter()
+    result = func(urls)
+    return time.perf_counter() - start, result
+
+
+def main():
+    print(f"{'rows':>9} {'hosts':>9} {'apply (s)':>10} {'per host (s)':>13} {'speedup':>8}")
+    for row_count, host_count in [(10_000, 10_000), (100_000, 100_000), (100_000, 20_000), (1_000_000, 200_000)]:
+        urls = synthetic_urls(row_count, host_count)
+        get_registered_domain_for_host.cache_clear()
+        apply_seconds, expected = measure(apply_per_row, urls)
+        cached_seconds, result = measure(get_registered_domains, urls)
+        assert result.tolist() == expected.tolist()
+        print(f"{row_count:>9} {host_count:>9} {apply_seconds:>10.2f} {cached_seconds:>13.2f} "
+              f"{apply_seconds / cached_seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
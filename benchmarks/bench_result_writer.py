@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+import time
+
+import pandas
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from result_writer import COMPRESSIONS, OUTPUT_FORMATS, WRITERS, get_output_path  # noqa: E402
+from utils import get_peak_rss_mb, read_json_file  # noqa: E402
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results",
+                            "scraped_with_page_data_async.json")
+
+
+def main():
+    # The saved results repeated until they are about the size of a full enrichment of many portfolios
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    df = pandas.DataFrame(read_json_file(RESULTS_FILE) * repeats)
+    print(f"{len(df.index)} rows, peak RSS before writing {get_peak_rss_mb():.0f} MB")
+    print(f"{'format':<8} {'compression':<12} {'seconds':>9} {'MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for output_format in OUTPUT_FORMATS:
+            for compression in COMPRESSIONS:
+                path = get_output_path(directory, "result_{format}", output_format, compression)
+                start = time.perf_counter()
+                WRITERS[output_format](df, path, compression)
+                elapsed = time.perf_counter() - start
+                print(f"{output_format:<8} {compression:<12} {elapsed:>9.3f} "
+                      f"{os.path.getsize(path) / 1024 / 1024:>9.2f}")
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from tests.standin_server import StandInSite  # noqa: E402
+from tests.synthetic_data import synthetic_data  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as err:
+        status = err.code
+    return status, time.perf_counter() - start
+
+
+def wait_until_ready(url, process, timeout=600):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline and process.poll() is None:
+        try:
+            if get(f"{url}/companies")[0] == 200:
+                return True
+        except urllib.error.URLError:
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def percentiles_ms(latencies):
+    quantiles = statistics.quantiles(latencies, n=100)
+    return quantiles[49] * 1000, quantiles[98] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares one-shot runs of src/main.py with the --serve API against "
+                                                 "a local stand-in for eqtgroup.com and GCS")
+    parser.add_argument("--companies", type=int, default=300)
+    parser.add_argument("--organizations", type=int, default=200_000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per endpoint against the warm service")
+    args = parser.parse_args()
+
+    listings, details, blobs = synthetic_data(args.companies, args.organizations)
+    site = StandInSite(listings, details, delay=args.latency, blobs=blobs)
+    base_url = site.start_in_thread()
+    environment = os.environ | {"STORAGE_EMULATOR_HOST": base_url}
+    main_py = os.path.join(REPO_DIR, "src", "main.py")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            common = [sys.executable, main_py, "--base-url", base_url, "--no-cache", "--no-http-cache",
+                      "--enrichment-store", os.path.join(directory, "enrichment.sqlite3"), "--log-level", "WARNING"]
+            print(f"{args.companies} companies, {args.organizations} other organizations, "
+                  f"{args.latency * 1000:.0f} ms latency")
+
+            for name in ("one-shot run, building the store", "one-shot run, store built"):
+                start = time.perf_counter()
+                subprocess.run([*common, "--output-dir", directory], env=environment, check=True, cwd=REPO_DIR)
+                print(f"{name:<40} {time.perf_counter() - start:>8.2f} s")
+
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            start = time.perf_counter()
+            process = subprocess.Popen([*common, "--serve", "--port", str(port)], env=environment, cwd=REPO_DIR)
+            try:
+                if not wait_until_ready(url, process):
+                    raise RuntimeError("The service did not get ready")
+                print(f"{'service cold start, store built':<40} {time.perf_counter() - start:>8.2f} s")
+
+                title = "Company 0"
+                endpoints = {"/companies/title/<title>": f"{url}/companies/title/{urllib.request.quote(title)}",
+                             "/companies/domain/<domain>": f"{url}/companies/domain/company-0.com",
+                             "/companies": f"{url}/companies"}
+                for name, endpoint in endpoints.items():
+                    responses = [get(endpoint) for _ in range(args.requests)]
+                    if any(status != 200 for status, _ in responses):
+                        raise RuntimeError(f"{name} did not answer with 200")
+                    p50, p99 = percentiles_ms([latency for _, latency in responses])
+                    print(f"{'warm ' + name:<40} p50 {p50:>6.2f} ms, p99 {p99:>6.2f} ms")
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import argparse
+import os
+import statistics
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from tests.importtime import HEAVY_MODULES, run_with_importtime, total_import_seconds  # noqa: E402
+
+# The imports of --help take about 0.1 seconds, they took a second when main imported pandas and
+# google-cloud-storage
+MAX_HELP_IMPORT_SECONDS = 0.5
+COMMANDS = [["--help"], ["scrape", "--help"], ["enrich", "--help"], ["full", "--help"], ["merge", "--help"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the imports of src/main.py for --help and the help of every "
+                                                 "command, a wall clock measurement kept out of the unit tests")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-help-seconds", type=float, default=MAX_HELP_IMPORT_SECONDS,
+                        help="Exit with status 1 when the median import time of --help is above this")
+    args = parser.parse_args()
+
+    print(f"{'arguments':<16} {'median s':>9} {'modules':>8}  heavy modules")
+    medians = {}
+    for arguments in COMMANDS:
+        seconds = []
+        for _ in range(args.repeats):
+            _, imports = run_with_importtime(*arguments)
+            seconds.append(total_import_seconds(imports))
+        medians[" ".join(arguments)] = statistics.median(seconds)
+        print(f"{' '.join(arguments):<16} {statistics.median(seconds):>9.3f} {len(imports):>8}  "
+              f"{', '.join(sorted(HEAVY_MODULES & set(imports))) or '-'}")
+
+    if medians["--help"] > args.max_help_seconds:
+        print(f"--help imports took {medians['--help']:.3f} seconds, more than {args.max_help_seconds}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
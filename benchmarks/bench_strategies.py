@@ -0,0 +1,151 @@
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from tests.standin_server import StandInSite  # noqa: E402
+from tests.synthetic_data import synthetic_data  # noqa: E402
+from utils import get_peak_rss_mb  # noqa: E402
+
+# Arguments to src/main.py for every strategy, the page data scrapers are the two in results/scraped_with_page_data_*,
+# the Playwright ones the two in results/scraped_with_playwright_*
+STRATEGIES = {
+    "page_data_async": [],
+    "page_data_sync": ["--synchronous"],
+    "page_data_stream": ["--stream"],
+    "playwright_sp": ["--use-html-scraper", "--synchronous"],
+    "playwright_mp": ["--use-html-scraper"],
+    "playwright_intercept": ["--use-html-scraper", "--intercept-page-data"],
+}
+
+
+def run_strategy(strategy, base_url, output_dir, extra_arguments):
+    # Every run starts without cached enrichment data, so the strategies are compared on equal terms
+    command = [sys.executable, os.path.join(REPO_DIR, "src", "main.py"), "--base-url", base_url, "--no-cache",
+               "--no-http-cache", "--enrichment-store", os.path.join(output_dir, "enrichment.sqlite3"),
+               "--output-dir", output_dir, "--output-filename", strategy, "--output-format", "ndjson",
+               "--metrics-json", os.path.join(output_dir, f"{strategy}.metrics.json"),
+               *STRATEGIES[strategy], *extra_arguments]
+    # The storage client talks to the stand-in instead of GCS
+    environment = os.environ | {"STORAGE_EMULATOR_HOST": base_url}
+    log_path = os.path.join(output_dir, f"{strategy}.log")
+
+    with open(log_path, "w", encoding="utf-8") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, env=environment, stdout=log, stderr=subprocess.STDOUT, cwd=REPO_DIR)
+        if hasattr(os, "wait4"):
+            # Resource usage of main.py together with everything it started and waited for, e.g. pool workers,
+            # the Playwright driver and its browsers
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            process.wait()
+            usage = None
+        wall_seconds = time.perf_counter() - start
+
+    rows = []
+    result_path = os.path.join(output_dir, f"{strategy}.ndjson")
+    if os.path.exists(result_path):
+        with open(result_path, encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+
+    # Only the streaming pipeline writes a company before the whole website is scraped
+    first_record_seconds = None
+    metrics_path = os.path.join(output_dir, f"{strategy}.metrics.json")
+    if os.path.exists(metrics_path):
+        with open(metrics_path, encoding="utf-8") as file:
+            gauges = json.load(file)["gauges"]
+        first_record_seconds = next((gauge["value"] for gauge in gauges.get("first_record_seconds", [])), None)
+
+    run = {
+        "strategy": strategy,
+        "returncode": process.returncode,
+        "wall_seconds": wall_seconds,
+        "rows": len(rows),
+        "enriched_rows": sum(1 for row in rows if row.get("uuid")),
+        "companies_per_second": len(rows) / wall_seconds,
+        "first_record_seconds": first_record_seconds,
+        "peak_rss_mb": get_peak_rss_mb(usage) if usage else None,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime if usage else None,
+    }
+    if process.returncode != 0:
+        with open(log_path, encoding="utf-8") as log:
+            lines = log.read().strip().splitlines()
+        run["error"] = ([line for line in lines if "Error" in line] or lines)[-1:]
+    return run
+
+
+def percentile_ms(latencies, percentile):
+    if len(latencies) < 2:
+        return None
+    return statistics.quantiles(latencies, n=100)[percentile - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs src/main.py end to end with every scraping strategy against "
+                                                 "a local stand-in for eqtgroup.com and GCS")
+    parser.add_argument("--companies", type=int, nargs="+", default=[50, 200],
+                        help="Company counts to run every strategy at")
+    parser.add_argument("--organizations", type=int, default=50_000,
+                        help="Organizations in the enrichment data besides the ones matching a company")
+    parser.add_argument("--strategies", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Seconds the stand-in waits before answering every page request")
+    parser.add_argument("--error-rate", type=float, default=0.02,
+                        help="Share of page data requests answered with a 503")
+    parser.add_argument("--threads", type=int, default=8, help="--threads for page_data_sync")
+    parser.add_argument("--browser-workers", type=int, default=4, help="--browser-workers for playwright_mp")
+    parser.add_argument("--output", default="bench_strategies.json",
+                        help="Machine readable results, one entry per strategy and company count")
+    args = parser.parse_args()
+
+    strategy_arguments = {"page_data_sync": ["--threads", str(args.threads)],
+                          "playwright_mp": ["--browser-workers", str(args.browser_workers)]}
+
+    runs = []
+    print(f"{'strategy':<22} {'companies':>9} {'rows':>6} {'seconds':>8} {'per s':>7} {'first s':>7} {'p50 ms':>7} "
+          f"{'p99 ms':>7} {'RSS MB':>7} {'CPU s':>7}")
+    for company_count in args.companies:
+        listings, details, blobs = synthetic_data(company_count, args.organizations)
+        for strategy in args.strategies:
+            # A fresh site for every run, so the injected errors are the same for every strategy
+            site = StandInSite(listings, details, delay=args.latency, error_rate=args.error_rate, blobs=blobs)
+            base_url = site.start_in_thread()
+            try:
+                with tempfile.TemporaryDirectory() as output_dir:
+                    run = run_strategy(strategy, base_url, output_dir, strategy_arguments.get(strategy, []))
+            finally:
+                site.stop()
+
+            run |= {
+                "companies": company_count,
+                "requests": len(site.requests),
+                "injected_errors": site.errors,
+                "p50_request_ms": percentile_ms(site.latencies, 50),
+                "p99_request_ms": percentile_ms(site.latencies, 99),
+            }
+            runs.append(run)
+            print(" ".join([f"{strategy:<22}", f"{company_count:>9}", f"{run['rows']:>6}",
+                            f"{run['wall_seconds']:>8.2f}", f"{run['companies_per_second']:>7.1f}",
+                            *[f"{run[key] if run[key] is not None else float('nan'):>7.{digits}f}" for key, digits in (
+                                ("first_record_seconds", 2), ("p50_request_ms", 1), ("p99_request_ms", 1),
+                                ("peak_rss_mb", 0), ("cpu_seconds", 2))],
+                            *run.get("error", [])]))
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"created": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "python": sys.version.split()[0], "arguments": vars(args), "runs": runs}, file, indent=4)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
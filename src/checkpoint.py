@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = "cache/checkpoint"
+KEY_FIELD = "company_details_path"
+OPTIONS_FILENAME = "run.json"
+COMPANIES_FILENAME = "companies.ndjson"
+
+
+class Checkpoint:
+    """Progress of a run kept on disk, so a run that dies part way can be resumed where it stopped.
+
+    Every company is appended to companies.ndjson as soon as its details have been scraped, a line only counts once it
+    is complete. Stage outputs are pickled to a temporary file and moved in place, so they are either whole or absent.
+    run.json holds the options of the run, a checkpoint left by a run with other options is never resumed. A run holds
+    an exclusive lock on the directory.lock file next to it, a second run on the same directory fails instead of
+    removing the checkpoint of the first. Stages still running when a failed run closes it, e.g. a download the failure
+    didn't wait for, record nothing after that.
+    """
+
+    def __init__(self, directory=CHECKPOINT_DIR, options=None, resume=False):
+        self.directory = directory
+        self.options = options or {}
+        self.companies = {}
+        self.lock = threading.Lock()
+        self.closed = False
+        self.lock_file = lock_directory(directory)
+        if resume and self.read_options() == self.options:
+            self.companies = self.read_companies()
+            logger.info(f"Resuming from {directory} with {len(self.companies)} scraped companies and stages "
+                        f"{', '.join(self.completed_stages()) or 'none'} done")
+        else:
+            if resume:
+                logger.warning(f"No checkpoint of a run with the same options in {directory}, starting from scratch")
+            self.clear()
+            os.makedirs(directory, exist_ok=True)
+            write_atomically(self.path(OPTIONS_FILENAME), json.dumps(self.options).encode("utf-8"))
+        metrics.set("checkpoint_companies_resumed", len(self.companies))
+        self.companies_file = open(self.path(COMPANIES_FILENAME), "ab")
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def read_options(self):
+        try:
+            with open(self.path(OPTIONS_FILENAME), encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read_companies(self):
+        companies = {}
+        complete_bytes = 0
+        try:
+            with open(self.path(COMPANIES_FILENAME), "rb") as file:
+                for line in file:
+                    # The last line is cut off when the run died while writing it
+                    if not line.endswith(b"\n"):
+                        break
+                    record = json.loads(line)
+                    companies[record[KEY_FIELD]] = record
+                    complete_bytes += len(line)
+        except FileNotFoundError:
+            return companies
+        # New companies are appended after the last complete line
+        with open(self.path(COMPANIES_FILENAME), "r+b") as file:
+            file.truncate(complete_bytes)
+        return companies
+
+    def completed_company(self, key):
+        return self.companies.get(key)
+
+    def record_company(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock:
+            if self.closed:
+                return
+            self.companies[record[KEY_FIELD]] = record
+            # One write per complete line, flushed so it survives the process being killed
+            self.companies_file.write(line)
+            self.companies_file.flush()
+
+    def stage_path(self, name):
+        return self.path(f"stage_{name}.pickle")
+
+    def completed_stages(self):
+        return sorted(filename[len("stage_"):-len(".pickle")] for filename in os.listdir(self.directory)
+                      if filename.startswith("stage_") and filename.endswith(".pickle"))
+
+    def has_stage(self, name):
+        return os.path.exists(self.stage_path(name))
+
+    def load_stage(self, name):
+        with open(self.stage_path(name), "rb") as file:
+            return pickle.load(file)
+
+    def save_stage(self, name, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            if not self.closed:
+                write_atomically(self.stage_path(name), data)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def close(self, completed=False):
+        with self.lock:
+            self.closed = True
+            self.companies_file.close()
+            # A finished run leaves nothing to resume
+            if completed:
+                self.clear()
+            # The lock file stays, removing it would let another run lock a file a waiting run already opened
+            self.lock_file.close()
+
+
+def get_checkpoint_path(root, options):
+    # Runs with other options, e.g. a scrape and an enrich or the shards of a run, get their own checkpoint
+    digest = hashlib.blake2b(json.dumps(options, sort_keys=True).encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(root, f"{options.get('command') or 'run'}-{digest}")
+
+
+def lock_directory(directory):
+    os.makedirs(os.path.dirname(os.path.abspath(directory)), exist_ok=True)
+    lock_file = open(f"{directory}.lock", "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        raise RuntimeError(f"Another run is using the checkpoint in {directory}") from None
+    return lock_file
+
+
+def write_atomically(path, data):
+    # Synced before it replaces the previous file, a crash leaves either the old or the new file, never a partial one
+    directory = os.path.dirname(path) or "."
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(file_descriptor, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
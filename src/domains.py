@@ -0,0 +1,40 @@
+import functools
+import os
+import pathlib
+import re
+
+import tldextract
+
+# Registered domains are resolved against the public suffix list snapshot bundled with tldextract, so nothing is
+# fetched over the network. A newer local copy of the list can be used by pointing PUBLIC_SUFFIX_LIST to it.
+_suffix_list_path = os.environ.get("PUBLIC_SUFFIX_LIST")
+_extract = tldextract.TLDExtract(
+    cache_dir=None,
+    suffix_list_urls=(pathlib.Path(_suffix_list_path).resolve().as_uri(),) if _suffix_list_path else (),
+)
+
+# Plain urls like https://www.example.com:8080/path, which tldextract resolves the same as their host. Everything else,
+# e.g. urls with user info or other schemes, is handed to tldextract as it is.
+SIMPLE_URL_PATTERN = re.compile(r"(?:[Hh][Tt][Tt][Pp][Ss]?://)?([A-Za-z0-9.-]+)(?::[0-9]+)?(?:[/?#].*)?", re.DOTALL)
+
+
+@functools.lru_cache(maxsize=None)
+def get_registered_domain_for_host(host):
+    return _extract(host).registered_domain
+
+
+def get_registered_domain(url):
+    if not isinstance(url, str):
+        return None
+    match = SIMPLE_URL_PATTERN.fullmatch(url)
+    if match is None:
+        return _extract(url).registered_domain
+    # Many urls share a host, so the suffix list is only consulted once per host
+    return get_registered_domain_for_host(match[1])
+
+
+def get_registered_domains(urls):
+    # Takes a pandas Series of urls and returns the same as applying get_registered_domain to every row
+    import pandas
+
+    return pandas.Series([get_registered_domain(url) for url in urls.astype(object)], index=urls.index, dtype=object)
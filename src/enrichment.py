@@ -0,0 +1,173 @@
+import logging
+
+import numpy
+import pandas
+
+from domains import get_registered_domains
+from enrichment_store import BLOCKS_SOURCE, ORGANIZATION_COLUMNS
+from fuzzy_matching import MATCH_THRESHOLD, BlockIndex, match_companies
+from gcs_client import FUNDING_DTYPES, ORGANIZATION_DTYPES, fetch_enrichment_data, get_blob
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ORGANIZATIONS_BLOB = "interview-test-org.json.gz"
+FUNDING_ROUNDS_BLOB = "interview-test-funding.json.gz"
+
+FUNDING_ROUND_COLUMNS = ["investor_count", "announced_on", "investment_type", "raised_amount_usd"]
+
+
+def group_funding_rounds(funding_rounds):
+    # Build an org_uuid -> [funding round records] lookup in a single pass over the funding table,
+    # records keep the order they have in the table
+    rounds_by_uuid = {}
+    records = funding_rounds[FUNDING_ROUND_COLUMNS].to_dict("records")
+    for org_uuid, record in zip(funding_rounds["org_uuid"], records):
+        rounds_by_uuid.setdefault(org_uuid, []).append(record)
+    return rounds_by_uuid
+
+
+def attach_funding_rounds(companies_data, funding_rounds):
+    # Only the funding rounds of the companies we are enriching need to be turned into records
+    company_uuids = companies_data["uuid"]
+    matching_rounds = funding_rounds[funding_rounds["org_uuid"].isin(company_uuids.dropna())]
+    rounds_by_uuid = group_funding_rounds(matching_rounds)
+    return [rounds_by_uuid.get(company_uuid, []) if isinstance(company_uuid, str) else []
+            for company_uuid in companies_data["uuid"]]
+
+
+def load_organizations(cache=None, storage_client=None, parse_workers=1):
+    all_organizations = fetch_enrichment_data(ORGANIZATIONS_BLOB, cache, storage_client, dtypes=ORGANIZATION_DTYPES,
+                                              dropna_subset=["homepage_url"], parse_workers=parse_workers)
+    logger.info(f"{len(all_organizations.index)} organization entries with a homepage_url were loaded from CGS")
+    metrics.set("rows", len(all_organizations.index), stage="organizations_loaded")
+
+    with metrics.timer("clean_organizations"):
+        all_organizations['registered_domain'] = get_registered_domains(all_organizations['homepage_url'])
+        all_organizations.drop_duplicates(subset=["name", "registered_domain"], keep="last", inplace=True)
+    logger.info(f"{len(all_organizations.index)} organization entries remain after cleaning")
+    metrics.set("rows", len(all_organizations.index), stage="organizations_cleaned")
+    return all_organizations
+
+
+def load_funding_rounds(cache=None, storage_client=None, parse_workers=1):
+    funding_rounds = fetch_enrichment_data(FUNDING_ROUNDS_BLOB, cache, storage_client, dtypes=FUNDING_DTYPES,
+                                           parse_workers=parse_workers)
+    logger.info(f"{len(funding_rounds.index)} funding round entries were loaded from CGS")
+    metrics.set("rows", len(funding_rounds.index), stage="funding_rounds_loaded")
+    return funding_rounds
+
+
+def merge_company_data(company_data_df, all_organizations, block_index=None, fuzzy_threshold=MATCH_THRESHOLD):
+    logger.info(f"{len(company_data_df.index)} rows of company data before merge")
+    enriched_company_data = pandas.merge(company_data_df, all_organizations, how="left",
+                                         left_on=["registered_domain", "title"], right_on=["registered_domain", "name"])
+    logger.info(f"{len(enriched_company_data.index)} rows of company data after merge")
+    if block_index is not None:
+        enriched_company_data = add_fuzzy_matches(
+            enriched_company_data, block_index.find_candidates,
+            lambda keys: all_organizations.iloc[[block_index.positions[key] for key in keys]][ORGANIZATION_COLUMNS],
+            fuzzy_threshold)
+    record_organization_matches(company_data_df, enriched_company_data)
+    return enriched_company_data
+
+
+def index_organizations(all_organizations):
+    with metrics.timer("index_organizations"):
+        return BlockIndex(all_organizations["registered_domain"], all_organizations["name"])
+
+
+def add_fuzzy_matches(enriched_company_data, find_candidates, lookup_organizations, threshold=MATCH_THRESHOLD):
+    # Companies without an exact match get the organization of the best scoring candidate from the blocking index,
+    # match_confidence is 1 for exact matches and missing for companies that are still without one
+    exact_matches = enriched_company_data["uuid"].notna().to_numpy()
+    confidence = numpy.where(exact_matches, 1.0, numpy.nan)
+    positions = numpy.flatnonzero(~exact_matches)
+    with metrics.timer("fuzzy_matching"):
+        matches = match_companies(enriched_company_data["title"].iloc[positions],
+                                  enriched_company_data["registered_domain"].iloc[positions], find_candidates,
+                                  threshold)
+    matched = [(position, match) for position, match in zip(positions, matches) if match is not None]
+    logger.info(f"{len(matched)} of {len(positions)} companies without an exact match were matched fuzzily")
+    metrics.set("merge_rows", len(matched), merge="organizations", side="fuzzy_matched")
+
+    enriched_company_data = enriched_company_data.copy()
+    if matched:
+        matched_positions = [position for position, _ in matched]
+        organizations = lookup_organizations([key for _, (key, _) in matched])
+        for column in ORGANIZATION_COLUMNS:
+            # Through object, the fuzzy matches may add categories
+            values = enriched_company_data[column].astype(object)
+            values.iloc[matched_positions] = organizations[column].to_numpy(dtype=object)
+            enriched_company_data[column] = values.astype(ORGANIZATION_DTYPES[column])
+        confidence[matched_positions] = [confidence for _, (_, confidence) in matched]
+    enriched_company_data["match_confidence"] = confidence
+    return enriched_company_data
+
+
+def record_organization_matches(company_data_df, enriched_company_data):
+    metrics.set("merge_rows", len(company_data_df.index), merge="organizations", side="before")
+    metrics.set("merge_rows", len(enriched_company_data.index), merge="organizations", side="after")
+    metrics.set("merge_rows", int(enriched_company_data["uuid"].notna().sum()), merge="organizations", side="matched")
+
+
+def add_funding_rounds(enriched_company_data, funding_rounds):
+    funding_rounds_per_company = attach_funding_rounds(enriched_company_data, funding_rounds)
+    record_funding_round_matches(enriched_company_data, funding_rounds_per_company)
+    return enriched_company_data.assign(funding_rounds=funding_rounds_per_company)
+
+
+def record_funding_round_matches(enriched_company_data, funding_rounds_per_company):
+    metrics.set("merge_rows", len(enriched_company_data.index), merge="funding_rounds", side="before")
+    metrics.set("merge_rows", len(funding_rounds_per_company), merge="funding_rounds", side="after")
+    metrics.set("merge_rows", sum(1 for rounds in funding_rounds_per_company if rounds), merge="funding_rounds",
+                side="matched")
+
+
+def prepare_organizations(store, cache=None, storage_client=None, fuzzy_matching=False, parse_workers=1):
+    # Rebuilds the organizations of the store from a fresh download only when the blob has changed
+    blob = get_blob(ORGANIZATIONS_BLOB, storage_client)
+    if store.is_current("organizations", blob):
+        logger.info(f"Enrichment store is up to date with {blob.name} (generation {blob.generation})")
+    else:
+        with metrics.timer("index_organizations"):
+            store.replace_organizations(blob, load_organizations(cache, storage_client, parse_workers))
+    if fuzzy_matching and not store.is_current(BLOCKS_SOURCE, blob):
+        with metrics.timer("index_organization_blocks"):
+            store.replace_organization_blocks(blob)
+    return store
+
+
+def prepare_funding_rounds(store, cache=None, storage_client=None, parse_workers=1):
+    blob = get_blob(FUNDING_ROUNDS_BLOB, storage_client)
+    if store.is_current("funding_rounds", blob):
+        logger.info(f"Enrichment store is up to date with {blob.name} (generation {blob.generation})")
+        return store
+    with metrics.timer("index_funding_rounds"):
+        store.replace_funding_rounds(blob, load_funding_rounds(cache, storage_client, parse_workers))
+    return store
+
+
+def lookup_company_data(company_data_df, store, fuzzy_threshold=None):
+    # Same columns and rows as merge_company_data, organizations are looked up one company at a time
+    logger.info(f"{len(company_data_df.index)} rows of company data before lookup")
+    organizations = store.lookup_organizations(zip(company_data_df["registered_domain"], company_data_df["title"]))
+    enriched_company_data = pandas.concat([company_data_df.reset_index(drop=True), organizations], axis=1)
+    logger.info(f"{int(enriched_company_data['uuid'].notna().sum())} companies matched an organization")
+    if fuzzy_threshold is not None:
+        enriched_company_data = add_fuzzy_matches(enriched_company_data, store.find_candidates,
+                                                  store.lookup_organizations, fuzzy_threshold)
+    record_organization_matches(company_data_df, enriched_company_data)
+    return enriched_company_data
+
+
+def lookup_funding_rounds(enriched_company_data, store):
+    funding_rounds_per_company = store.lookup_funding_rounds(enriched_company_data["uuid"])
+    record_funding_round_matches(enriched_company_data, funding_rounds_per_company)
+    return enriched_company_data.assign(funding_rounds=funding_rounds_per_company)
+
+
+def get_enrichment_version(skip_funding_rounds=False):
+    # Changes whenever one of the enrichment blobs does, only the metadata is requested
+    blob_names = [ORGANIZATIONS_BLOB] if skip_funding_rounds else [ORGANIZATIONS_BLOB, FUNDING_ROUNDS_BLOB]
+    return [(blob.name, blob.generation, blob.md5_hash) for blob in map(get_blob, blob_names)]
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas
+
+from fuzzy_matching import BLOCKING_KEYS_VERSION, MAX_BLOCK_SIZE, blocking_keys, rank_candidates
+from gcs_client import FUNDING_DTYPES, ORGANIZATION_DTYPES
+
+STORE_PATH = "cache/enrichment.sqlite3"
+
+ORGANIZATION_COLUMNS = list(ORGANIZATION_DTYPES)
+FUNDING_ROUND_COLUMNS = [column for column in FUNDING_DTYPES if column != "org_uuid"]
+# The blocking index is also rebuilt when the blocking keys change, not only the blob
+BLOCKS_SOURCE = f"organization_blocks_v{BLOCKING_KEYS_VERSION}"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sources (
+    name TEXT PRIMARY KEY,
+    blob_name TEXT,
+    generation INTEGER,
+    md5_hash TEXT,
+    built REAL
+);
+CREATE TABLE IF NOT EXISTS organizations (
+    registered_domain TEXT NOT NULL,
+    {", ".join(f"{column} {"REAL" if ORGANIZATION_DTYPES[column] == "float64" else "TEXT"}"
+               for column in ORGANIZATION_COLUMNS)},
+    PRIMARY KEY (registered_domain, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS funding_rounds (
+    org_uuid TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    {", ".join(f"{column} {"REAL" if FUNDING_DTYPES[column] == "float64" else "TEXT"}"
+               for column in FUNDING_ROUND_COLUMNS)},
+    PRIMARY KEY (org_uuid, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS organization_blocks (
+    key TEXT NOT NULL,
+    registered_domain TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (key, registered_domain, name)
+) WITHOUT ROWID;
+"""
+
+
+class EnrichmentStore:
+    """SQLite index of the cleaned enrichment data, organizations keyed on (registered_domain, name) and funding rounds
+    on org_uuid, so enriching a few hundred companies is a few hundred point lookups instead of loading whole tables.
+
+    Every table remembers the generation and md5 hash of the blob it was built from, and is only rebuilt when they
+    change.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self.connect()) as connection:
+            connection.executescript(SCHEMA)
+
+    def connect(self):
+        # A connection per call, so the stages on other threads can use the store at the same time. Writers wait for
+        # each other, readers keep seeing the previous table until a rebuild is committed.
+        connection = sqlite3.connect(self.path, timeout=300, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def is_current(self, name, blob):
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT blob_name, generation, md5_hash FROM sources WHERE name = ?",
+                                     (name,)).fetchone()
+        return row == (blob.name, blob.generation, blob.md5_hash)
+
+    def replace_table(self, name, blob, insert_statement, rows, source=None):
+        with closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(f"DELETE FROM {name}")
+                connection.executemany(insert_statement, rows)
+                connection.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                                   (source or name, blob.name, blob.generation, blob.md5_hash, time.time()))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def replace_organizations(self, blob, organizations):
+        # Takes the cleaned organization table, with registered_domain added and duplicates dropped
+        columns = ["registered_domain", *ORGANIZATION_COLUMNS]
+        organizations = organizations.dropna(subset=["registered_domain", "name"])[columns]
+        self.replace_table("organizations", blob,
+                           f"INSERT OR REPLACE INTO organizations ({", ".join(columns)}) "
+                           f"VALUES ({", ".join("?" * len(columns))})",
+                           to_rows(organizations))
+
+    def replace_funding_rounds(self, blob, funding_rounds):
+        # The position keeps the rounds of an organization in the order they have in the blob
+        funding_rounds = funding_rounds.dropna(subset=["org_uuid"])[["org_uuid", *FUNDING_ROUND_COLUMNS]]
+        funding_rounds.insert(1, "position", range(len(funding_rounds.index)))
+        self.replace_table("funding_rounds", blob,
+                           f"INSERT INTO funding_rounds VALUES ({", ".join("?" * len(funding_rounds.columns))})",
+                           to_rows(funding_rounds))
+
+    def replace_organization_blocks(self, blob):
+        # The blocking index for fuzzy matching, built from the organizations in the store, which came from blob
+        with closing(self.connect()) as connection:
+            keys = connection.execute("SELECT registered_domain, name FROM organizations").fetchall()
+        rows = ((block_key, registered_domain, name) for registered_domain, name in keys
+                for block_key in blocking_keys(name, registered_domain))
+        self.replace_table("organization_blocks", blob, "INSERT OR IGNORE INTO organization_blocks VALUES (?, ?, ?)",
+                           rows, BLOCKS_SOURCE)
+
+    def invalidate(self):
+        with closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for name in ("sources", "organizations", "funding_rounds", "organization_blocks"):
+                connection.execute(f"DELETE FROM {name}")
+            connection.execute("COMMIT")
+
+    def lookup_organizations(self, keys):
+        # One row per (registered_domain, name) key, in the same order, with missing values where nothing matches
+        query = f"SELECT {", ".join(ORGANIZATION_COLUMNS)} FROM organizations WHERE registered_domain = ? AND name = ?"
+        empty_row = (None,) * len(ORGANIZATION_COLUMNS)
+        with closing(self.connect()) as connection:
+            rows = [(connection.execute(query, key).fetchone() or empty_row)
+                    if all(isinstance(value, str) for value in key) else empty_row for key in keys]
+        return pandas.DataFrame(rows, columns=ORGANIZATION_COLUMNS).astype(ORGANIZATION_DTYPES)
+
+    def lookup_organization(self, key):
+        # A single organization as a dict, None when nothing matches
+        query = f"SELECT {", ".join(ORGANIZATION_COLUMNS)} FROM organizations WHERE registered_domain = ? AND name = ?"
+        with closing(self.connect()) as connection:
+            row = connection.execute(query, key).fetchone()
+        return dict(zip(ORGANIZATION_COLUMNS, row)) if row else None
+
+    def find_candidates(self, block_keys):
+        # One more row than a block may have is enough to tell that it is too common to use
+        query = f"SELECT registered_domain, name FROM organization_blocks WHERE key = ? LIMIT {MAX_BLOCK_SIZE + 1}"
+        with closing(self.connect()) as connection:
+            return rank_candidates([connection.execute(query, (block_key,)).fetchall() for block_key in block_keys])
+
+    def lookup_funding_rounds(self, org_uuids):
+        query = (f"SELECT {", ".join(FUNDING_ROUND_COLUMNS)} FROM funding_rounds WHERE org_uuid = ? "
+                 f"ORDER BY position")
+        with closing(self.connect()) as connection:
+            return [[dict(zip(FUNDING_ROUND_COLUMNS, row)) for row in connection.execute(query, (org_uuid,))]
+                    if isinstance(org_uuid, str) else [] for org_uuid in org_uuids]
+
+
+def to_rows(df):
+    # sqlite3 can't bind pandas' missing values, they are stored as NULL
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
@@ -0,0 +1,131 @@
+import difflib
+import random
+import re
+import unicodedata
+import zlib
+
+import numpy
+
+MATCH_THRESHOLD = 0.8
+
+# Blocks with more organizations than this, e.g. the token "capital", are too common to tell anything and skipped
+MAX_BLOCK_SIZE = 200
+# Only the organizations sharing the most blocks with a company are scored
+MAX_CANDIDATES = 20
+
+# Tokens that don't tell companies apart, "WorkWave" and "WorkWave Inc" are the same company
+LEGAL_SUFFIXES = {
+    "ab", "ag", "as", "asa", "bv", "co", "corp", "corporation", "gmbh", "group", "holding", "holdings", "inc",
+    "incorporated", "limited", "llc", "llp", "lp", "ltd", "nv", "oy", "oyj", "plc", "sa", "sas", "se", "spa", "srl",
+    "the",
+}
+
+# MinHash over the character trigrams of a normalized name, names whose trigram sets have a Jaccard similarity of
+# 0.5 share at least one band about two times out of three, at 0.7 more than nine times out of ten
+MINHASH_BANDS = 4
+MINHASH_ROWS = 2
+# Each hash function is (a * crc32(trigram) + b) mod p with its own random a and b, a universal hash family whose
+# minimums are close to independent. The band keys are stored in the enrichment store and have to be the same in every
+# process, bump BLOCKING_KEYS_VERSION when they change so existing stores rebuild their blocking index.
+MINHASH_PRIME = (1 << 31) - 1
+_minhash_random = random.Random(0)
+MINHASH_A = numpy.array([_minhash_random.randrange(1, MINHASH_PRIME) for _ in range(MINHASH_BANDS * MINHASH_ROWS)],
+                        dtype=numpy.uint64)[:, None]
+MINHASH_B = numpy.array([_minhash_random.randrange(MINHASH_PRIME) for _ in range(MINHASH_BANDS * MINHASH_ROWS)],
+                        dtype=numpy.uint64)[:, None]
+BLOCKING_KEYS_VERSION = 2
+
+
+def name_tokens(name):
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii").lower()
+    tokens = re.findall(r"[a-z0-9]+", text.replace("&", " and "))
+    # Legal suffixes are dropped from the end, the first token is always kept
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    if len(tokens) > 1 and tokens[0] == "the":
+        tokens.pop(0)
+    return tokens
+
+
+def normalize_name(name):
+    return " ".join(name_tokens(name))
+
+
+def minhash_band_keys(normalized_name):
+    # Normalized names are ascii, so byte trigrams are character trigrams
+    padded = f" {normalized_name} ".encode("ascii")
+    hashes = {zlib.crc32(padded[i:i + 3]) for i in range(len(padded) - 2)}
+    # a < 2**31 and the hashes < 2**32, so the products fit in 64 bits
+    hashes = numpy.fromiter(hashes, numpy.uint64, len(hashes))
+    signature = ((MINHASH_A * hashes + MINHASH_B) % MINHASH_PRIME).min(axis=1).tolist()
+    return [f"m{band}:{zlib.crc32(repr(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]).encode()):08x}"
+            for band in range(MINHASH_BANDS)]
+
+
+def blocking_keys(name, registered_domain):
+    # Companies and organizations that share a key are candidates for each other: the registered domain, its label
+    # (a company that moved from .com to .io), the normalized name, each of its tokens and its MinHash bands
+    keys = []
+    if isinstance(registered_domain, str):
+        keys += [f"d:{registered_domain}", f"l:{registered_domain.partition('.')[0]}"]
+    if isinstance(name, str):
+        tokens = name_tokens(name)
+        if tokens:
+            normalized_name = " ".join(tokens)
+            keys.append(f"n:{normalized_name}")
+            keys += [f"t:{token}" for token in set(tokens) if len(token) > 1 and token != normalized_name]
+            keys += minhash_band_keys(normalized_name)
+    return keys
+
+
+def rank_candidates(blocks):
+    # blocks: one list of (registered_domain, name) keys per blocking key of a company
+    shared_blocks = {}
+    for block in blocks:
+        if len(block) > MAX_BLOCK_SIZE:
+            continue
+        for key in block:
+            shared_blocks[key] = shared_blocks.get(key, 0) + 1
+    return sorted(shared_blocks, key=shared_blocks.get, reverse=True)[:MAX_CANDIDATES]
+
+
+def match_confidence(title, registered_domain, candidate):
+    # Name similarity, with a same registered domain making a weaker name match enough. An exact match has a
+    # confidence of 1, a fuzzy one at most 0.95
+    candidate_domain, candidate_name = candidate
+    similarity = difflib.SequenceMatcher(None, normalize_name(title), normalize_name(candidate_name)).ratio()
+    if isinstance(registered_domain, str) and registered_domain == candidate_domain:
+        return 0.5 + 0.45 * similarity
+    return 0.9 * similarity
+
+
+def best_match(title, registered_domain, candidates, threshold=MATCH_THRESHOLD):
+    scored = [(match_confidence(title, registered_domain, candidate), candidate) for candidate in candidates]
+    if not scored:
+        return None
+    confidence, candidate = max(scored, key=lambda item: item[0])
+    return (candidate, confidence) if confidence >= threshold else None
+
+
+def match_companies(titles, registered_domains, find_candidates, threshold=MATCH_THRESHOLD):
+    # One (organization key, confidence) per company, None where no candidate is good enough. find_candidates takes
+    # blocking keys and returns the ranked (registered_domain, name) keys of the candidate organizations
+    return [best_match(title, registered_domain, find_candidates(blocking_keys(title, registered_domain)), threshold)
+            if isinstance(title, str) else None for title, registered_domain in zip(titles, registered_domains)]
+
+
+class BlockIndex:
+    """In-memory blocking index of the organizations, for matching without the enrichment store."""
+
+    def __init__(self, registered_domains, names):
+        self.positions = {}
+        self.blocks = {}
+        for position, key in enumerate(zip(registered_domains, names)):
+            if not all(isinstance(value, str) for value in key):
+                continue
+            self.positions[key] = position
+            for block_key in blocking_keys(key[1], key[0]):
+                self.blocks.setdefault(block_key, []).append(key)
+
+    def find_candidates(self, block_keys):
+        return rank_candidates(self.blocks.get(block_key, ()) for block_key in block_keys)
@@ -1,20 +1,285 @@
+import gzip
 import io
+import json
+import logging
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas
 from google.cloud import storage
 
-from utils import time_function
+from metrics import metrics
+from utils import get_peak_rss_mb, time_function
+
+logger = logging.getLogger(__name__)
+
+BUCKET_NAME = "motherbrain-external-test"
+
+CACHE_DIR = "cache/gcs"
+CACHE_MAX_SIZE_MB = 1024
+CACHE_MAX_AGE_HOURS = 24 * 7
+
+CHUNK_SIZE = 100_000
+# Decompressed bytes handed to a parse worker at a time, cut at the last complete line
+PARALLEL_CHUNK_BYTES = 16 * 1024 * 1024
+
+# Columns kept when loading the enrichment data and the dtypes they are stored as,
+# low cardinality strings become categoricals and the rest are backed by pyarrow
+ORGANIZATION_DTYPES = {
+    "uuid": "string[pyarrow]",
+    "name": "string[pyarrow]",
+    "homepage_url": "string[pyarrow]",
+    "country_code": "category",
+    "city": "category",
+    "founded_on": "string[pyarrow]",
+    "short_description": "string[pyarrow]",
+    "employee_count": "category",
+    "num_funding_rounds": "float64",
+    "last_funding_on": "string[pyarrow]",
+    "total_funding_usd": "float64",
+}
+# Funding round values end up in plain dicts in the output, so they keep numpy/object dtypes
+FUNDING_DTYPES = {
+    "org_uuid": "string[pyarrow]",
+    "investor_count": "float64",
+    "announced_on": "object",
+    "investment_type": "category",
+    "raised_amount_usd": "float64",
+}
+
+
+class BlobCache:
+    """Parquet copies of parsed enrichment blobs on disk, keyed by blob name and the GCS generation and md5 hash.
+
+    The pipeline loads the blobs on separate threads, so every read-modify-write of the index holds the lock.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_size_mb=CACHE_MAX_SIZE_MB, max_age_hours=CACHE_MAX_AGE_HOURS):
+        self.directory = directory
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.max_age_seconds = max_age_hours * 60 * 60
+        self.index_path = os.path.join(directory, "index.json")
+        self.lock = threading.Lock()
+
+    def read_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                return json.load(index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def write_index(self, index):
+        os.makedirs(self.directory, exist_ok=True)
+        # A temporary file of its own, another process may be writing the index of the same directory
+        descriptor, temporary_path = tempfile.mkstemp(prefix="index.", suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as index_file:
+                json.dump(index, index_file, indent=4)
+            os.replace(temporary_path, self.index_path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    def get(self, blob, variant=None):
+        with self.lock:
+            index = self.read_index()
+            entry = index.get(blob.name)
+            if entry is None:
+                return None
+            if entry.get("variant") != variant:
+                # The cached copy was loaded with other columns or filters
+                return None
+            if entry["generation"] != blob.generation or entry["md5_hash"] != blob.md5_hash:
+                return None
+            if time.time() - entry["created"] > self.max_age_seconds:
+                return None
+
+            path = os.path.join(self.directory, entry["file"])
+            if not os.path.exists(path):
+                return None
+
+            entry["last_used"] = time.time()
+            self.write_index(index)
+        return pandas.read_parquet(path)
+
+    def put(self, blob, df, variant=None):
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = f"{blob.name.replace("/", "_")}.{blob.generation}.parquet"
+        path = os.path.join(self.directory, file_name)
+
+        # Write to a temporary file of its own first, so an interrupted run never leaves a truncated copy behind and
+        # another run caching the same generation never replaces the copy with a half-written one
+        descriptor, temporary_path = tempfile.mkstemp(prefix=f"{file_name}.", suffix=".tmp", dir=self.directory)
+        os.close(descriptor)
+        try:
+            df.to_parquet(temporary_path, index=False)
+        except Exception as err:
+            logger.warning(f"Could not cache {blob.name} as Parquet ({err!r})")
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            return
+        os.replace(temporary_path, path)
+
+        with self.lock:
+            index = self.read_index()
+            previous = index.get(blob.name)
+            if previous and previous["file"] != file_name:
+                self.remove_file(previous["file"])
+
+            now = time.time()
+            index[blob.name] = {
+                "generation": blob.generation,
+                "md5_hash": blob.md5_hash,
+                "file": file_name,
+                "variant": variant,
+                "size": os.path.getsize(path),
+                "created": now,
+                "last_used": now,
+            }
+            self.evict(index, keep=blob.name)
+            self.write_index(index)
+
+    def evict(self, index, keep=None):
+        # Drop the least recently used entries until the cache fits within its size limit
+        total_size = sum(entry["size"] for entry in index.values())
+        for name, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+            if total_size <= self.max_size_bytes:
+                break
+            if name == keep:
+                continue
+            self.remove_file(entry["file"])
+            total_size -= entry["size"]
+            del index[name]
+
+    def invalidate(self, blob_name=None):
+        with self.lock:
+            index = self.read_index()
+            names = [blob_name] if blob_name else list(index)
+            for name in names:
+                entry = index.pop(name, None)
+                if entry:
+                    self.remove_file(entry["file"])
+            self.write_index(index)
+        return names
+
+    def remove_file(self, file_name):
+        path = os.path.join(self.directory, file_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def get_storage_client():
+    return storage.Client.create_anonymous_client()
+
+
+def get_blob(file_path, storage_client=None):
+    # Only the metadata, e.g. generation and md5 hash, nothing is downloaded
+    storage_client = storage_client or get_storage_client()
+    return storage_client.bucket(BUCKET_NAME).get_blob(file_path)
+
+
+def read_enrichment_ndjson(file, dtypes=None, dropna_subset=None, chunksize=CHUNK_SIZE, workers=1):
+    # Decompress and parse the gzipped NDJSON a chunk of lines at a time, so only the projected columns of the
+    # rows that are kept stay in memory
+    if workers > 1:
+        return read_enrichment_ndjson_parallel(file, dtypes, dropna_subset, workers)
+
+    chunks = []
+    with gzip.open(file, "rt", encoding="utf-8") as ndjson:
+        with pandas.read_json(ndjson, lines=True, chunksize=chunksize) as reader:
+            for chunk in reader:
+                chunks.append(prepare_chunk(chunk, dtypes, dropna_subset))
+    return concat_chunks(chunks, dtypes)
+
+
+def read_enrichment_ndjson_parallel(file, dtypes=None, dropna_subset=None, workers=2,
+                                    chunk_bytes=PARALLEL_CHUNK_BYTES):
+    # Decompression stays in this process, the line-aligned chunks it yields are parsed in a pool of processes. Only
+    # a couple of chunks per worker are in flight at a time, and their results are concatenated in order.
+    # Spawned rather than forked workers, the pipeline runs its stages on threads
+    chunks = []
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as executor, \
+            gzip.open(file, "rb") as ndjson:
+        for data in split_lines(ndjson, chunk_bytes):
+            pending.append(executor.submit(parse_ndjson_chunk, data, dtypes, dropna_subset))
+            if len(pending) >= 2 * workers:
+                chunks.append(pending.popleft().result())
+        chunks += [future.result() for future in pending]
+    return concat_chunks(chunks, dtypes)
+
+
+def split_lines(stream, chunk_bytes=PARALLEL_CHUNK_BYTES):
+    remainder = b""
+    while block := stream.read(chunk_bytes):
+        data = remainder + block
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            remainder = data
+            continue
+        remainder = data[end:]
+        yield data[:end]
+    if remainder.strip():
+        yield remainder
+
+
+def parse_ndjson_chunk(data, dtypes=None, dropna_subset=None):
+    if not data.strip():
+        return prepare_chunk(pandas.DataFrame(), dtypes, dropna_subset)
+    return prepare_chunk(pandas.read_json(io.BytesIO(data), lines=True), dtypes, dropna_subset)
+
+
+def prepare_chunk(chunk, dtypes=None, dropna_subset=None):
+    # Categories are only known once every chunk is loaded, until then those columns are strings
+    if dtypes:
+        chunk = chunk.reindex(columns=list(dtypes))
+    if dropna_subset:
+        chunk = chunk.dropna(subset=dropna_subset)
+    return chunk.astype({column: "string[pyarrow]" if dtype == "category" else dtype
+                         for column, dtype in (dtypes or {}).items()})
+
+
+def concat_chunks(chunks, dtypes=None):
+    if not chunks:
+        return pandas.DataFrame(columns=list(dtypes) if dtypes else None).astype(dtypes or {})
+
+    df = pandas.concat(chunks, ignore_index=True)
+    return df.astype({column: "category" for column, dtype in (dtypes or {}).items() if dtype == "category"})
 
 
 @time_function
-def fetch_enrichment_data(file_path):
-    # Download the .json.gz file from Google Cloud Storage
-    storage_client = storage.Client.create_anonymous_client()
-    bucket = storage_client.bucket("motherbrain-external-test")
-    blob = bucket.blob(file_path)
-    file_buffer = io.BytesIO(blob.download_as_bytes())
-
-    # Load the JSON data into a Pandas DataFrame
-    df = pandas.read_json(file_buffer, lines=True, compression="gzip")
+def fetch_enrichment_data(file_path, cache=None, storage_client=None, dtypes=None, dropna_subset=None,
+                          parse_workers=1):
+    storage_client = storage_client or get_storage_client()
+    bucket = storage_client.bucket(BUCKET_NAME)
+    variant = {"columns": list(dtypes) if dtypes else None, "dropna_subset": dropna_subset}
+
+    # Only the blob metadata is requested here, the download is skipped if the cached copy is up to date. A missing
+    # object isn't cached, opening it below fails the same way as without the cache
+    blob = bucket.get_blob(file_path) if cache is not None else None
+    if blob is None:
+        blob = bucket.blob(file_path)
+        cache = None
+    else:
+        df = cache.get(blob, variant)
+        if df is not None:
+            logger.info(f"Loaded {file_path} (generation {blob.generation}) from local cache")
+            metrics.increment("gcs_cache_lookups_total", blob=file_path, outcome="hit")
+            return df
+        metrics.increment("gcs_cache_lookups_total", blob=file_path, outcome="miss")
+
+    # Stream the .json.gz file from Google Cloud Storage into a Pandas DataFrame
+    with blob.open("rb") as stream:
+        df = read_enrichment_ndjson(stream, dtypes, dropna_subset, workers=parse_workers)
+        metrics.increment("gcs_downloaded_bytes_total", stream.tell(), blob=file_path)
+    logger.info(f"Peak RSS after loading {file_path}: {get_peak_rss_mb():.1f} MB")
+
+    if cache is not None:
+        cache.put(blob, df, variant)
 
     return df
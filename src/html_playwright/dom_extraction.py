@@ -0,0 +1,89 @@
+# Each script collects everything needed from a page in one evaluate call, instead of one round trip to the browser
+# per element and per text_content. The raw texts are cleaned up in Python, the same way the scrapers always have.
+
+LISTING_SCRIPT = """() => {
+    const table = document.evaluate("//*[@id='content']/div[2]/div/div/div[2]/ul", document, null,
+                                    XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!table) {
+        return [];
+    }
+    const rows = [];
+    for (const row of table.querySelectorAll("li.items-center")) {
+        const parts = row.querySelectorAll("span.flex-1");
+        if (parts.length > 4) {
+            const link = parts[0].querySelector("a");
+            rows.push({
+                link: link ? link.getAttribute("href") : null,
+                texts: Array.from(parts).slice(0, 6).map(part => part.textContent),
+            });
+        }
+    }
+    return rows;
+}"""
+
+DETAILS_SCRIPT = """() => {
+    const byXPath = xpath => document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE,
+                                               null).singleNodeValue;
+    const leftColumn = byXPath("//*[@id='gatsby-focus-wrapper']/main/div[1]");
+    const heading = leftColumn && leftColumn.querySelector("h2.font-h3");
+    const preamble = leftColumn && leftColumn.querySelector("p.font-preamble");
+    const rows = [];
+    for (const item of leftColumn ? leftColumn.querySelectorAll("li.flex") : []) {
+        const parts = item.querySelectorAll("div.flex-1");
+        if (parts.length > 1) {
+            rows.push([parts[0].textContent, parts[1].textContent]);
+        }
+    }
+    const description = byXPath("//*[@id='gatsby-focus-wrapper']/main/div[4]");
+    return {
+        heading: heading ? heading.textContent : null,
+        preamble: preamble ? preamble.textContent : null,
+        rows: rows,
+        description: description
+            ? Array.from(description.querySelectorAll("p.font-body")).map(part => part.textContent).join("")
+            : "",
+    };
+}"""
+
+
+def extract_company_listings(page):
+    data = []
+    for row in page.evaluate(LISTING_SCRIPT):
+        title, sector, country, fund, portfolio_entry = row["texts"][:5]
+        portfolio_exit = row["texts"][5] if len(row["texts"]) > 5 else None
+
+        # Cleaning up and structuring the data
+        data.append({
+            "title": title.strip(),
+            "sector": sector.strip(),
+            "country": country.strip(),
+            "fund": fund.strip(),
+            "entry": portfolio_entry.strip(),
+            "exit": portfolio_exit.strip() if portfolio_exit else None,
+            "company_details_path": row["link"],
+        })
+    return data
+
+
+def extract_sub_page(page):
+    details = page.evaluate(DETAILS_SCRIPT)
+
+    result = {
+        "heading": details["heading"],
+        "preamble": details["preamble"],
+    }
+
+    for key, value in details["rows"]:
+        key = key.strip().lower().replace(" ", "_")
+        if key in result:
+            existing_value = result[key]
+            if not isinstance(existing_value, list):
+                # If the existing value is not a list, convert it to a list
+                result[key] = [existing_value]
+            result[key].append(value)
+        else:
+            # If the key doesn't exist, add it with the value
+            result[key] = value
+
+    result["description"] = details["description"]
+    return result
@@ -0,0 +1,72 @@
+import logging
+from urllib.parse import urlsplit
+
+import msgspec
+from playwright.sync_api import Error as PlaywrightError
+from playwright.sync_api import sync_playwright
+
+from page_data.page_data_extraction import decode_details, decode_listing, extract_details, get_listing_data
+
+logger = logging.getLogger(__name__)
+
+# Nothing is rendered, so only documents, scripts and the page data requests themselves are let through
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+BLOCKED_HOSTS = ("google-analytics.com", "googletagmanager.com", "doubleclick.net", "hotjar.com", "cookiebot.com",
+                 "facebook.net", "linkedin.com", "vimeo.com", "youtube.com")
+
+PAGE_DATA_TIMEOUT = 30_000
+
+
+def block_unneeded_requests(route):
+    request = route.request
+    host = urlsplit(request.url).hostname or ""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_HOSTS):
+        route.abort()
+    else:
+        route.continue_()
+
+
+def capture_page_data(page, url):
+    # Gatsby fetches /page-data/<path>/page-data.json for the page it hydrates, grab that response instead of
+    # waiting for the page to render and reading the DOM
+    page_data_path = f"/page-data{urlsplit(url).path}page-data.json"
+    with page.expect_response(lambda response: urlsplit(response.url).path == page_data_path,
+                              timeout=PAGE_DATA_TIMEOUT) as response_info:
+        page.goto(url, wait_until="commit")
+    return response_info.value.body()
+
+
+def scrape_website(url, shard=None):
+    base_url = f"{urlsplit(url).scheme}://{urlsplit(url).netloc}"
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = browser.new_context()
+        context.route("**/*", block_unneeded_requests)
+        page = context.new_page()
+
+        companies = decode_listing(capture_page_data(page, url))
+        if shard is not None:
+            companies = shard.select(companies, lambda company: company.path)
+
+        data = []
+        for company in companies:
+            company_data = get_listing_data(company)
+            company_details = None
+            if company.path:
+                try:
+                    company_details = decode_details(capture_page_data(page, f"{base_url}{company.path}"))
+                except (PlaywrightError, msgspec.DecodeError) as err:
+                    logger.warning(f"Failed to fetch details for: {company.title} ({err!r})")
+                    data.append(company_data)
+                    continue
+
+            if not company_details:
+                logger.warning(f"No details could be found for: {company.title}")
+                data.append(company_data)
+                continue
+
+            data.append(company_data | extract_details(company_details))
+
+        browser.close()
+        return data
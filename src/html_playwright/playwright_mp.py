@@ -1,60 +1,65 @@
+import logging
 import multiprocessing as mp
+from multiprocessing.util import Finalize
+from urllib.parse import urlsplit
 
 from playwright.sync_api import sync_playwright
 
+from domains import get_registered_domain
+from html_playwright.dom_extraction import extract_company_listings, extract_sub_page
+
+logger = logging.getLogger(__name__)
+
+# Browsers are recycled after this many detail pages to cap their memory growth, 0 never recycles them
+PAGES_PER_BROWSER = 50
+BASE_URL = "https://eqtgroup.com"
+
+# Every pool worker launches one browser with one page when it starts, and reuses it for all of its detail pages. The
+# sync API drives one page at a time, so more pages per worker would only add memory, the pool of reusable pages is
+# the pool of workers, sized with --browser-workers
+worker_state = {}
+
+
+def launch_browser():
+    browser = worker_state["playwright"].chromium.launch(headless=True)
+    worker_state["browser"] = browser
+    worker_state["page"] = browser.new_page(viewport={"width": 1920, "height": 1080})
+    worker_state["pages_scraped"] = 0
+
+
+def init_worker(pages_per_browser, base_url=BASE_URL):
+    worker_state["playwright"] = sync_playwright().start()
+    worker_state["pages_per_browser"] = pages_per_browser
+    worker_state["base_url"] = base_url
+    launch_browser()
+    # Runs when the worker process exits after Pool.close(), so the browser and driver are shut down cleanly
+    Finalize(None, stop_worker, exitpriority=10)
+
+
+def stop_worker():
+    worker_state["browser"].close()
+    worker_state["playwright"].stop()
+
 
 def scrape_sub_page(company):
     url = company.get("company_details_path")
     if url is None:
         return {}
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page(viewport={"width": 1920, "height": 1080})
-        page.goto(f"https://eqtgroup.com{url}")
+    pages_per_browser = worker_state["pages_per_browser"]
+    if pages_per_browser and worker_state["pages_scraped"] >= pages_per_browser:
+        worker_state["browser"].close()
+        launch_browser()
 
-        # Wait for page to load
-        page.wait_for_load_state("networkidle")
-        page.wait_for_load_state("domcontentloaded")
+    page = worker_state["page"]
+    worker_state["pages_scraped"] += 1
+    page.goto(f"{worker_state["base_url"]}{url}")
 
-        left_column = page.query_selector("//*[@id='gatsby-focus-wrapper']/main/div[1]")
-
-        heading = left_column.query_selector("h2.font-h3")
-        preamble = left_column.query_selector("p.font-preamble")
-
-        result = {
-            "heading": heading.text_content() if heading else None,
-            "preamble": preamble.text_content() if preamble else None,
-        }
-
-        tabular_information = left_column.query_selector_all("li.flex")
-        for item in tabular_information:
-            parts = item.query_selector_all("div.flex-1")
-            if len(parts) > 1:
-                key = parts[0].text_content().strip().lower().replace(" ", "_")
-                value = parts[1].text_content()
-                if key in result:
-                    existing_value = result[key]
-                    if not isinstance(existing_value, list):
-                        # If the existing value is not a list, convert it to a list
-                        result[key] = [existing_value]
-                    result[key].append(value)
-                else:
-                    # If the key doesn't exist, add it with the value
-                    result[key] = value
-
-        description_text = ""
-        description = page.query_selector("//*[@id='gatsby-focus-wrapper']/main/div[4]")
-        if description:
-            description_parts = description.query_selector_all("p.font-body")
-            for part in description_parts:
-                description_text += part.text_content()
-        result["description"] = description_text
-
-        page.close()
-        browser.close()
+    # Wait for page to load
+    page.wait_for_load_state("networkidle")
+    page.wait_for_load_state("domcontentloaded")
 
-        return result
+    return extract_sub_page(page)
 
 
 def scrape_company_listings(url):
@@ -67,53 +72,35 @@ def scrape_company_listings(url):
         page.wait_for_load_state("networkidle")
         page.wait_for_load_state("domcontentloaded")
 
-        company_table = page.query_selector("//*[@id='content']/div[2]/div/div/div[2]/ul")
-        company_table_rows = company_table.query_selector_all("li.items-center")
-
-        data = []
-
-        for row in company_table_rows:
-            # Ensure there are at least 4 spans as expected
-            parts = row.query_selector_all("span.flex-1")
-            if len(parts) > 4:
-                link_element = parts[0].query_selector("a")
-                page_link = link_element.get_attribute("href") if link_element else None
-
-                title = parts[0].text_content()
-                sector = parts[1].text_content()
-                country = parts[2].text_content()
-                fund = parts[3].text_content()
-                portfolio_entry = parts[4].text_content()
-                try:
-                    portfolio_exit = parts[5].text_content()
-                except IndexError:
-                    portfolio_exit = None
-
-                # Cleaning up and structuring the data
-                data.append({
-                    "title": title.strip(),
-                    "sector": sector.strip(),
-                    "country": country.strip(),
-                    "fund": fund.strip(),
-                    "entry": portfolio_entry.strip(),
-                    "exit": portfolio_exit.strip() if portfolio_exit else None,
-                    "company_details_path": page_link
-                })
+        data = extract_company_listings(page)
 
         browser.close()
         return data
 
 
-def scrape_website(url):
+def scrape_website(url, workers=None, pages_per_browser=PAGES_PER_BROWSER, shard=None):
+    base_url = f"{urlsplit(url).scheme}://{urlsplit(url).netloc}"
     companies = scrape_company_listings(url)
-    with mp.Pool(processes=mp.cpu_count()) as pool:
-        company_details = pool.map(scrape_sub_page, companies)
+    if shard is not None:
+        companies = shard.select(companies, lambda company: company["company_details_path"])
+    # Spawned rather than forked workers, the pipeline runs this scrape on a thread next to the stages loading from GCS
+    pool = mp.get_context("spawn").Pool(processes=workers or mp.cpu_count(), initializer=init_worker,
+                                        initargs=(pages_per_browser, base_url))
+    try:
+        # One company at a time per worker, so a few slow pages don't hold up a whole chunk
+        company_details = pool.map(scrape_sub_page, companies, chunksize=1)
+    finally:
+        # close and join rather than terminate, so the workers get to close their browsers
+        pool.close()
+        pool.join()
 
     if len(companies) != len(company_details):
-        print(f"Companies length ({len(companies)}) did not match length of company details ({len(company_details)})")
-        return companies
+        logger.error(f"Companies length ({len(companies)}) did not match length of company details "
+                     f"({len(company_details)})")
+        company_details = [{} for _ in companies]
 
     for index, company in enumerate(companies):
         company |= company_details[index]
+        company["registered_domain"] = get_registered_domain(company.get("web"))
 
     return companies
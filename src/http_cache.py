@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from metrics import metrics
+
+HTTP_CACHE_DIR = "cache/http"
+
+
+class CacheEntry:
+    def __init__(self, url, body, etag=None, last_modified=None, stored=None):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored = stored if stored is not None else time.time()
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class HttpCache:
+    """Response bodies stored on disk per url, together with the validators needed for conditional requests.
+
+    Without max_age every lookup is revalidated with If-None-Match/If-Modified-Since, with max_age entries younger
+    than that many seconds are used without any request at all.
+    """
+
+    def __init__(self, directory=HTTP_CACHE_DIR, max_age=None):
+        self.directory = directory
+        self.max_age = max_age
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def path(self, url):
+        return os.path.join(self.directory, f"{hashlib.sha256(url.encode("utf-8")).hexdigest()}.cache")
+
+    def lookup(self, url):
+        # The first line of a cache file holds the metadata as JSON, the rest is the response body
+        try:
+            with open(self.path(url), "rb") as cache_file:
+                metadata = json.loads(cache_file.readline())
+                body = cache_file.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        if metadata.get("url") != url:
+            return None
+        return CacheEntry(url, body, metadata.get("etag"), metadata.get("last_modified"), metadata.get("stored"))
+
+    def is_fresh(self, entry):
+        return entry is not None and self.max_age is not None and time.time() - entry.stored < self.max_age
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store(self, url, body, headers, validate=None):
+        entry = CacheEntry(url, body, headers.get("ETag"), headers.get("Last-Modified"))
+        # A body validate raises on, e.g. an HTML error page answered with 200 or truncated JSON, is never cached,
+        # and the previous entry is dropped so the next run downloads the page again
+        if validate is not None and not is_valid(validate, body):
+            metrics.increment("http_cache_invalid_bodies_total")
+            self.remove(url)
+            return entry
+        self.write(entry)
+        return entry
+
+    def remove(self, url):
+        try:
+            os.remove(self.path(url))
+        except FileNotFoundError:
+            pass
+
+    def refresh(self, entry, headers):
+        # A 304 may come with updated validators, and restarts the max_age clock
+        entry.etag = headers.get("ETag", entry.etag)
+        entry.last_modified = headers.get("Last-Modified", entry.last_modified)
+        entry.stored = time.time()
+        self.write(entry)
+        return entry
+
+    def write(self, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        metadata = {"url": entry.url, "etag": entry.etag, "last_modified": entry.last_modified, "stored": entry.stored}
+        # Write to a temporary file and move it in place, so readers on other threads never see a partial file
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as cache_file:
+            cache_file.write(json.dumps(metadata).encode("utf-8") + b"\n")
+            cache_file.write(entry.body)
+        os.replace(temporary_path, self.path(entry.url))
+
+    def record(self, outcome):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+        metrics.increment("http_cache_lookups_total", outcome=outcome)
+
+    def summary(self):
+        return (f"HTTP cache: {self.hits} fresh hits, {self.revalidated} revalidated (304), "
+                f"{self.misses} misses")
+
+
+def is_valid(validate, body):
+    try:
+        validate(body)
+    except Exception:
+        return False
+    return True
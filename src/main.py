@@ -1,138 +1,637 @@
 import argparse
 import asyncio
+import contextlib
+import logging
+import os
+import statistics
+import sys
 import time
-
-import pandas
-
-from gcs_client import fetch_enrichment_data
-from page_data.page_data_sync import get_registered_domain
-from utils import time_function, save_df_to_file
+from functools import partial
+
+from checkpoint import CHECKPOINT_DIR, Checkpoint, get_checkpoint_path
+from http_cache import HttpCache
+from metrics import metrics
+from pipeline import Pipeline
+from rate_control import RateController
+from result_writer import (COMPRESSIONS, DEFAULT_OUTPUT_FORMAT, FILENAME_PATTERN, OUTPUT_FORMATS, RESULTS_DIR,
+                           NdjsonSink, get_output_path, read_ndjson, write_results)
+from sharding import SHARD_FILENAME_SUFFIX, merge_shards, parse_shard
+from snapshot import DELTA_FILENAME_PATTERN, SNAPSHOT_FILENAME, DeltaSink, write_delta
+from utils import get_peak_rss_mb, time_function
+
+logger = logging.getLogger(__name__)
+
+# pandas, google-cloud-storage, aiohttp and playwright are imported by the commands that use them, so --help and
+# scrape don't wait for them. The defaults of modules that import them are repeated here, test_startup checks they
+# stay the same
+STORE_PATH = "cache/enrichment.sqlite3"
+MATCH_THRESHOLD = 0.8
+SCRAPE_INTERVAL_MINUTES = 60
+REFRESH_INTERVAL_MINUTES = 15
+
+COMMANDS = {
+    "scrape": "Scrape the portfolio and write the company data as found on the website, without enriching it",
+    "enrich": "Enrich company data written by scrape with organizations and funding rounds",
+    "full": "Scrape the portfolio and enrich it, what runs when no command is given",
+    "bench": "Time runs of the full pipeline against --base-url without writing any results",
+    "merge": "Merge the ndjson files written by the shards of a --shard run into the result of an unsharded run",
+}
+SCRAPED_FILENAME_PATTERN = "scraped_{timestamp}"
+# A checkpoint is only resumed by a run with the same values for these, the ones that change the result
+CHECKPOINT_OPTIONS = ["command", "input", "shard", "type", "base_url", "use_html_scraper", "intercept_page_data",
+                      "skip_funding_rounds", "no_enrichment_store", "enrichment_store", "fuzzy_matching",
+                      "fuzzy_threshold"]
 
 
 @time_function
-def get_company_data_from_html(args):
-    if args.synchronous:
+def get_company_data_from_html(args, shard=None):
+    if args.intercept_page_data:
+        from html_playwright.playwright_intercept import scrape_website
+    elif args.synchronous:
         from html_playwright.playwright_sp import scrape_website
     else:
         from html_playwright.playwright_mp import scrape_website
+        scrape_website = partial(scrape_website, workers=args.browser_workers,
+                                 pages_per_browser=args.pages_per_browser)
 
     company_data = []
-    if "current" in args.type:
-        company_data += scrape_website("https://eqtgroup.com/current-portfolio/")
-    if "divested" in args.type:
-        company_data += scrape_website("https://eqtgroup.com/current-portfolio/divestments/")
-
-    for company in company_data:
-        company["registered_domain"] = get_registered_domain(company.get("web"))
+    for path in get_portfolio_paths(args.type):
+        company_data += scrape_website(f"{args.base_url}{path}", shard=shard)
 
     return company_data
 
 
-@time_function
-def get_company_data_from_page_data(portfolio_type):
-    from page_data.page_data_sync import fetch_companies, get_company_data
-
-    companies = []
+def get_portfolio_paths(portfolio_type):
+    portfolio_paths = []
     if "current" in portfolio_type:
-        companies += fetch_companies("https://eqtgroup.com/page-data/current-portfolio/page-data.json")
+        portfolio_paths.append("/current-portfolio/")
     if "divested" in portfolio_type:
-        companies += fetch_companies("https://eqtgroup.com/page-data/current-portfolio/divestments/page-data.json")
+        portfolio_paths.append("/current-portfolio/divestments/")
+    return portfolio_paths
+
+
+@time_function
+def get_company_data_from_page_data(args, http_cache=None, checkpoint=None, shard=None):
+    from page_data.page_data_sync import create_session, fetch_companies, get_company_data
 
-    company_data = get_company_data(companies)
+    with create_session(pool_size=args.threads, max_retries=args.max_retries,
+                        rate_controller=create_rate_controller(args, args.threads)) as session:
+        companies = []
+        for path in get_portfolio_paths(args.type):
+            companies += fetch_companies(f"{args.base_url}/page-data{path}page-data.json", session)
+        if shard is not None:
+            companies = shard.select(companies, lambda company: company.path)
+
+        company_data = get_company_data(companies, session, threads=args.threads, base_url=args.base_url,
+                                        cache=http_cache, checkpoint=checkpoint)
 
     return company_data
 
 
 @time_function
-def get_company_data_from_page_data_async(portfolio_type):
-    from page_data.page_data_async import fetch_companies, get_company_data
+def get_company_data_from_page_data_async(args, http_cache=None, checkpoint=None, shard=None):
+    from page_data.page_data_async import scrape
+
+    company_data = asyncio.run(scrape(get_portfolio_paths(args.type), base_url=args.base_url,
+                                      max_concurrent_requests=args.max_concurrent_requests,
+                                      max_connections_per_host=args.max_connections_per_host,
+                                      max_retries=args.max_retries, cache=http_cache,
+                                      rate_controller=create_rate_controller(args, args.max_concurrent_requests),
+                                      checkpoint=checkpoint, shard=shard))
+
+    return company_data
 
-    companies = []
-    if "current" in portfolio_type:
-        companies += asyncio.run(fetch_companies("https://eqtgroup.com/page-data/current-portfolio/page-data.json"))
-    if "divested" in portfolio_type:
-        companies += asyncio.run(
-            fetch_companies("https://eqtgroup.com/page-data/current-portfolio/divestments/page-data.json"))
 
-    company_data = asyncio.run(get_company_data(companies))
+def create_rate_controller(args, max_limit):
+    if not args.adaptive_concurrency and args.max_rps is None:
+        return None
+    return RateController(max_limit, max_rps=args.max_rps, adaptive=args.adaptive_concurrency)
 
+
+def scrape_companies(args, checkpoint=None):
+    # Each shard keeps the listing positions of its companies, merge puts them back in that order
+    shard = parse_shard(args.shard) if getattr(args, "shard", None) else None
+    if args.use_html_scraper:
+        company_data = get_company_data_from_html(args, shard)
+    else:
+        http_cache = None if args.no_http_cache else HttpCache(args.http_cache_dir, args.http_cache_max_age)
+        if args.synchronous:
+            company_data = get_company_data_from_page_data(args, http_cache, checkpoint, shard)
+        else:
+            company_data = get_company_data_from_page_data_async(args, http_cache, checkpoint, shard)
+        if http_cache is not None:
+            logger.info(http_cache.summary())
+    if shard is not None:
+        company_data = shard.add_positions(company_data)
+    logger.info(f"{len(company_data)} companies were found by scraping website")
+    metrics.set("rows", len(company_data), stage="scraped")
     return company_data
 
 
-@time_function
-def get_funding_rounds(companies_data):
-    funding_rounds = fetch_enrichment_data("interview-test-funding.json.gz")
-    print(f"{len(funding_rounds.index)} funding round entries were loaded from CGS")
+def scrape_company_data(args, checkpoint=None):
+    import pandas
+
+    return pandas.DataFrame.from_dict(scrape_companies(args, checkpoint))
+
+
+def read_company_data(path):
+    import pandas
+
+    company_data = read_ndjson(path)
+    logger.info(f"{len(company_data)} companies were read from {path}")
+    metrics.set("rows", len(company_data), stage="scraped")
+    return pandas.DataFrame.from_dict(company_data)
+
+
+def prepare_lookup(args, cache=None):
+    # The enrichment store, or the enrichment data in memory, for enriching streamed companies one at a time
+    from enrichment import (group_funding_rounds, index_organizations, load_funding_rounds, load_organizations,
+                            prepare_funding_rounds, prepare_organizations)
+    from enrichment_store import EnrichmentStore
+    from streaming import MemoryLookup
+
+    if args.no_enrichment_store:
+        organizations = load_organizations(cache, parse_workers=args.parse_workers)
+        rounds_by_uuid = None if args.skip_funding_rounds else group_funding_rounds(
+            load_funding_rounds(cache, parse_workers=args.parse_workers))
+        block_index = index_organizations(organizations) if args.fuzzy_matching else None
+        return MemoryLookup(organizations, rounds_by_uuid, block_index)
+
+    store = EnrichmentStore(args.enrichment_store)
+    prepare_organizations(store, cache, fuzzy_matching=args.fuzzy_matching, parse_workers=args.parse_workers)
+    if not args.skip_funding_rounds:
+        prepare_funding_rounds(store, cache, parse_workers=args.parse_workers)
+    return store
+
+
+def stream_companies(args, http_cache=None):
+    from page_data.page_data_async import stream
+
+    return stream(get_portfolio_paths(args.type), base_url=args.base_url,
+                  max_concurrent_requests=args.max_concurrent_requests,
+                  max_connections_per_host=args.max_connections_per_host, max_retries=args.max_retries,
+                  cache=http_cache, rate_controller=create_rate_controller(args, args.max_concurrent_requests))
 
-    result = []
-    for company in companies_data.itertuples():
-        company_uuid = company.uuid
-        if not isinstance(company_uuid, str):
-            result.append([])
-            continue
 
-        rounds = funding_rounds.query(f'org_uuid == "{company_uuid}"')
-        if rounds.empty:
-            result.append([])
-            continue
+async def stream_company_data(args, cache=None):
+    from streaming import enrich_record
 
-        result.append(
-            rounds[["investor_count", "announced_on", "investment_type", "raised_amount_usd"]].to_dict("records"))
+    http_cache = None if args.no_http_cache else HttpCache(args.http_cache_dir, args.http_cache_max_age)
+    # The enrichment data is prepared on a thread while the first companies are scraped, only the first company to
+    # arrive waits for it
+    lookup_task = asyncio.create_task(asyncio.to_thread(prepare_lookup, args, cache))
+    fuzzy_threshold = args.fuzzy_threshold if args.fuzzy_matching else None
+
+    start = time.perf_counter()
+    count = 0
+    with contextlib.ExitStack() as stack:
+        sinks = []
+        if not args.delta_only:
+            path = get_output_path(args.output_dir, args.output_filename, "ndjson", args.output_compression)
+            sinks.append(stack.enter_context(NdjsonSink(path, args.output_compression)))
+        if args.delta:
+            sinks.append(stack.enter_context(DeltaSink(get_delta_path(args), get_snapshot_path(args),
+                                                       args.output_compression)))
+        async for company_data in stream_companies(args, http_cache):
+            lookup = await lookup_task
+            record = enrich_record(company_data, lookup, not args.skip_funding_rounds, fuzzy_threshold)
+            for sink in sinks:
+                sink.write(record)
+            count += 1
+            if count == 1:
+                logger.info(f"First company written after {time.perf_counter() - start:.3f} seconds")
+                metrics.set("first_record_seconds", time.perf_counter() - start)
+        await lookup_task
+
+    if http_cache is not None:
+        logger.info(http_cache.summary())
+    logger.info(f"{count} companies were scraped, enriched and written")
+    metrics.set("rows", count, stage="scraped")
+
+
+def get_snapshot_path(args):
+    return args.snapshot or os.path.join(args.output_dir, SNAPSHOT_FILENAME)
+
+
+def get_delta_path(args):
+    return get_output_path(args.output_dir, DELTA_FILENAME_PATTERN, "ndjson", args.output_compression)
+
+
+def get_checkpoint_options(args):
+    return {name: getattr(args, name, None) for name in CHECKPOINT_OPTIONS}
+
+
+def serve(args, cache=None):
+    from enrichment import get_enrichment_version
+    from service import PortfolioService
+    from streaming import enrich_record
+
+    http_cache = None if args.no_http_cache else HttpCache(args.http_cache_dir, args.http_cache_max_age)
+    fuzzy_threshold = args.fuzzy_threshold if args.fuzzy_matching else None
+    service = PortfolioService(
+        load_enrichment=partial(prepare_lookup, args, cache),
+        enrichment_version=partial(get_enrichment_version, args.skip_funding_rounds),
+        scrape=partial(stream_companies, args, http_cache),
+        enrich=lambda company_data, lookup: enrich_record(company_data, lookup, not args.skip_funding_rounds,
+                                                          fuzzy_threshold),
+        scrape_interval=args.scrape_interval_minutes * 60, refresh_interval=args.refresh_interval_minutes * 60)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+@contextlib.contextmanager
+def open_checkpoint(args):
+    # Only with --checkpoint or --resume, saving every stage costs time on runs nobody resumes. Removed once the run
+    # finishes, kept for --resume when it fails
+    if not (args.checkpoint or args.resume):
+        yield None
+        return
+    options = get_checkpoint_options(args)
+    checkpoint = Checkpoint(get_checkpoint_path(args.checkpoint_dir, options), options, resume=args.resume)
+    completed = False
+    try:
+        yield checkpoint
+        completed = True
+    finally:
+        checkpoint.close(completed)
+
+
+def open_blob_cache(args):
+    from gcs_client import BlobCache
+
+    return None if args.no_cache else BlobCache(args.cache_dir, args.cache_max_size_mb, args.cache_max_age_hours)
+
+
+def clear_cache(args):
+    from enrichment_store import EnrichmentStore
+    from gcs_client import BlobCache
+
+    cleared = BlobCache(args.cache_dir).invalidate()
+    logger.info(f"Removed {len(cleared)} entries from the enrichment data cache")
+    if not args.no_enrichment_store:
+        EnrichmentStore(args.enrichment_store).invalidate()
+        logger.info(f"Emptied the enrichment store {args.enrichment_store}")
+
+
+def run_scrape(args):
+    with open_checkpoint(args) as checkpoint:
+        company_data = scrape_companies(args, checkpoint)
+        path = get_output_path(args.output_dir, args.output_filename, "ndjson", args.output_compression)
+        with NdjsonSink(path, args.output_compression) as sink:
+            for record in company_data:
+                sink.write(record)
+
+
+def run_enrich(args):
+    if args.clear_cache:
+        clear_cache(args)
+        return
+    with open_checkpoint(args) as checkpoint:
+        pipeline, result_stage = build_pipeline(args, ("read_companies", lambda: read_company_data(args.input)),
+                                                open_blob_cache(args), checkpoint)
+        results = pipeline.run()
+        logger.info(pipeline.report())
+        write_output(args, results[result_stage])
+
+
+def run_full(args):
+    if args.clear_cache:
+        clear_cache(args)
+        return
+    if args.serve:
+        serve(args, open_blob_cache(args))
+        return
+    if args.stream:
+        asyncio.run(stream_company_data(args, open_blob_cache(args)))
+        return
+
+    with open_checkpoint(args) as checkpoint:
+        pipeline, result_stage = build_pipeline(args, ("scrape", lambda: scrape_company_data(args, checkpoint)),
+                                                open_blob_cache(args), checkpoint)
+        results = pipeline.run()
+        logger.info(pipeline.report())
+        write_output(args, results[result_stage])
+
+
+def run_bench(args):
+    # Later runs show the effect of the HTTP cache, the enrichment data cache and the enrichment store
+    cache = open_blob_cache(args)
+    wall_times = []
+    for repeat in range(args.repeat):
+        pipeline, _ = build_pipeline(args, ("scrape", lambda: scrape_company_data(args)), cache)
+        pipeline.run()
+        wall_times.append(pipeline.wall_time)
+        print(f"Run {repeat + 1} of {args.repeat}:\n{pipeline.report()}\n")
+    print(f"Wall time median {statistics.median(wall_times):.3f} seconds, min {min(wall_times):.3f}, "
+          f"max {max(wall_times):.3f}, peak RSS {get_peak_rss_mb():.1f} MB")
+
+
+def run_merge(args):
+    import pandas
+
+    write_output(args, pandas.DataFrame.from_dict(merge_shards(args.input)))
+
+
+def build_pipeline(args, companies_stage, cache=None, checkpoint=None):
+    from enrichment import (add_funding_rounds, index_organizations, load_funding_rounds, load_organizations,
+                            lookup_company_data, lookup_funding_rounds, merge_company_data, prepare_funding_rounds,
+                            prepare_organizations)
+    from enrichment_store import EnrichmentStore
+
+    # The enrichment data doesn't depend on the scrape, so it is downloaded and cleaned while the website is scraped.
+    # The stages that take long or are expensive to repeat are kept in the checkpoint, the enrichment store already
+    # keeps the cleaned enrichment data on disk
+    companies, load_companies = companies_stage
+    pipeline = Pipeline(checkpoint)
+    pipeline.add(companies, load_companies, checkpoint=True)
+    if args.no_enrichment_store:
+        pipeline.add("load_organizations", lambda: load_organizations(cache, parse_workers=args.parse_workers),
+                     checkpoint=True)
+        if args.fuzzy_matching:
+            # The blocking index is built while the website is still being scraped
+            pipeline.add("index_organizations", index_organizations, ["load_organizations"])
+            pipeline.add("merge", partial(merge_company_data, fuzzy_threshold=args.fuzzy_threshold),
+                         [companies, "load_organizations", "index_organizations"], checkpoint=True)
+        else:
+            pipeline.add("merge", merge_company_data, [companies, "load_organizations"], checkpoint=True)
+    else:
+        store = EnrichmentStore(args.enrichment_store)
+        pipeline.add("load_organizations", lambda: prepare_organizations(store, cache,
+                                                                         fuzzy_matching=args.fuzzy_matching,
+                                                                         parse_workers=args.parse_workers))
+        pipeline.add("merge", partial(lookup_company_data,
+                                      fuzzy_threshold=args.fuzzy_threshold if args.fuzzy_matching else None),
+                     [companies, "load_organizations"], checkpoint=True)
+    result_stage = "merge"
+    if not args.skip_funding_rounds:
+        if args.no_enrichment_store:
+            pipeline.add("load_funding_rounds", lambda: load_funding_rounds(cache, parse_workers=args.parse_workers),
+                         checkpoint=True)
+            pipeline.add("add_funding_rounds", add_funding_rounds, ["merge", "load_funding_rounds"], checkpoint=True)
+        else:
+            pipeline.add("load_funding_rounds", lambda: prepare_funding_rounds(store, cache,
+                                                                               parse_workers=args.parse_workers))
+            pipeline.add("add_funding_rounds", lookup_funding_rounds, ["merge", "load_funding_rounds"],
+                         checkpoint=True)
+        result_stage = "add_funding_rounds"
+    return pipeline, result_stage
+
+
+def write_output(args, enriched_company_data):
+    if not args.delta_only:
+        write_results(enriched_company_data, args.output_dir, args.output_filename, args.output_format,
+                      args.output_compression)
+    if args.delta:
+        write_delta(enriched_company_data, get_delta_path(args), get_snapshot_path(args), args.output_compression)
 
-    return result
+
+RUNNERS = {"scrape": run_scrape, "enrich": run_enrich, "full": run_full, "bench": run_bench, "merge": run_merge}
 
 
 @time_function
-def main():
-    parser = argparse.ArgumentParser(
-        prog="EQT Portfolio Scraper", description="Scrapes company data from EQT's public website and enriches it with "
-                                                  "information provided by the Motherbrain Team")
+def run(args):
+    RUNNERS[args.command](args)
 
+
+def add_scrape_arguments(parser):
     parser.add_argument("-t", "--type", dest="type", choices=["current", "divested"],
                         default=["current", "divested"],
                         help="Chose to only get current or divested companies, leave out argument to get both")
-    parser.add_argument("--skip-funding-rounds", action="store_true",
-                        help="Skip step where company data is enriched with information about their funding rounds")
+    parser.add_argument("--base-url", default="https://eqtgroup.com",
+                        help="Site to scrape, e.g. a local stand-in when benchmarking")
     parser.add_argument("--use-html-scraper", action="store_true",
                         help="Use Playwright to scrape data from HTML instead of requesting JSON page data "
                              "(slower, slightly lower fidelity, made for demonstrative purposes)")
+    parser.add_argument("--intercept-page-data", action="store_true",
+                        help="With --use-html-scraper, capture the page data JSON the site loads in the browser "
+                             "instead of reading the rendered DOM (faster, same fidelity as the page data scrapers)")
     parser.add_argument("--synchronous", action="store_true",
                         help="Same results, longer execution time, but easier to debug")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Number of threads fetching company details when running with --synchronous")
+    parser.add_argument("--browser-workers", type=int, default=None,
+                        help="Number of worker processes, each with one reusable browser page, used by the HTML "
+                             "scraper (defaults to the number of CPUs)")
+    parser.add_argument("--pages-per-browser", type=int, default=50,
+                        help="Restart a worker's browser after this many detail pages to cap its memory use, "
+                             "0 never restarts it")
+    parser.add_argument("--max-concurrent-requests", type=int, default=20,
+                        help="Maximum number of page data requests in flight at the same time")
+    parser.add_argument("--max-connections-per-host", type=int, default=10,
+                        help="Maximum number of open connections to eqtgroup.com")
+    parser.add_argument("--max-retries", type=int, default=3,
+                        help="Number of times a request is retried after a server error, 429 or timeout")
+    parser.add_argument("--adaptive-concurrency", action="store_true",
+                        help="Start with a few requests to eqtgroup.com in flight and adjust that AIMD-style, up to "
+                             "--max-concurrent-requests (--threads with --synchronous): one more per round trip while "
+                             "responses are fast, fewer when latency rises or on 429/5xx responses")
+    parser.add_argument("--max-rps", type=float, default=None,
+                        help="Never start more than this many requests to eqtgroup.com per second")
+    parser.add_argument("--no-http-cache", action="store_true",
+                        help="Download every company details page in full instead of revalidating cached copies")
+    parser.add_argument("--http-cache-dir", default="cache/http",
+                        help="Directory where company details pages and their ETag/Last-Modified are cached")
+    parser.add_argument("--http-cache-max-age", type=float, default=None,
+                        help="Use cached company details pages younger than this many seconds without any request")
+
+
+def add_shard_arguments(parser):
+    parser.add_argument("--shard", default=None,
+                        help="Only scrape the companies whose details path hashes to shard i of N, given as i/N, to "
+                             "split a run over N processes or machines, merge combines their ndjson files")
+
+
+def add_enrichment_arguments(parser):
+    parser.add_argument("--skip-funding-rounds", action="store_true",
+                        help="Skip step where company data is enriched with information about their funding rounds")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always download enrichment data from GCS instead of using the local cache")
+    parser.add_argument("--parse-workers", type=int, default=1,
+                        help="Number of processes parsing each downloaded enrichment blob, 1 parses it in the main "
+                             "process")
+    parser.add_argument("--cache-dir", default="cache/gcs",
+                        help="Directory where Parquet copies of the enrichment data are cached")
+    parser.add_argument("--cache-max-size-mb", type=int, default=1024,
+                        help="Least recently used enrichment data is evicted from the cache above this size")
+    parser.add_argument("--cache-max-age-hours", type=float, default=24 * 7,
+                        help="Cached enrichment data older than this is downloaded again, even if it is unchanged")
+    parser.add_argument("--enrichment-store", default=STORE_PATH,
+                        help="SQLite index of the cleaned enrichment data, rebuilt only when a blob changes, "
+                             "companies are enriched with point lookups into it")
+    parser.add_argument("--no-enrichment-store", action="store_true",
+                        help="Load and merge the whole enrichment tables in memory on every run instead")
+    parser.add_argument("--fuzzy-matching", action="store_true",
+                        help="Match companies without an exact (registered domain, name) match to the most similar "
+                             "organization sharing a domain, name token or MinHash bucket, and add a match_confidence "
+                             "column")
+    parser.add_argument("--fuzzy-threshold", type=float, default=MATCH_THRESHOLD,
+                        help="Minimum confidence, between 0 and 1, of a fuzzy match")
+
+
+def add_output_arguments(parser, output_formats=OUTPUT_FORMATS, filename_pattern=FILENAME_PATTERN,
+                         default_format=None):
+    # Without a default the format is picked in parse_args, json unless the run only writes ndjson
+    parser.add_argument("--output-format", choices=output_formats, default=default_format,
+                        help="json (the default) writes a single indented array, ndjson one company per line (the "
+                             "default with --stream and --shard), parquet keeps funding_rounds, board and management "
+                             "as nested list/struct columns")
+    parser.add_argument("--output-compression", choices=COMPRESSIONS, default="none",
+                        help="Compression of the result file, for parquet the column chunks are compressed")
+    parser.add_argument("--output-dir", default=RESULTS_DIR,
+                        help="Directory the result file is written to")
+    parser.add_argument("--output-filename", default=filename_pattern,
+                        help="Name of the result file without extension, {timestamp} and {format} are filled in")
+
+
+def add_delta_arguments(parser):
+    parser.add_argument("--delta", action="store_true",
+                        help="Also write the companies added, removed or changed since the previous run to "
+                             "delta_{timestamp}.ndjson, comparing content hashes with the previous snapshot")
+    parser.add_argument("--delta-only", action="store_true",
+                        help="Write only the delta file instead of the full result")
+    parser.add_argument("--snapshot", default=None,
+                        help="Fingerprints of the previous run that --delta compares with and replaces, defaults to "
+                             "snapshot.ndjson in the output directory")
+
+
+def add_checkpoint_arguments(parser):
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Keep the progress of the run until it finishes, so it can be continued with --resume")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last run with the same options that was started with --checkpoint and "
+                             "didn't finish, skipping the companies it scraped and the stages it completed")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR,
+                        help="Directory the progress of runs is kept in, each command and set of options in a "
+                             "directory of its own")
+
+
+def add_logging_arguments(parser):
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO",
+                        help="Only log messages of this level and above")
+    parser.add_argument("--metrics-json", default=None,
+                        help="Write a JSON report with stage timings, request counters, latency histograms and row "
+                             "counts to this path")
+    parser.add_argument("--metrics-prometheus", default=None,
+                        help="Write the same metrics in Prometheus text format to this path, e.g. a .prom file in "
+                             "node_exporter's textfile collector directory")
+
+
+def add_full_arguments(parser):
+    parser.add_argument("--stream", action="store_true",
+                        help="Enrich and write every company as soon as its details arrive instead of after the whole "
+                             "website is scraped, only with the asynchronous page data scraper and ndjson output")
+    parser.add_argument("--serve", action="store_true",
+                        help="Keep running, hold the enrichment data and the enriched portfolio in memory, refresh "
+                             "them on a schedule and serve them over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Address the --serve API listens on")
+    parser.add_argument("--port", type=int, default=8080, help="Port the --serve API listens on, 0 picks a free one")
+    parser.add_argument("--scrape-interval-minutes", type=float, default=SCRAPE_INTERVAL_MINUTES,
+                        help="With --serve, minutes between scrapes of the portfolio")
+    parser.add_argument("--refresh-interval-minutes", type=float, default=REFRESH_INTERVAL_MINUTES,
+                        help="With --serve, minutes between checks for new enrichment data")
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        prog="EQT Portfolio Scraper", description="Scrapes company data from EQT's public website and enriches it with "
+                                                  "information provided by the Motherbrain Team. Without a command "
+                                                  "the full pipeline runs")
+    commands = parser.add_subparsers(dest="command")
+    parsers = {command: commands.add_parser(command, help=description, description=description)
+               for command, description in COMMANDS.items()}
+
+    add_scrape_arguments(parsers["scrape"])
+    add_shard_arguments(parsers["scrape"])
+    add_output_arguments(parsers["scrape"], ["ndjson"], SCRAPED_FILENAME_PATTERN, "ndjson")
+    add_checkpoint_arguments(parsers["scrape"])
+
+    parsers["enrich"].add_argument("--input", required=True,
+                                   help="NDJSON file written by scrape, optionally compressed")
+    add_enrichment_arguments(parsers["enrich"])
+    parsers["enrich"].add_argument("--clear-cache", action="store_true",
+                                   help="Remove all cached enrichment data and exit")
+    add_output_arguments(parsers["enrich"])
+    add_delta_arguments(parsers["enrich"])
+    add_checkpoint_arguments(parsers["enrich"])
+
+    add_scrape_arguments(parsers["full"])
+    add_enrichment_arguments(parsers["full"])
+    parsers["full"].add_argument("--clear-cache", action="store_true",
+                                 help="Remove all cached enrichment data and exit")
+    add_full_arguments(parsers["full"])
+    add_shard_arguments(parsers["full"])
+    add_output_arguments(parsers["full"])
+    add_delta_arguments(parsers["full"])
+    add_checkpoint_arguments(parsers["full"])
+
+    add_scrape_arguments(parsers["bench"])
+    add_enrichment_arguments(parsers["bench"])
+    parsers["bench"].add_argument("--repeat", type=int, default=3, help="Number of timed runs")
+
+    parsers["merge"].add_argument("--input", required=True, nargs="+",
+                                  help="The ndjson files written by every shard of the run, optionally compressed")
+    # Only ndjson, which keeps the values as the shards wrote them, is the same as the result of an unsharded run
+    add_output_arguments(parsers["merge"], ["ndjson"], default_format="ndjson")
+    add_delta_arguments(parsers["merge"])
+
+    for command_parser in parsers.values():
+        add_logging_arguments(command_parser)
+    return parser
+
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Arguments without a command are the arguments of full, as before there were commands
+    if not argv or argv[0] not in COMMANDS and argv[0] not in ("-h", "--help"):
+        argv = ["full", *argv]
+    parser = create_parser()
+    args = parser.parse_args(argv)
+
+    if args.command in ("enrich", "full") and args.output_format is None:
+        streamed = args.command == "full" and (args.stream or args.shard)
+        args.output_format = "ndjson" if streamed else DEFAULT_OUTPUT_FORMAT
+    if args.command in ("scrape", "full", "bench"):
+        if (args.adaptive_concurrency or args.max_rps is not None) and args.use_html_scraper:
+            parser.error("--adaptive-concurrency and --max-rps only work with the page data scrapers")
+    if args.command == "full":
+        if (args.stream or args.serve) and (args.use_html_scraper or args.synchronous):
+            parser.error("--stream and --serve only work with the asynchronous page data scraper")
+        if args.stream and args.output_format != "ndjson":
+            parser.error("--stream only writes ndjson")
+        if args.serve and (args.delta or args.delta_only):
+            parser.error("--delta only works for single runs, not with --serve")
+        if (args.checkpoint or args.resume) and (args.stream or args.serve):
+            parser.error("--checkpoint and --resume don't work with --stream and --serve, which keep no checkpoint")
+        if args.shard and (args.stream or args.serve or args.delta or args.delta_only):
+            parser.error("--shard doesn't work with --stream, --serve or --delta, merge writes the delta of the "
+                         "merged result")
+        if args.shard and args.output_format != "ndjson":
+            parser.error("--shard only writes ndjson")
+    if args.command in ("scrape", "full") and args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as error:
+            parser.error(f"--shard must be i/N with i between 1 and N: {error}")
+        args.output_filename += SHARD_FILENAME_SUFFIX.format(index=shard.index, count=shard.count)
+    if args.command in ("enrich", "full", "merge"):
+        args.delta = args.delta or args.delta_only
+    return args
 
-    args = parser.parse_args()
-
-    if args.use_html_scraper:
-        company_data = get_company_data_from_html(args)
-    else:
-        if args.synchronous:
-            company_data = get_company_data_from_page_data(args.type)
-        else:
-            company_data = get_company_data_from_page_data_async(args.type)
-    print(f"{len(company_data)} companies were found by scraping website")
-    company_data_df = pandas.DataFrame.from_dict(company_data)
-
-    all_organizations = fetch_enrichment_data("interview-test-org.json.gz")
-    print(f"{len(all_organizations.index)} organization entries were loaded from CGS")
-
-    start = time.perf_counter()
-    all_organizations.dropna(subset=['homepage_url'], inplace=True)
-    all_organizations['registered_domain'] = all_organizations['homepage_url'].apply(get_registered_domain)
-    all_organizations.drop_duplicates(subset=["name", "registered_domain"], keep="last", inplace=True)
-    print(f"Adding registered_domain and cleaning dataframe took {time.perf_counter() - start:.6f} seconds to execute")
-    print(f"{len(all_organizations.index)} organization entries remain after cleaning")
-
-    print(f"{len(company_data_df.index)} rows of company data before merge")
-    start = time.perf_counter()
-    enriched_company_data = pandas.merge(company_data_df, all_organizations, how="left",
-                                         left_on=["registered_domain", "title"], right_on=["registered_domain", "name"])
-    print(f"Merging DataFrames took {time.perf_counter() - start:.6f} seconds to execute")
-    print(f"{len(enriched_company_data.index)} rows of company data after merge")
-
-    if not args.skip_funding_rounds:
-        funding_rounds = get_funding_rounds(enriched_company_data)
-        enriched_company_data = enriched_company_data.assign(funding_rounds=funding_rounds)
 
-    save_df_to_file(enriched_company_data)
+def main():
+    args = parse_args()
+
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Nothing is recorded unless a report is written, or served on /metrics
+    metrics.enabled = bool(args.metrics_json or args.metrics_prometheus or getattr(args, "serve", False))
+    try:
+        run(args)
+    finally:
+        # Also written when the run fails, so a scheduler can see how far it got
+        metrics.set("peak_rss_megabytes", get_peak_rss_mb())
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prometheus:
+            metrics.write_prometheus(args.metrics_prometheus)
 
 
 if __name__ == "__main__":
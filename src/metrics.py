@@ -0,0 +1,180 @@
+import bisect
+import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROMETHEUS_PREFIX = "eqt_scraper_"
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus one for values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative_counts(self):
+        counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def quantile(self, q):
+        # Upper bound of the bucket the quantile falls in, the largest value seen for the last bucket
+        if not self.count:
+            return None
+        for bound, cumulative in zip(self.buckets, self.cumulative_counts()):
+            if cumulative >= q * self.count:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """Counters, gauges and histograms for a run, keyed by name and labels.
+
+    Every recording method returns right away while the registry is disabled, so instrumented code costs one method
+    call when no report is asked for.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[self.key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = self.key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def record_stage(self, stage, seconds):
+        # Counters rather than a gauge, a stage that runs more than once, e.g. on several threads, adds up
+        self.increment("stage_seconds_total", seconds, stage=stage)
+        self.increment("stage_runs_total", stage=stage)
+
+    @contextmanager
+    def timer(self, stage):
+        # Stage timers are always logged, and recorded when the registry is enabled
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            logger.info(f"{stage} took {elapsed:.6f} seconds")
+            self.record_stage(stage, elapsed)
+
+    def report(self):
+        def entries(values, to_json):
+            grouped = {}
+            for (name, labels), value in sorted(values.items()):
+                grouped.setdefault(name, []).append({"labels": dict(labels)} | to_json(value))
+            return grouped
+
+        with self.lock:
+            return {
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "counters": entries(self.counters, lambda value: {"value": value}),
+                "gauges": entries(self.gauges, lambda value: {"value": value}),
+                "histograms": entries(self.histograms, lambda histogram: {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": dict(zip([*map(str, histogram.buckets), "+Inf"], histogram.cumulative_counts())),
+                }),
+            }
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            for metric_type, values in (("counter", self.counters), ("gauge", self.gauges)):
+                typed = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in typed:
+                        lines.append(f"# TYPE {PROMETHEUS_PREFIX}{name} {metric_type}")
+                        typed.add(name)
+                    lines.append(f"{prometheus_series(name, labels)} {value}")
+
+            typed = set()
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {PROMETHEUS_PREFIX}{name} histogram")
+                    typed.add(name)
+                for bound, cumulative in zip([*map(str, histogram.buckets), "+Inf"], histogram.cumulative_counts()):
+                    lines.append(f"{prometheus_series(f"{name}_bucket", labels, [("le", bound)])} {cumulative}")
+                lines.append(f"{prometheus_series(f"{name}_sum", labels)} {histogram.sum}")
+                lines.append(f"{prometheus_series(f"{name}_count", labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        write_atomically(path, json.dumps(self.report(), indent=4))
+        logger.info(f"Wrote metrics report to {path}")
+
+    def write_prometheus(self, path):
+        write_atomically(path, self.prometheus_text())
+        logger.info(f"Wrote Prometheus metrics to {path}")
+
+
+def prometheus_series(name, labels, extra_labels=()):
+    label_text = ",".join(f'{key}="{escape_label_value(value)}"' for key, value in (*labels, *extra_labels))
+    return f"{PROMETHEUS_PREFIX}{name}{{{label_text}}}" if label_text else f"{PROMETHEUS_PREFIX}{name}"
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_atomically(path, text):
+    # The Prometheus textfile collector may read the file at any moment, so it is replaced in one step
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+        file.write(text)
+    # mkstemp creates the file readable by its owner only, node_exporter usually runs as another user
+    os.chmod(temporary_path, 0o644)
+    os.replace(temporary_path, path)
+
+
+# The registry shared by the whole run, main enables it when a metrics report is asked for
+metrics = Metrics()
@@ -1,113 +1,205 @@
 import asyncio
-import aiohttp
-from tldextract import tldextract
+import contextlib
+import logging
+import random
+import time
 
+import aiohttp
 
-async def fetch_companies(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
+from metrics import metrics
+from page_data.page_data_extraction import as_listing, decode_details, decode_listing, extract_details, get_listing_data
+from rate_control import AsyncRateLimiter, RequestSlot
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://eqtgroup.com"
+
+MAX_CONCURRENT_REQUESTS = 20
+MAX_CONNECTIONS_PER_HOST = 10
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+REQUEST_TIMEOUT = 30
+
+
+class HttpClient:
+    """One shared session for a whole run, with a cap on in-flight requests and retries for transient errors.
+
+    With a RateController the requests within that cap are also paced by it.
+    """
+
+    def __init__(self, session, max_concurrent_requests=MAX_CONCURRENT_REQUESTS, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, cache=None, rate_controller=None):
+        self.session = session
+        self.semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.cache = cache
+        self.rate_limiter = AsyncRateLimiter(rate_controller) if rate_controller is not None else None
+
+    def request_slot(self):
+        if self.rate_limiter is None:
+            return contextlib.nullcontext(RequestSlot())
+        return self.rate_limiter.request()
+
+    async def get_body(self, url, cacheable=False, validate=None):
+        # The raw response body, decoded by the caller into just the fields it needs. A cached body is first checked
+        # with validate
+        cache = self.cache if cacheable else None
+        entry = None
+        if cache is not None:
+            entry = await asyncio.to_thread(cache.lookup, url)
+            if cache.is_fresh(entry):
+                cache.record("hits")
+                return entry.body
+
+        for attempt in range(self.max_retries + 1):
+            slot = None
             try:
-                r = await response.json()
-                return r["result"]["data"]["allSanityCompanyPage"]["nodes"]
-            except Exception as err:
-                print(f"Unexpected {err=}, {type(err)=}")
-                raise
-
-
-async def fetch_company_details(session, path):
-    async with session.get(f"https://eqtgroup.com/page-data{path}page-data.json") as response:
-        try:
-            r = await response.json()
-            return r["result"]["data"]["sanityCompanyPage"]
-        except:
-            return None
-
-
-async def get_registered_domain(url):
-    if not isinstance(url, str):
-        return None
-    return tldextract.extract(url).registered_domain
-
-
-async def get_logo_url(logo):
-    if logo is None:
-        return None
-    if logo.get("asset") is None:
-        return None
-    return logo.get("asset").get("url")
-
-
-async def get_description(raw_body):
-    if not raw_body:
-        return None
-    description = ""
-    for part in raw_body:
-        for sub_part in part.get("children", []):
-            description += sub_part.get("text", "")  # TODO: Maybe add space or newline after each sub_part
-    return description
-
-
-async def extract_details(company_details):
-    interesting_details = {
-        "description": await get_description(company_details.get("_rawBody", [])),
-        "preamble": company_details.get("preamble"),
-        "heading": company_details.get("heading"),
-        "responsible_advisors": [advisor.get("title") for advisor in company_details.get("responsibleAdvisors", [])],
-        "website": company_details.get("website"),
-        "registered_domain": await get_registered_domain(company_details.get("website")),
-        "board": company_details.get("board", []),
-        "management": company_details.get("management", []),
-        "logo": await get_logo_url(company_details.get("logo")),
-    }
-
-    # This data exists on the details page, but also in the company listing
-    # redundant_details = {
-    #     "title": company_details.get("title", ""),
-    #     "country": company_details.get("country", ""),
-    #     "entry": company_details.get("entryDate", ""),
-    #     "exit": company_details.get("exitDate", ""),
-    #     "sector": company_details.get("sector", ""),
-    #     "fund": [fund.get("title", "") for fund in company_details.get("fund", [])],
-    # }
-
-    return interesting_details
-
-
-async def get_company_data_singular(session, company):
-    company_data = {
-        "title": company.get("title"),
-        "sector": company.get("sector"),
-        "country": company.get("country"),
-        "fund": [fund.get("title", "") for fund in company.get("fund", [])],
-        "entry": company.get("entryDate"),
-        "exit": company.get("exitDate"),
-        "company_details_path": company.get("path"),
-    }
-
-    # promotedSdg, sdg and topic exist in the page data,
-    # but are always (with one exception where promotedSdg=3) undefined.
-    # The id doesn't really seem useful in this context as it is not correlating to the id in the data from gcs.
-    # unused_company_data = {
-    #     "promotedSdg": company.get("promotedSdg"),
-    #     "sdg": company.get("sdg"),
-    #     "topic": company.get("topic"),
-    #     "_id": company.get("_id"),
-    # }
-
-    company_details = await fetch_company_details(session, company.get("path"))
+                async with self.semaphore, self.request_slot() as slot:
+                    headers = cache.conditional_headers(entry) if cache is not None else None
+                    async with self.session.get(url, headers=headers) as response:
+                        slot.record(response.status, response.headers)
+                        if response.status >= 500 or response.status == 429:
+                            # Server side errors and throttling are usually transient, raise so they are retried
+                            response.raise_for_status()
+                        if response.status == 304 and entry is not None:
+                            cache.record("revalidated")
+                            entry = await asyncio.to_thread(cache.refresh, entry, response.headers)
+                            return entry.body
+                        if response.status != 200:
+                            return None
+                        body = await response.read()
+                        if cache is not None:
+                            cache.record("misses")
+                            await asyncio.to_thread(cache.store, url, body, response.headers, validate)
+                        return body
+            except (aiohttp.ClientResponseError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                if isinstance(err, aiohttp.ClientResponseError) and err.status < 500 and err.status != 429:
+                    raise
+                if attempt == self.max_retries:
+                    raise
+                metrics.increment("http_retries_total", fetcher="async")
+                # Exponential backoff with full jitter, so retries from many tasks don't arrive in bursts, and never
+                # sooner than the site asked for
+                retry_after = slot.retry_after if slot is not None and slot.retry_after is not None else 0
+                await asyncio.sleep(max(retry_after, random.uniform(0, self.backoff_base * 2 ** attempt)))
+
+
+def create_trace_config():
+    # Latency until the response headers arrive, status and body size of every attempt, from aiohttp's tracing hooks
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - context.start, fetcher="async")
+        metrics.increment("http_requests_total", fetcher="async", status=str(params.response.status))
+
+    async def on_request_exception(session, context, params):
+        metrics.increment("http_requests_total", fetcher="async", status="error")
+
+    async def on_response_chunk_received(session, context, params):
+        metrics.increment("http_downloaded_bytes_total", len(params.chunk), fetcher="async")
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    return trace_config
+
+
+def open_session(max_connections_per_host=MAX_CONNECTIONS_PER_HOST, request_timeout=REQUEST_TIMEOUT):
+    connector = aiohttp.TCPConnector(limit_per_host=max_connections_per_host)
+    # Requests are only traced when metrics are recorded
+    trace_configs = [create_trace_config()] if metrics.enabled else None
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=request_timeout),
+                                 trace_configs=trace_configs)
+
+
+async def fetch_companies(client, url):
+    try:
+        return decode_listing(await client.get_body(url))
+    except Exception as err:
+        logger.error(f"Unexpected {err=}, {type(err)=}")
+        raise
+
+
+async def fetch_company_details(client, path, base_url=BASE_URL):
+    body = await client.get_body(f"{base_url}/page-data{path}page-data.json", cacheable=True, validate=decode_details)
+    return None if body is None else decode_details(body)
+
+
+async def get_company_data_singular(client, company, base_url=BASE_URL, checkpoint=None):
+    company = as_listing(company)
+    # Companies scraped before a resumed run was interrupted aren't requested again
+    if checkpoint is not None and (company_data := checkpoint.completed_company(company.path)) is not None:
+        return company_data
+    company_data = get_listing_data(company)
+    try:
+        company_details = await fetch_company_details(client, company.path, base_url)
+    except Exception as err:
+        logger.warning(f"Failed to fetch details for: {company.title} ({err!r})")
+        return company_data
+
     if not company_details:
-        print(f"No details could be found for: {company.get("title")}")
+        logger.warning(f"No details could be found for: {company.title}")
         return company_data
     else:
-        interesting_details = await extract_details(company_details)
-        return company_data | interesting_details
+        company_data = company_data | extract_details(company_details)
+        if checkpoint is not None:
+            checkpoint.record_company(company_data)
+        return company_data
 
 
-async def get_company_data(companies):
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for company in companies:
-            task = asyncio.create_task(get_company_data_singular(session, company))
-            tasks.append(task)
-        company_data = await asyncio.gather(*tasks)
+async def get_company_data(client, companies, base_url=BASE_URL, checkpoint=None):
+    tasks = []
+    for company in companies:
+        task = asyncio.create_task(get_company_data_singular(client, company, base_url, checkpoint))
+        tasks.append(task)
+    company_data = await asyncio.gather(*tasks)
     return company_data
+
+
+async def iter_company_data(client, companies, base_url=BASE_URL, max_pending=2 * MAX_CONCURRENT_REQUESTS):
+    # Yields the data of every company as soon as its details have arrived, so not in listing order. At most
+    # max_pending companies are in progress at a time, memory doesn't grow with the size of the portfolio
+    pending = set()
+    for company in companies:
+        pending.add(asyncio.create_task(get_company_data_singular(client, company, base_url)))
+        if len(pending) >= max_pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
+
+
+async def stream(portfolio_paths, base_url=BASE_URL, max_concurrent_requests=MAX_CONCURRENT_REQUESTS,
+                 max_connections_per_host=MAX_CONNECTIONS_PER_HOST, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, cache=None, rate_controller=None):
+    # Same as scrape, as an async generator of company data
+    async with open_session(max_connections_per_host) as session:
+        client = HttpClient(session, max_concurrent_requests, max_retries, backoff_base, cache, rate_controller)
+        listings = await asyncio.gather(
+            *[fetch_companies(client, f"{base_url}/page-data{path}page-data.json") for path in portfolio_paths])
+        companies = [company for listing in listings for company in listing]
+        async for company_data in iter_company_data(client, companies, base_url, 2 * max_concurrent_requests):
+            yield company_data
+
+
+async def scrape(portfolio_paths, base_url=BASE_URL, max_concurrent_requests=MAX_CONCURRENT_REQUESTS,
+                 max_connections_per_host=MAX_CONNECTIONS_PER_HOST, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, cache=None, rate_controller=None, checkpoint=None, shard=None):
+    async with open_session(max_connections_per_host) as session:
+        client = HttpClient(session, max_concurrent_requests, max_retries, backoff_base, cache, rate_controller)
+
+        # Fetch all portfolio listings concurrently, then the details of every company they contain
+        listings = await asyncio.gather(
+            *[fetch_companies(client, f"{base_url}/page-data{path}page-data.json") for path in portfolio_paths])
+        companies = [company for listing in listings for company in listing]
+        if shard is not None:
+            companies = shard.select(companies, lambda company: company.path)
+
+        return await get_company_data(client, companies, base_url, checkpoint)
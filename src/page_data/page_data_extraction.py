@@ -0,0 +1,168 @@
+# The parts of Gatsby's page-data.json the scrapers use, as msgspec structs. Decoding straight into them skips every
+# other field of the payload without building dicts for it, and each company is held in compact slotted objects.
+# The sync, async and Playwright page data scrapers all decode and extract through this module.
+import logging
+from typing import Any
+
+import msgspec
+
+from domains import get_registered_domain
+
+logger = logging.getLogger(__name__)
+
+# Keys extract_details adds to the data of a company, companies without details get them as None when streaming
+DETAIL_COLUMNS = ["description", "preamble", "heading", "responsible_advisors", "website", "registered_domain", "board",
+                  "management", "logo"]
+
+
+class Reference(msgspec.Struct, gc=False):
+    # Funds and responsible advisors, a missing title is told apart from a null one like dict.get did
+    title: str | None | msgspec.UnsetType = msgspec.UNSET
+
+
+class Span(msgspec.Struct, gc=False):
+    text: str | None = ""
+
+
+class Block(msgspec.Struct, gc=False):
+    children: list[Span] | None = None
+
+
+class Asset(msgspec.Struct, gc=False):
+    url: str | None = None
+
+
+class Logo(msgspec.Struct, gc=False):
+    asset: Asset | None = None
+
+
+class CompanyListing(msgspec.Struct, gc=False):
+    title: str | None = None
+    sector: str | None = None
+    country: str | None = None
+    fund: list[Reference] | None = None
+    entryDate: str | None = None
+    exitDate: str | None = None
+    path: str | None = None
+
+
+class CompanyDetails(msgspec.Struct, gc=False):
+    raw_body: list[Block] | None = msgspec.field(default=None, name="_rawBody")
+    preamble: str | None = None
+    heading: str | None = None
+    responsibleAdvisors: list[Reference] | None = None
+    website: str | None = None
+    # Passed on as they are in the page data
+    board: Any = msgspec.field(default_factory=list)
+    management: Any = msgspec.field(default_factory=list)
+    logo: Logo | None = None
+
+
+class CompanyListings(msgspec.Struct):
+    # Decoded one company at a time, a company with a value of another type doesn't fail the whole listing
+    nodes: list[msgspec.Raw]
+
+
+class ListingData(msgspec.Struct):
+    allSanityCompanyPage: CompanyListings
+
+
+class ListingResult(msgspec.Struct):
+    data: ListingData
+
+
+class ListingPage(msgspec.Struct):
+    result: ListingResult
+
+
+class DetailsData(msgspec.Struct):
+    sanityCompanyPage: CompanyDetails | None = None
+
+
+class DetailsResult(msgspec.Struct):
+    data: DetailsData | None = None
+
+
+class DetailsPage(msgspec.Struct):
+    result: DetailsResult | None = None
+
+
+listing_decoder = msgspec.json.Decoder(ListingPage)
+company_listing_decoder = msgspec.json.Decoder(CompanyListing)
+details_decoder = msgspec.json.Decoder(DetailsPage)
+
+
+def decode_listing(body):
+    companies = []
+    for node in listing_decoder.decode(body).result.data.allSanityCompanyPage.nodes:
+        try:
+            companies.append(company_listing_decoder.decode(node))
+        except msgspec.ValidationError as err:
+            logger.warning(f"Skipped a company in the listing that doesn't fit the page data structs ({err}): "
+                           f"{bytes(node)[:200].decode('utf-8', 'replace')}")
+    return companies
+
+
+def decode_details(body):
+    # None when the page has no company details, a payload that doesn't fit the structs raises msgspec.DecodeError
+    page = details_decoder.decode(body)
+    if page.result is None or page.result.data is None:
+        return None
+    return page.result.data.sanityCompanyPage
+
+
+def as_listing(company):
+    # Listings loaded as plain JSON, e.g. from a file, are converted to the same struct
+    return company if isinstance(company, CompanyListing) else msgspec.convert(company, CompanyListing)
+
+
+def as_details(company_details):
+    if isinstance(company_details, CompanyDetails):
+        return company_details
+    return msgspec.convert(company_details, CompanyDetails)
+
+
+def get_logo_url(logo):
+    if logo is None or logo.asset is None:
+        return None
+    return logo.asset.url
+
+
+def get_description(raw_body):
+    if not raw_body:
+        return None
+    if not isinstance(raw_body[0], Block):
+        raw_body = msgspec.convert(raw_body, list[Block])
+    # TODO: Maybe add space or newline after each sub_part
+    return "".join(span.text or "" for block in raw_body for span in block.children or ())
+
+
+def extract_details(company_details):
+    company_details = as_details(company_details)
+    return {
+        "description": get_description(company_details.raw_body),
+        "preamble": company_details.preamble,
+        "heading": company_details.heading,
+        "responsible_advisors": [None if advisor.title is msgspec.UNSET else advisor.title
+                                 for advisor in company_details.responsibleAdvisors or ()],
+        "website": company_details.website,
+        "registered_domain": get_registered_domain(company_details.website),
+        "board": company_details.board,
+        "management": company_details.management,
+        "logo": get_logo_url(company_details.logo),
+    }
+
+
+def get_listing_data(company):
+    company = as_listing(company)
+    # promotedSdg, sdg and topic exist in the page data, but are always (with one exception where promotedSdg=3)
+    # undefined. The _id doesn't correlate to the id in the data from GCS. Neither is decoded.
+    return {
+        "title": company.title,
+        "sector": company.sector,
+        "country": company.country,
+        "fund": ["" if fund.title is msgspec.UNSET else fund.title for fund in company.fund or ()],
+        "entry": company.entryDate,
+        "exit": company.exitDate,
+        "company_details_path": company.path,
+    }
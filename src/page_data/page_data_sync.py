@@ -1,104 +1,143 @@
-import requests
-import tldextract
-
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def fetch_companies(url):
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from metrics import metrics
+from page_data.page_data_extraction import as_listing, decode_details, decode_listing, extract_details, get_listing_data
+from rate_control import THROTTLE_STATUSES, ThreadRateLimiter, is_throttled
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://eqtgroup.com"
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """Paces requests with a RateController.
+
+    429 and 503 responses are retried here instead of by urllib3, so every attempt takes a slot of its own and the
+    retry waits for Retry-After together with all other requests.
+    """
+
+    def __init__(self, rate_controller, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, **kwargs):
+        self.rate_limiter = ThreadRateLimiter(rate_controller)
+        self.throttle_retries = max_retries
+        self.backoff_base = backoff_base
+        retry = Retry(total=max_retries, backoff_factor=backoff_base, status_forcelist=[500, 502, 504],
+                      allowed_methods=["GET"], raise_on_status=False, respect_retry_after_header=False)
+        super().__init__(max_retries=retry, **kwargs)
+
+    def send(self, request, **kwargs):
+        for attempt in range(self.throttle_retries + 1):
+            with self.rate_limiter.request() as slot:
+                response = super().send(request, **kwargs)
+                # A server error urllib3 retried before the final response still shrinks the window
+                retries = response.raw.retries.history if response.raw is not None and response.raw.retries else ()
+                status = next((retry.status for retry in retries if is_throttled(retry.status)), response.status_code)
+                slot.record(status, response.headers)
+            if response.status_code not in THROTTLE_STATUSES or attempt == self.throttle_retries:
+                return response
+            if metrics.enabled:
+                metrics.increment("http_requests_total", fetcher="sync", status=str(response.status_code))
+                metrics.increment("http_retries_total", fetcher="sync")
+            response.close()
+            # Exponential backoff with full jitter, and never sooner than the site asked for
+            time.sleep(max(slot.retry_after or 0, random.uniform(0, self.backoff_base * 2 ** attempt)))
+
+
+def create_session(pool_size=1, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, rate_controller=None):
+    # Keep-alive connections are reused across requests, the pool needs one connection per worker thread. urllib3
+    # waits as long as a Retry-After header asks before retrying a 429 or 503
+    if rate_controller is None:
+        retry = Retry(total=max_retries, backoff_factor=backoff_base, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=["GET"], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    else:
+        adapter = RateLimitedAdapter(rate_controller, max_retries, backoff_base, pool_connections=1,
+                                     pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if metrics.enabled:
+        session.hooks["response"].append(record_response)
+    return session
+
+
+def record_response(response, *args, **kwargs):
+    # Retries happen inside urllib3, the attempts before the final response are in the retry history
+    retries = response.raw.retries.history if response.raw is not None and response.raw.retries else ()
+    for retry in retries:
+        metrics.increment("http_requests_total", fetcher="sync", status=str(retry.status or "error"))
+    metrics.increment("http_retries_total", len(retries), fetcher="sync")
+    metrics.increment("http_requests_total", fetcher="sync", status=str(response.status_code))
+    metrics.observe("http_request_duration_seconds", response.elapsed.total_seconds(), fetcher="sync")
+    metrics.increment("http_downloaded_bytes_total", len(response.content), fetcher="sync")
+
+
+def fetch_companies(url, session=None):
     try:
-        response = requests.get(url).json()
-        return response["result"]["data"]["allSanityCompanyPage"]["nodes"]
+        return decode_listing((session or requests).get(url).content)
     except Exception as err:
-        print(f"Unexpected {err=}, {type(err)=}")
+        logger.error(f"Unexpected {err=}, {type(err)=}")
         raise
 
 
-def fetch_company_details(url):
-    try:
-        response = requests.get(url).json()
-        return response["result"]["data"]["sanityCompanyPage"]
-    except:
-        return None
+def get_body_cached(url, session=None, cache=None, validate=None):
+    if cache is None:
+        return (session or requests).get(url).content
 
+    entry = cache.lookup(url)
+    if cache.is_fresh(entry):
+        cache.record("hits")
+        return entry.body
 
-def get_registered_domain(url):
-    if not isinstance(url, str):
-        return None
-    return tldextract.extract(url).registered_domain
+    response = (session or requests).get(url, headers=cache.conditional_headers(entry))
+    if response.status_code == 304 and entry is not None:
+        cache.record("revalidated")
+        return cache.refresh(entry, response.headers).body
+    if response.status_code == 200:
+        cache.record("misses")
+        return cache.store(url, response.content, response.headers, validate).body
+    return response.content
 
 
-def get_logo_url(logo):
-    if logo is None:
-        return None
-    if logo.get("asset") is None:
+def fetch_company_details(url, session=None, cache=None):
+    try:
+        return decode_details(get_body_cached(url, session, cache, validate=decode_details))
+    except:
         return None
-    return logo.get("asset").get("url")
 
 
-def get_description(raw_body):
-    if not raw_body:
-        return None
-    description = ""
-    for part in raw_body:
-        for sub_part in part.get("children", []):
-            description += sub_part.get("text", "")  # TODO: Maybe add space or newline after each sub_part
-    return description
-
-
-def extract_details(company_details):
-    interesting_details = {
-        "description": get_description(company_details.get("_rawBody", [])),
-        "preamble": company_details.get("preamble"),
-        "heading": company_details.get("heading"),
-        "responsible_advisors": [advisor.get("title") for advisor in company_details.get("responsibleAdvisors", [])],
-        "website": company_details.get("website"),
-        "registered_domain": get_registered_domain(company_details.get("website")),
-        "board": company_details.get("board", []),
-        "management": company_details.get("management", []),
-        "logo": get_logo_url(company_details.get("logo")),
-    }
-
-    # This data exists on the details page, but also in the company listing
-    # redundant_details = {
-    #     "title": company_details.get("title", ""),
-    #     "country": company_details.get("country", ""),
-    #     "entry": company_details.get("entryDate", ""),
-    #     "exit": company_details.get("exitDate", ""),
-    #     "sector": company_details.get("sector", ""),
-    #     "fund": [fund.get("title", "") for fund in company_details.get("fund", [])],
-    # }
-
-    return interesting_details
-
-
-def get_company_data(companies):
-    companies_data = []
-    for company in companies:
-        company_data = {
-            "title": company.get("title"),
-            "sector": company.get("sector"),
-            "country": company.get("country"),
-            "fund": [fund.get("title", "") for fund in company.get("fund", [])],
-            "entry": company.get("entryDate"),
-            "exit": company.get("exitDate"),
-            "company_details_path": company.get("path"),
-        }
-
-        # promotedSdg, sdg and topic exist in the page data,
-        # but are always (with one exception where promotedSdg=3) undefined.
-        # The id doesn't really seem useful in this context as it is not correlating to the id in the data from gcs.
-        # unused_company_data = {
-        #     "promotedSdg": company.get("promotedSdg"),
-        #     "sdg": company.get("sdg"),
-        #     "topic": company.get("topic"),
-        #     "_id": company.get("_id"),
-        # }
-
-        company_details = fetch_company_details(f"https://eqtgroup.com/page-data{company.get("path")}page-data.json")
-        if not company_details:
-            companies_data.append(company_data)
-            print(f"No details could be found for: {company.get("title")}")
-            continue
-
-        interesting_details = extract_details(company_details)
-        companies_data.append(company_data | interesting_details)
-
-    return companies_data
+def get_company_data_singular(company, session=None, base_url=BASE_URL, cache=None, checkpoint=None):
+    company = as_listing(company)
+    # Companies scraped before a resumed run was interrupted aren't requested again
+    if checkpoint is not None and (company_data := checkpoint.completed_company(company.path)) is not None:
+        return company_data
+    company_data = get_listing_data(company)
+    company_details = fetch_company_details(f"{base_url}/page-data{company.path}page-data.json", session, cache)
+    if not company_details:
+        logger.warning(f"No details could be found for: {company.title}")
+        return company_data
+
+    company_data = company_data | extract_details(company_details)
+    if checkpoint is not None:
+        checkpoint.record_company(company_data)
+    return company_data
+
+
+def get_company_data(companies, session=None, threads=1, base_url=BASE_URL, cache=None, checkpoint=None):
+    if threads <= 1:
+        return [get_company_data_singular(company, session, base_url, cache, checkpoint) for company in companies]
+
+    # Executor.map yields results in input order, so the output stays the same as when running on one thread
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(lambda company: get_company_data_singular(company, session, base_url, cache,
+                                                                           checkpoint),
+                                 companies))
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, CancelledError, ThreadPoolExecutor, wait
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    """Runs named stages on threads, each stage starts as soon as the stages it depends on are done.
+
+    A stage is called with the results of its dependencies, in the order they were given. With a Checkpoint the
+    results of stages added with checkpoint=True are saved, and loaded instead of running the stage again when it is
+    resumed. Stages only needed by such a stage are then skipped.
+
+    When a stage fails, run() raises its error right away, and the stages that haven't started yet, e.g. the ones
+    waiting on a dependency that is still running, are cancelled instead of run.
+    """
+
+    def __init__(self, checkpoint=None):
+        self.checkpoint = checkpoint
+        self.stages = {}
+        self.timings = {}
+        self.lock = threading.Lock()
+        self.futures = {}
+        self.cancelled = threading.Event()
+        self.start = None
+        self.wall_time = None
+
+    def add(self, name, func, dependencies=(), checkpoint=False):
+        for dependency in dependencies:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        self.stages[name] = (func, tuple(dependencies), checkpoint)
+
+    def is_checkpointed(self, name):
+        return self.checkpoint is not None and self.stages[name][2] and self.checkpoint.has_stage(name)
+
+    def needed_stages(self):
+        # Walk back from the stages nothing depends on, stopping at the stages that are in the checkpoint
+        dependencies = {dependency for _, stage_dependencies, _ in self.stages.values()
+                        for dependency in stage_dependencies}
+        to_visit = [name for name in self.stages if name not in dependencies]
+        needed = set()
+        while to_visit:
+            name = to_visit.pop()
+            if name not in needed:
+                needed.add(name)
+                if not self.is_checkpointed(name):
+                    to_visit.extend(self.stages[name][1])
+        return [name for name in self.stages if name in needed]
+
+    def run_stage(self, name):
+        try:
+            return self.run_stage_func(name)
+        except BaseException:
+            self.cancelled.set()
+            raise
+
+    def run_stage_func(self, name):
+        func, dependencies, checkpoint = self.stages[name]
+        if self.is_checkpointed(name):
+            start = time.perf_counter()
+            result = self.checkpoint.load_stage(name)
+            logger.info(f"Loaded the result of stage {name} from the checkpoint")
+        else:
+            results = [self.futures[dependency].result() for dependency in dependencies]
+            if self.cancelled.is_set():
+                logger.info(f"Cancelled stage {name}, another stage failed")
+                raise CancelledError(f"Stage {name} was cancelled")
+            start = time.perf_counter()
+            result = func(*results)
+            if checkpoint and self.checkpoint is not None:
+                self.checkpoint.save_stage(name, result)
+        end = time.perf_counter()
+        with self.lock:
+            self.timings[name] = (start - self.start, end - self.start)
+        metrics.record_stage(name, end - start)
+        return result
+
+    def run(self):
+        # Every stage gets its own thread, so a stage waiting on its dependencies never blocks one that is ready
+        self.start = time.perf_counter()
+        self.futures = {}
+        self.timings = {}
+        self.cancelled.clear()
+        needed = self.needed_stages()
+        executor = ThreadPoolExecutor(max_workers=len(needed), thread_name_prefix="stage")
+        try:
+            for name in needed:
+                self.futures[name] = executor.submit(self.run_stage, name)
+            wait(self.futures.values(), return_when=FIRST_EXCEPTION)
+            # A stage that is already running can't be stopped, the error is raised without waiting for it
+            errors = [future.exception() for future in self.futures.values() if future.done() and future.exception()]
+            if errors:
+                raise next((error for error in errors if not isinstance(error, CancelledError)), errors[0])
+            results = {name: future.result() for name, future in self.futures.items()}
+        finally:
+            executor.shutdown(wait=not self.cancelled.is_set())
+        self.wall_time = time.perf_counter() - self.start
+        return results
+
+    def critical_path(self):
+        # Walk back from the stage that finished last, always through the dependency that finished last
+        name = max(self.timings, key=lambda stage: self.timings[stage][1])
+        path = [name]
+        while dependencies := [stage for stage in self.stages[name][1] if stage in self.timings]:
+            name = max(dependencies, key=lambda stage: self.timings[stage][1])
+            path.append(name)
+        return list(reversed(path))
+
+    def report(self):
+        lines = [f"{'stage':<24} {'start':>9} {'end':>9} {'duration':>9}"]
+        for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            lines.append(f"{name:<24} {start:>9.3f} {end:>9.3f} {end - start:>9.3f}")
+
+        path = self.critical_path()
+        critical_time = sum(self.timings[name][1] - self.timings[name][0] for name in path)
+        sequential_time = sum(end - start for start, end in self.timings.values())
+        lines.append(f"Critical path: {' -> '.join(path)} ({critical_time:.3f} seconds)")
+        lines.append(f"Wall time {self.wall_time:.3f} seconds, running the stages one after another would take "
+                     f"{sequential_time:.3f} seconds")
+        return "\n".join(lines)
@@ -0,0 +1,172 @@
+import asyncio
+import contextlib
+import email.utils
+import logging
+import threading
+import time
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INITIAL_LIMIT = 4
+# Additive increase of one request per round trip, multiplicative decrease on throttling and on rising latency
+INCREASE = 1.0
+THROTTLE_DECREASE = 0.5
+LATENCY_DECREASE = 0.9
+# Responses slower than this many times the lowest latency seen mean requests are queueing at the site
+LATENCY_FACTOR = 1.5
+# The lowest latency seen creeps up by this share per response, so it follows the site when it gets slower for good
+MIN_LATENCY_DRIFT = 0.01
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttled(status):
+    # No status means the request failed without a response, e.g. a timeout or a dropped connection
+    return status is None or status in THROTTLE_STATUSES or status >= 500
+
+
+class RateController:
+    """AIMD concurrency window for the requests to one site, with Retry-After pauses and an optional ceiling on
+    requests per second.
+
+    The window grows by one request per round trip while responses are successful and fast, shrinks by 10% when the
+    latency rises above LATENCY_FACTOR times the lowest latency seen, and halves on 429/5xx responses and failed
+    requests, at most once per round trip. Without adaptive the window stays at max_limit. Only keeps the books, the
+    rate limiters below do the waiting.
+    """
+
+    def __init__(self, max_limit, initial_limit=INITIAL_LIMIT, min_limit=1, max_rps=None, adaptive=True,
+                 clock=time.monotonic):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(min(initial_limit, max_limit) if adaptive else max_limit)
+        self.max_rps = max_rps
+        self.adaptive = adaptive
+        self.clock = clock
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.paused_until = 0.0
+        self.min_latency = None
+        self.latency = None
+        self.last_decrease = float("-inf")
+        self.throttled = 0
+
+    def wait_time(self):
+        # Seconds until the next request may start, None while the window is full
+        if self.in_flight >= max(self.min_limit, int(self.limit)):
+            return None
+        now = self.clock()
+        return max(0.0, self.paused_until - now, self.next_start - now)
+
+    def start(self):
+        self.in_flight += 1
+        if self.max_rps:
+            self.next_start = max(self.clock(), self.next_start) + 1 / self.max_rps
+
+    def finish(self, latency, status=None, retry_after=None):
+        self.in_flight -= 1
+        now = self.clock()
+        if retry_after is not None:
+            # Every request waits, not just the retry of the one that was told to
+            self.paused_until = max(self.paused_until, now + retry_after)
+        if is_throttled(status):
+            self.throttled += 1
+        if not self.adaptive:
+            return
+
+        if is_throttled(status):
+            self.decrease(now, THROTTLE_DECREASE)
+        else:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.min_latency = latency if self.min_latency is None else min(
+                latency, self.min_latency * (1 + MIN_LATENCY_DRIFT))
+            if latency > LATENCY_FACTOR * self.min_latency:
+                self.decrease(now, LATENCY_DECREASE)
+            else:
+                self.limit = min(self.max_limit, self.limit + INCREASE / self.limit)
+        metrics.set("concurrency_limit", self.limit)
+
+    def decrease(self, now, factor):
+        # The responses to requests sent before the last decrease say nothing about the new window
+        if now - self.last_decrease < (self.latency or 0):
+            return
+        self.last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
+        logger.debug(f"Concurrency limit lowered to {self.limit:.1f}")
+
+
+class RequestSlot:
+    """Outcome of one request, reported to the controller when its slot is given back."""
+
+    def __init__(self):
+        self.status = None
+        self.retry_after = None
+
+    def record(self, status, headers):
+        self.status = status
+        if status in THROTTLE_STATUSES:
+            self.retry_after = parse_retry_after(headers.get("Retry-After"))
+
+
+class AsyncRateLimiter:
+    """Waits for a RateController in asyncio code."""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.condition = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def request(self):
+        async with self.condition:
+            while (delay := self.controller.wait_time()) != 0:
+                try:
+                    await asyncio.wait_for(self.condition.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            self.controller.start()
+        slot = RequestSlot()
+        start = time.perf_counter()
+        try:
+            yield slot
+        finally:
+            async with self.condition:
+                self.controller.finish(time.perf_counter() - start, slot.status, slot.retry_after)
+                self.condition.notify_all()
+
+
+class ThreadRateLimiter:
+    """Waits for a RateController in threads."""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def request(self):
+        with self.condition:
+            while (delay := self.controller.wait_time()) != 0:
+                self.condition.wait(delay)
+            self.controller.start()
+        slot = RequestSlot()
+        start = time.perf_counter()
+        try:
+            yield slot
+        finally:
+            with self.condition:
+                self.controller.finish(time.perf_counter() - start, slot.status, slot.retry_after)
+                self.condition.notify_all()
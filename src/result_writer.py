@@ -0,0 +1,195 @@
+import datetime
+import functools
+import json
+import logging
+import os
+import tempfile
+import time
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = "results"
+FILENAME_PATTERN = "result_{timestamp}"
+OUTPUT_FORMATS = ["ndjson", "json", "parquet"]
+# The indented JSON array result_*.json has always been
+DEFAULT_OUTPUT_FORMAT = "json"
+COMPRESSIONS = ["none", "gzip", "zstd"]
+EXTENSIONS = {"ndjson": ".ndjson", "json": ".json", "parquet": ".parquet"}
+COMPRESSION_EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# NDJSON is serialized this many rows at a time, so the full document never has to be held in memory
+NDJSON_CHUNK_SIZE = 1000
+
+
+@functools.cache
+def get_nested_column_types():
+    # Nested columns get explicit Arrow types, inferring them fails on columns where e.g. every person is null.
+    # pyarrow is imported where it is used throughout, the CLI imports this module to parse its arguments
+    import pyarrow
+
+    person_type = pyarrow.list_(pyarrow.struct([
+        ("title", pyarrow.string()),
+        ("name", pyarrow.string()),
+        ("person", pyarrow.struct([("title", pyarrow.string())])),
+    ]))
+    return {
+        "fund": pyarrow.list_(pyarrow.string()),
+        "responsible_advisors": pyarrow.list_(pyarrow.string()),
+        "board": person_type,
+        "management": person_type,
+        "funding_rounds": pyarrow.list_(pyarrow.struct([
+            ("investor_count", pyarrow.float64()),
+            ("announced_on", pyarrow.string()),
+            ("investment_type", pyarrow.string()),
+            ("raised_amount_usd", pyarrow.float64()),
+        ])),
+    }
+
+
+def get_output_path(output_dir=RESULTS_DIR, filename_pattern=FILENAME_PATTERN, output_format="ndjson",
+                    compression="none"):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    filename = filename_pattern.format(timestamp=timestamp, format=output_format) + EXTENSIONS[output_format]
+    # Parquet compresses its column chunks internally, the file itself keeps the .parquet extension
+    if output_format != "parquet":
+        filename += COMPRESSION_EXTENSIONS[compression]
+    return os.path.join(output_dir, filename)
+
+
+def open_output_stream(path, compression):
+    if compression == "none":
+        return open(path, "wb")
+    import pyarrow
+
+    return pyarrow.CompressedOutputStream(path, compression)
+
+
+def open_partial_output(path, compression):
+    # Written next to path and moved in place once complete, so a failed run leaves no partial file behind
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(file_descriptor)
+    # mkstemp creates the file readable by its owner only
+    os.chmod(temporary_path, 0o644)
+    return open_output_stream(temporary_path, compression), temporary_path
+
+
+def read_ndjson(path):
+    import pyarrow
+
+    # The compression is detected from the extension, as written with --output-compression
+    with pyarrow.input_stream(path, compression="detect") as stream:
+        return [json.loads(line) for line in stream.read().splitlines() if line.strip()]
+
+
+def write_ndjson(df, path, compression="none"):
+    with open_output_stream(path, compression) as stream:
+        for start in range(0, len(df.index), NDJSON_CHUNK_SIZE):
+            chunk = df.iloc[start:start + NDJSON_CHUNK_SIZE]
+            stream.write(chunk.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8"))
+
+
+def write_json(df, path, compression="none"):
+    with open_output_stream(path, compression) as stream:
+        stream.write(df.to_json(orient="records", indent=4, force_ascii=False).encode("utf-8"))
+
+
+def as_list(value):
+    # The HTML scraper gives a single string when a detail only occurs once, and a list when it repeats
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [value]
+    return None
+
+
+def to_list_array(values):
+    # The columns the HTML scraper names after a detail's heading, e.g. board_member or co-ceo, hold a string or a
+    # list of strings. Lists of anything else are kept as JSON text
+    import pyarrow
+
+    lists = [as_list(value) for value in values]
+    if all(isinstance(item, str) for items in lists if items for item in items):
+        return pyarrow.array(lists, type=pyarrow.list_(pyarrow.string()))
+    texts = [json.dumps(value, ensure_ascii=False) if isinstance(value, list)
+             else value if isinstance(value, str) else None for value in values]
+    return pyarrow.array(texts, type=pyarrow.string())
+
+
+def to_arrow_table(df):
+    import pyarrow
+
+    nested_column_types = get_nested_column_types()
+    columns = {}
+    for name in df.columns:
+        if name in nested_column_types:
+            values = [as_list(value) for value in df[name]]
+            columns[name] = pyarrow.array(values, type=nested_column_types[name], from_pandas=True)
+        elif df[name].dtype == object and any(isinstance(value, list) for value in df[name]):
+            columns[name] = to_list_array(df[name])
+        else:
+            columns[name] = pyarrow.Array.from_pandas(df[name])
+    return pyarrow.table(columns)
+
+
+def write_parquet(df, path, compression="none"):
+    import pyarrow.parquet as pq
+
+    pq.write_table(to_arrow_table(df), path, compression=None if compression == "none" else compression)
+
+
+WRITERS = {"ndjson": write_ndjson, "json": write_json, "parquet": write_parquet}
+
+
+class NdjsonSink:
+    """Writes records to an NDJSON file one line at a time, as they are produced.
+
+    The file only appears at path when the sink is closed, a run that fails part way removes what it wrote.
+    """
+
+    def __init__(self, path, compression="none"):
+        self.path = path
+        self.compression = compression
+        self.count = 0
+        self.stream, self.temporary_path = open_partial_output(path, compression)
+
+    def write(self, record):
+        self.stream.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.count += 1
+
+    def close(self):
+        self.stream.close()
+        os.replace(self.temporary_path, self.path)
+        metrics.set("result_file_bytes", os.path.getsize(self.path), format="ndjson", compression=self.compression)
+        metrics.set("rows", self.count, stage="written")
+        logger.info(f"Wrote {self.count} rows as ndjson ({self.compression}) to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.stream.close()
+            os.remove(self.temporary_path)
+
+
+def write_results(df, output_dir=RESULTS_DIR, filename_pattern=FILENAME_PATTERN, output_format=DEFAULT_OUTPUT_FORMAT,
+                  compression="none"):
+    path = get_output_path(output_dir, filename_pattern, output_format, compression)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    start = time.perf_counter()
+    WRITERS[output_format](df, path, compression)
+    elapsed = time.perf_counter() - start
+
+    size = os.path.getsize(path)
+    metrics.set("result_write_seconds", elapsed, format=output_format, compression=compression)
+    metrics.set("result_file_bytes", size, format=output_format, compression=compression)
+    metrics.set("rows", len(df.index), stage="written")
+    logger.info(f"Wrote {len(df.index)} rows as {output_format} ({compression}) to {path}, "
+                f"{size / 1024 / 1024:.2f} MB in {elapsed:.3f} seconds")
+    return path
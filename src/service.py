@@ -0,0 +1,171 @@
+import asyncio
+import datetime
+import json
+import logging
+import time
+
+from aiohttp import web
+
+from domains import get_registered_domain
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_INTERVAL_MINUTES = 60
+REFRESH_INTERVAL_MINUTES = 15
+# Companies are enriched this many at a time on a thread, so store lookups and fuzzy matching never hold up requests
+ENRICH_BATCH_SIZE = 50
+
+
+class PortfolioService:
+    """Keeps the enrichment data and the enriched portfolio in memory, refreshes both on a schedule and serves the
+    portfolio over HTTP.
+
+    load_enrichment returns a lookup for enrich, enrichment_version something that changes with the enrichment blobs,
+    scrape an async iterator of company data and enrich an enriched record from company data and a lookup.
+    """
+
+    def __init__(self, load_enrichment, enrichment_version, scrape, enrich,
+                 scrape_interval=SCRAPE_INTERVAL_MINUTES * 60, refresh_interval=REFRESH_INTERVAL_MINUTES * 60):
+        self.load_enrichment = load_enrichment
+        self.enrichment_version = enrichment_version
+        self.scrape = scrape
+        self.enrich = enrich
+        self.scrape_interval = scrape_interval
+        self.refresh_interval = refresh_interval
+        self.lookup = None
+        self.version = None
+        self.enrichment_loaded = None
+        self.portfolio = None
+        # Refreshing the enrichment data and rescraping take turns, a scrape never mixes two versions of the data
+        self.lock = asyncio.Lock()
+
+    async def refresh_enrichment(self):
+        version = await asyncio.to_thread(self.enrichment_version)
+        if self.lookup is not None and version == self.version:
+            logger.info("Enrichment data is unchanged")
+            return False
+        start = time.perf_counter()
+        self.lookup = await asyncio.to_thread(self.load_enrichment)
+        self.version = version
+        self.enrichment_loaded = datetime.datetime.now()
+        logger.info(f"Loaded enrichment data in {time.perf_counter() - start:.3f} seconds")
+        return True
+
+    def enrich_batch(self, batch, lookup):
+        return [self.enrich(company_data, lookup) for company_data in batch]
+
+    async def rescrape(self):
+        start = time.perf_counter()
+        lookup = self.lookup
+        records = []
+        batch = []
+        async for company_data in self.scrape():
+            batch.append(company_data)
+            if len(batch) == ENRICH_BATCH_SIZE:
+                records += await asyncio.to_thread(self.enrich_batch, batch, lookup)
+                batch = []
+        records += await asyncio.to_thread(self.enrich_batch, batch, lookup)
+        self.set_portfolio(records)
+        metrics.set("rows", len(records), stage="served")
+        logger.info(f"Scraped and enriched {len(records)} companies in {time.perf_counter() - start:.3f} seconds")
+
+    def set_portfolio(self, records):
+        by_title = {}
+        by_domain = {}
+        for record in records:
+            if isinstance(record.get("title"), str):
+                by_title.setdefault(record["title"].strip().lower(), []).append(record)
+            if isinstance(record.get("registered_domain"), str):
+                by_domain.setdefault(record["registered_domain"], []).append(record)
+        # Swapped in one assignment, a request sees either the previous or the new portfolio. The whole portfolio is
+        # serialized once here instead of on every request
+        self.portfolio = {"records": records, "by_title": by_title, "by_domain": by_domain,
+                          "body": json.dumps(records, ensure_ascii=False).encode("utf-8"),
+                          "scraped": datetime.datetime.now()}
+
+    async def update(self, rescrape=True):
+        async with self.lock:
+            changed = await self.refresh_enrichment()
+            # Companies are enriched again as soon as the enrichment data changes
+            if rescrape or changed or self.portfolio is None:
+                await self.rescrape()
+
+    async def run_periodically(self, interval, rescrape):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.update(rescrape)
+            except Exception:
+                # The previous portfolio keeps being served, the next round tries again
+                logger.exception("Updating the portfolio failed")
+
+    async def get_health(self, request):
+        portfolio = self.portfolio
+        return web.json_response({
+            "ready": portfolio is not None,
+            "companies": len(portfolio["records"]) if portfolio else 0,
+            "scraped": portfolio["scraped"].isoformat(timespec="seconds") if portfolio else None,
+            "enrichment_loaded": self.enrichment_loaded.isoformat(timespec="seconds")
+            if self.enrichment_loaded else None,
+        })
+
+    async def get_companies(self, request):
+        if self.portfolio is None:
+            return web.json_response({"error": "The portfolio is still being scraped"}, status=503)
+        return web.Response(body=self.portfolio["body"], content_type="application/json")
+
+    async def get_companies_by_title(self, request):
+        return self.companies_response("by_title", request.match_info["title"].strip().lower())
+
+    async def get_companies_by_domain(self, request):
+        # A url or a host works too, e.g. https://www.example.com/about is looked up as example.com
+        domain = request.match_info["domain"].strip().lower()
+        return self.companies_response("by_domain", get_registered_domain(domain) or domain)
+
+    def companies_response(self, index, key):
+        if self.portfolio is None:
+            return web.json_response({"error": "The portfolio is still being scraped"}, status=503)
+        records = self.portfolio[index].get(key)
+        if not records:
+            return web.json_response({"error": f"No company found for {key}"}, status=404)
+        return web.json_response(records, dumps=lambda value: json.dumps(value, ensure_ascii=False))
+
+    async def get_metrics(self, request):
+        return web.Response(text=metrics.prometheus_text(), content_type="text/plain")
+
+    @web.middleware
+    async def record_request(self, request, handler):
+        start = time.perf_counter()
+        response = await handler(request)
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else "unmatched"
+        metrics.observe("service_request_duration_seconds", time.perf_counter() - start, route=route)
+        metrics.increment("service_requests_total", route=route, status=str(response.status))
+        return response
+
+    def create_app(self):
+        app = web.Application(middlewares=[self.record_request])
+        app.router.add_get("/health", self.get_health)
+        app.router.add_get("/companies", self.get_companies)
+        app.router.add_get("/companies/title/{title}", self.get_companies_by_title)
+        app.router.add_get("/companies/domain/{domain:.+}", self.get_companies_by_domain)
+        app.router.add_get("/metrics", self.get_metrics)
+        return app
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        runner = web.AppRunner(self.create_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        host, port = runner.addresses[0][:2]
+        logger.info(f"Serving the portfolio on http://{host}:{port}")
+        tasks = []
+        try:
+            # Requests are answered while the first scrape runs, /companies with a 503 until it is done
+            await self.update()
+            tasks = [asyncio.create_task(self.run_periodically(self.refresh_interval, rescrape=False)),
+                     asyncio.create_task(self.run_periodically(self.scrape_interval, rescrape=True))]
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await runner.cleanup()
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+import re
+
+from result_writer import read_ndjson
+
+logger = logging.getLogger(__name__)
+
+# Index of a company in the listings of an unsharded run, kept in the output of every shard so merging the shards
+# restores that order
+POSITION_FIELD = "listing_position"
+# The shard, as i/N, and the number of companies listed in the whole run, kept on every record so merging can tell
+# that no shard is missing
+SHARD_FIELD = "shard"
+LISTED_FIELD = "listed_companies"
+SHARD_FILENAME_SUFFIX = "_shard-{index}-of-{count}"
+SHARD_FILENAME_PATTERN = re.compile(r"_shard-(\d+)-of-(\d+)")
+
+
+def parse_shard(value):
+    # "i/N", the i-th of N shards, counted from 1
+    index, _, count = value.partition("/")
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard {value} isn't between 1/{count} and {count}/{count}")
+    return Shard(index, count)
+
+
+def shard_of(key, count):
+    # A stable hash, Python's own hash() of a str differs between processes
+    digest = hashlib.blake2b((key or "").encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count + 1
+
+
+class Shard:
+    """The companies whose company_details_path hashes to index out of count shards.
+
+    select() is called with the listings in the order an unsharded run scrapes them, and keeps the listing positions of
+    the companies it selects in positions.
+    """
+
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+        self.positions = []
+        self.listed = 0
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    def contains(self, key):
+        return shard_of(key, self.count) == self.index
+
+    def select(self, companies, key):
+        selected = []
+        for company in companies:
+            if self.contains(key(company)):
+                self.positions.append(self.listed)
+                selected.append(company)
+            self.listed += 1
+        logger.info(f"Shard {self} has {len(selected)} of {len(companies)} listed companies")
+        return selected
+
+    def add_positions(self, company_data):
+        # The scrapers return the selected companies in the order they were selected
+        if len(company_data) != len(self.positions):
+            raise ValueError(f"Shard {self} selected {len(self.positions)} companies but {len(company_data)} were "
+                             f"scraped")
+        for position, record in zip(self.positions, company_data):
+            record[POSITION_FIELD] = position
+            record[SHARD_FIELD] = str(self)
+            record[LISTED_FIELD] = self.listed
+        return company_data
+
+
+def read_shard(path):
+    records = read_ndjson(path)
+    if records:
+        return parse_shard(records[0][SHARD_FIELD]), records[0][LISTED_FIELD], records
+    # A shard none of the listed companies hashed to writes no records, only its filename tells which one it is
+    match = SHARD_FILENAME_PATTERN.search(os.path.basename(path))
+    if match is None:
+        raise ValueError(f"{path} is empty and its name doesn't tell which shard it is")
+    return Shard(int(match[1]), int(match[2])), None, records
+
+
+def merge_shards(paths):
+    records = []
+    positions = set()
+    shards = {}
+    counts = set()
+    listed = set()
+    for path in paths:
+        shard, shard_listed, shard_records = read_shard(path)
+        if shard.index in shards:
+            raise ValueError(f"{path} and {shards[shard.index]} are both shard {shard}, was a shard given twice?")
+        shards[shard.index] = path
+        counts.add(shard.count)
+        if shard_listed is not None:
+            listed.add(shard_listed)
+        shard_positions = {record[POSITION_FIELD] for record in shard_records}
+        if positions & shard_positions:
+            raise ValueError(f"{path} has companies that are also in another shard, was it given twice?")
+        positions |= shard_positions
+        records += shard_records
+
+    if len(counts) != 1 or len(listed) > 1:
+        raise ValueError(f"The shards in {', '.join(paths)} are from different runs")
+    count, = counts
+    missing_shards = sorted(set(range(1, count + 1)) - set(shards))
+    if missing_shards:
+        raise ValueError(f"Shards {', '.join(f'{index}/{count}' for index in missing_shards)} are missing")
+    total = listed.pop() if listed else 0
+    if positions != set(range(total)):
+        missing = sorted(set(range(total)) - positions)
+        raise ValueError(f"The shards in {', '.join(paths)} are incomplete, listing positions {missing[:10]} of "
+                         f"{total} are missing")
+
+    # A stable sort, so rows of the same company keep their order
+    records.sort(key=lambda record: record[POSITION_FIELD])
+    logger.info(f"Merged {len(records)} rows from {len(paths)} shards")
+    for record in records:
+        del record[POSITION_FIELD], record[SHARD_FIELD], record[LISTED_FIELD]
+    return records
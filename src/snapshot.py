@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from metrics import metrics
+from result_writer import NDJSON_CHUNK_SIZE, open_partial_output
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELD = "company_details_path"
+SNAPSHOT_FILENAME = "snapshot.ndjson"
+DELTA_FILENAME_PATTERN = "delta_{timestamp}"
+CHANGES = ["added", "changed", "removed"]
+
+
+def canonical_value(value):
+    # pandas writes floats rounded to 10 decimals and whole floats as e.g. 2.0, streamed records keep every digit, so
+    # both are brought to the same form before hashing
+    if isinstance(value, dict):
+        return {key: canonical_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [canonical_value(item) for item in value]
+    if isinstance(value, float):
+        value = round(value, 10)
+        return int(value) if value.is_integer() else value
+    return value
+
+
+def content_hash(value):
+    text = json.dumps(canonical_value(value), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def fingerprint(record):
+    """Stable content hash of a record and of each of its fields, independent of the order of the fields."""
+    field_hashes = {field: content_hash(value) for field, value in record.items()}
+    return content_hash(sorted(field_hashes.items())), field_hashes
+
+
+def load_snapshot(path):
+    if not os.path.exists(path):
+        logger.info(f"No snapshot at {path}, every company is reported as added")
+        return {}
+    with open(path, encoding="utf-8") as file:
+        entries = (json.loads(line) for line in file if line.strip())
+        return {entry["key"]: entry for entry in entries}
+
+
+def write_snapshot(path, entries):
+    # Replaced in one step, a failed run leaves the previous snapshot to compare the next run against
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+        for entry in entries.values():
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(temporary_path, path)
+
+
+class SnapshotDiff:
+    """Compares records one at a time with the fingerprints of the previous snapshot.
+
+    Only fingerprints are kept, a record is hashed field by field so a changed record is reported with just the fields
+    whose values changed.
+    """
+
+    def __init__(self, previous):
+        self.previous = previous
+        self.current = {}
+        self.counts = dict.fromkeys(CHANGES, 0)
+
+    def diff(self, record):
+        key = record.get(KEY_FIELD)
+        record_fingerprint, field_hashes = fingerprint(record)
+        self.current[key] = {"key": key, "fingerprint": record_fingerprint, "fields": field_hashes}
+        previous = self.previous.get(key)
+        if previous is None:
+            self.counts["added"] += 1
+            return {"change": "added", "key": key, "fingerprint": record_fingerprint, "record": record}
+        if previous["fingerprint"] == record_fingerprint:
+            return None
+
+        self.counts["changed"] += 1
+        change = {"change": "changed", "key": key, "fingerprint": record_fingerprint,
+                  "previous_fingerprint": previous["fingerprint"],
+                  "fields": {field: record[field] for field, field_hash in field_hashes.items()
+                             if previous["fields"].get(field) != field_hash}}
+        removed_fields = [field for field in previous["fields"] if field not in field_hashes]
+        if removed_fields:
+            change["removed_fields"] = removed_fields
+        return change
+
+    def removed(self):
+        for key, previous in self.previous.items():
+            if key not in self.current:
+                self.counts["removed"] += 1
+                yield {"change": "removed", "key": key, "previous_fingerprint": previous["fingerprint"]}
+
+    def summary(self):
+        for change, count in self.counts.items():
+            metrics.set("delta_records", count, change=change)
+        return ", ".join(f"{count} {change}" for change, count in self.counts.items())
+
+
+class DeltaSink:
+    """Writes the changes since the previous snapshot to an NDJSON file as records come in, and the new snapshot when
+    it is closed.
+
+    The delta file only appears when the sink is closed, together with the new snapshot.
+    """
+
+    def __init__(self, path, snapshot_path, compression="none"):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.snapshot_diff = SnapshotDiff(load_snapshot(snapshot_path))
+        self.stream, self.temporary_path = open_partial_output(path, compression)
+
+    def write(self, record):
+        change = self.snapshot_diff.diff(record)
+        if change is not None:
+            self.stream.write((json.dumps(change, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def close(self):
+        for change in self.snapshot_diff.removed():
+            self.stream.write((json.dumps(change, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.stream.close()
+        os.replace(self.temporary_path, self.path)
+        write_snapshot(self.snapshot_path, self.snapshot_diff.current)
+        metrics.set("delta_file_bytes", os.path.getsize(self.path))
+        logger.info(f"Compared with the previous snapshot: {self.snapshot_diff.summary()}, wrote the changes to "
+                    f"{self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        # A failed run would report every company it didn't get to as removed, and the next run would report the
+        # changes it did write again, so neither the delta nor the snapshot is written
+        if exc_type is None:
+            self.close()
+        else:
+            self.stream.close()
+            os.remove(self.temporary_path)
+
+
+def iter_records(df):
+    # The records as they are written to the result file, converted a chunk at a time
+    for start in range(0, len(df.index), NDJSON_CHUNK_SIZE):
+        chunk = df.iloc[start:start + NDJSON_CHUNK_SIZE]
+        yield from json.loads(chunk.to_json(orient="records", force_ascii=False))
+
+
+def write_delta(df, path, snapshot_path, compression="none"):
+    with DeltaSink(path, snapshot_path, compression) as sink:
+        for record in iter_records(df):
+            sink.write(record)
+    return path
@@ -0,0 +1,61 @@
+import math
+
+import pandas
+
+from enrichment_store import ORGANIZATION_COLUMNS
+from fuzzy_matching import match_companies
+from page_data.page_data_extraction import DETAIL_COLUMNS
+
+
+class MemoryLookup:
+    """Organizations and funding rounds held in memory, with the single record lookups of EnrichmentStore."""
+
+    def __init__(self, organizations, rounds_by_uuid=None, block_index=None):
+        self.organizations = organizations[ORGANIZATION_COLUMNS]
+        self.positions = {key: position for position, key in
+                          enumerate(zip(organizations["registered_domain"], organizations["name"]))
+                          if all(isinstance(value, str) for value in key)}
+        self.rounds_by_uuid = rounds_by_uuid or {}
+        self.block_index = block_index
+
+    def lookup_organization(self, key):
+        position = self.positions.get(key)
+        return None if position is None else self.organizations.iloc[position].to_dict()
+
+    def lookup_funding_rounds(self, org_uuids):
+        return [self.rounds_by_uuid.get(org_uuid, []) if isinstance(org_uuid, str) else [] for org_uuid in org_uuids]
+
+    def find_candidates(self, block_keys):
+        return self.block_index.find_candidates(block_keys)
+
+
+def enrich_record(company_data, lookup, funding_rounds=True, fuzzy_threshold=None):
+    # The same columns, in the same order, as the row of the company in the batch output
+    record = company_data | {column: None for column in DETAIL_COLUMNS if column not in company_data}
+    key = (record["registered_domain"], record["title"])
+    organization = lookup.lookup_organization(key) if all(isinstance(value, str) for value in key) else None
+    confidence = 1.0 if organization else None
+    if organization is None and fuzzy_threshold is not None:
+        match, = match_companies([record["title"]], [record["registered_domain"]], lookup.find_candidates,
+                                 fuzzy_threshold)
+        if match is not None:
+            organization = lookup.lookup_organization(match[0])
+            confidence = match[1]
+
+    record |= organization or dict.fromkeys(ORGANIZATION_COLUMNS)
+    if fuzzy_threshold is not None:
+        record["match_confidence"] = confidence
+    if funding_rounds:
+        record["funding_rounds"] = lookup.lookup_funding_rounds([record["uuid"]])[0]
+    return to_json_values(record)
+
+
+def to_json_values(value):
+    # Missing values from pandas become null, as they do in the batch output
+    if isinstance(value, dict):
+        return {key: to_json_values(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_json_values(item) for item in value]
+    if value is pandas.NA or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
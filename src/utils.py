@@ -1,32 +1,33 @@
-import datetime
 import json
-import time
+import sys
 from functools import wraps
 
+from metrics import metrics
+
 
 def time_function(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start = time.perf_counter()
-        result = func(*args, **kwargs)
-        end = time.perf_counter()
-        elapsed = end - start
-        print(f"Function: {func.__name__} took {elapsed:.6f} seconds to execute")
-        return result
+        with metrics.timer(func.__name__):
+            return func(*args, **kwargs)
     return wrapper
 
 
+def get_peak_rss_mb(usage=None):
+    # Peak RSS of this process, or from the resource usage of a child process, e.g. as returned by os.wait4
+    if usage is None:
+        # The resource module is not available on Windows
+        try:
+            import resource
+        except ImportError:
+            return float("nan")
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+    peak_rss = usage.ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak_rss / 1024 / 1024 if sys.platform == "darwin" else peak_rss / 1024
+
+
 @time_function
 def read_json_file(file):
     with open(file, "r", encoding="utf8") as json_file:
         return json.load(json_file)
-
-
-@time_function
-def save_df_to_file(df):
-    current_time = datetime.datetime.now()
-    timestamp = current_time.strftime("%Y-%m-%d_%H-%M-%S")
-    filepath = f"results/result_{timestamp}.json"  # TODO: Use os.path.join ?
-
-    with open(filepath, "w", encoding="utf-8") as file:
-        df.to_json(path_or_buf=file, orient="records", indent=4, force_ascii=False)
@@ -0,0 +1,50 @@
+import gzip
+import hashlib
+import io
+import json
+
+
+class FakeBlob:
+    def __init__(self, name, data, generation):
+        self.name = name
+        self.data = data
+        self.generation = generation
+        self.md5_hash = hashlib.md5(data).hexdigest()
+        self.downloads = 0
+
+    def download_as_bytes(self):
+        self.downloads += 1
+        return self.data
+
+    def open(self, mode="rb"):
+        self.downloads += 1
+        return io.BytesIO(self.data)
+
+
+class FakeBucket:
+    def __init__(self):
+        self.blobs = {}
+
+    def blob(self, name):
+        return self.blobs[name]
+
+    def get_blob(self, name):
+        return self.blobs.get(name)
+
+
+class FakeStorageClient:
+    """Stands in for google.cloud.storage.Client with blobs held in memory."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def bucket(self, name):
+        return self.buckets.setdefault(name, FakeBucket())
+
+    def upload_records(self, bucket_name, blob_name, records):
+        # Stores the records as gzipped NDJSON, the same format as the enrichment blobs, with a new generation
+        data = gzip.compress("\n".join(json.dumps(record) for record in records).encode("utf-8"))
+        bucket = self.bucket(bucket_name)
+        previous = bucket.blobs.get(blob_name)
+        bucket.blobs[blob_name] = FakeBlob(blob_name, data, previous.generation + 1 if previous else 1)
+        return bucket.blobs[blob_name]
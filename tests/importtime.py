@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "main.py")
+HEAVY_MODULES = {"pandas", "numpy", "pyarrow", "google.cloud.storage", "aiohttp", "playwright"}
+
+
+def run_with_importtime(*arguments, env=None):
+    # -X importtime writes "import time: self [us] | cumulative | imported package" lines to stderr, the imports
+    # made by other imports are indented
+    process = subprocess.run([sys.executable, "-X", "importtime", MAIN_PATH, *arguments], capture_output=True,
+                             text=True, env=env)
+    imports = {}
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and not line.endswith("imported package"):
+            _, cumulative, name = line[len("import time:"):].split("|")
+            imports[name.strip()] = (int(cumulative) / 1e6, name.startswith("  "))
+    return process, imports
+
+
+def total_import_seconds(imports):
+    return sum(seconds for seconds, nested in imports.values() if not nested)
@@ -0,0 +1,181 @@
+import asyncio
+import base64
+import hashlib
+import html
+import json
+import random
+import threading
+import time
+
+from aiohttp import web
+
+# Loads the page data the same way Gatsby does when it hydrates a page, so the intercepting scraper works too
+PAGE_DATA_SCRIPT = '<script>fetch("/page-data" + window.location.pathname + "page-data.json");</script>'
+
+
+def render_listing_html(nodes):
+    # Same structure as the portfolio table on eqtgroup.com, as read by html_playwright.dom_extraction
+    rows = []
+    for node in nodes:
+        cells = [f'<a href="{html.escape(node["path"])}">{html.escape(node["title"])}</a>', node.get("sector"),
+                 node.get("country"), ", ".join(fund["title"] for fund in node.get("fund", [])), node.get("entryDate")]
+        if node.get("exitDate"):
+            cells.append(node["exitDate"])
+        rows.append('<li class="flex items-center">' + "".join(
+            f'<span class="flex-1">{cell if index == 0 else html.escape(cell or "")}</span>'
+            for index, cell in enumerate(cells)) + "</li>")
+    return (f'<!DOCTYPE html><html><body><div id="content"><div></div><div><div><div><div></div><div><ul>'
+            f'{"".join(rows)}</ul></div></div></div></div></div>{PAGE_DATA_SCRIPT}</body></html>')
+
+
+def render_company_html(company_details):
+    rows = [("Sector", company_details.get("sector")), ("Market", company_details.get("country"))]
+    rows += [("Fund", fund["title"]) for fund in company_details.get("fund", [])]
+    rows += [("Entry", company_details.get("entryDate")), ("Web", company_details.get("website"))]
+    items = "".join(f'<li class="flex"><div class="flex-1">{key}</div><div class="flex-1">{html.escape(value or "")}'
+                    f'</div></li>' for key, value in rows)
+    paragraphs = "".join(
+        f'<p class="font-body">{html.escape("".join(child.get("text", "") for child in block.get("children", [])))}</p>'
+        for block in company_details.get("_rawBody") or [])
+    return (f'<!DOCTYPE html><html><body><div id="gatsby-focus-wrapper"><main>'
+            f'<div><h2 class="font-h3">{html.escape(company_details.get("heading") or "")}</h2>'
+            f'<p class="font-preamble">{html.escape(company_details.get("preamble") or "")}</p><ul>{items}</ul></div>'
+            f'<div></div><div></div><div>{paragraphs}</div></main></div>{PAGE_DATA_SCRIPT}</body></html>')
+
+
+class StandInSite:
+    """Serves Gatsby page-data.json files and the matching HTML pages the same way eqtgroup.com does, from in-memory
+    fixtures. Blobs are served through the part of the GCS JSON API the storage client uses, see STORAGE_EMULATOR_HOST.
+    """
+
+    def __init__(self, listings, details, failures=None, delay=0, error_rate=0, seed=0, blobs=None, capacity=None,
+                 throttle_above=None, retry_after=1):
+        # listings: portfolio path -> company nodes, details: company path -> sanityCompanyPage
+        self.pages = {}
+        self.html_pages = {}
+        for path, nodes in listings.items():
+            self.pages[f"/page-data{path}page-data.json"] = {
+                "result": {"data": {"allSanityCompanyPage": {"nodes": nodes}}}}
+            self.html_pages[path] = render_listing_html(nodes)
+        for path, company_details in details.items():
+            self.pages[f"/page-data{path}page-data.json"] = {"result": {"data": {"sanityCompanyPage": company_details}}}
+            self.html_pages[path] = render_company_html(company_details)
+
+        # blobs: (bucket name, blob name) -> bytes
+        self.blobs = dict(blobs or {})
+
+        # failures: url path -> number of 503 responses to send before the page is served,
+        # error_rate: share of the remaining page data requests that randomly get a 503
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        # capacity: page data requests handled at the same time, the rest queue and see a higher latency,
+        # throttle_above: with more page data requests than this in flight the site answers 429 with Retry-After
+        self.capacity = capacity
+        self.throttle_above = throttle_above
+        self.retry_after = retry_after
+        self.throttled = 0
+        self.queue = None
+        self.requests = []
+        self.latencies = []
+        self.errors = 0
+        self.not_modified = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.loop = None
+        self.runner = None
+
+    def reset(self):
+        self.requests = []
+        self.latencies = []
+        self.errors = 0
+        self.not_modified = 0
+        self.max_in_flight = 0
+        self.throttled = 0
+
+    async def handle(self, request):
+        if request.path.startswith(("/storage/v1/b/", "/download/storage/v1/b/")):
+            return self.handle_blob(request)
+        self.requests.append(request.path)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            if self.throttle_above is not None and self.in_flight > self.throttle_above:
+                self.throttled += 1
+                return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+            if self.capacity is not None:
+                if self.queue is None:
+                    self.queue = asyncio.Semaphore(self.capacity)
+                async with self.queue:
+                    await asyncio.sleep(self.delay)
+            elif self.delay:
+                await asyncio.sleep(self.delay)
+            if request.path in self.html_pages:
+                return web.Response(text=self.html_pages[request.path], content_type="text/html")
+            if self.failures.get(request.path, 0) > 0:
+                self.failures[request.path] -= 1
+                return web.Response(status=503)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return web.Response(status=503)
+            if request.path not in self.pages:
+                return web.Response(status=404)
+
+            body = json.dumps(self.pages[request.path]).encode("utf-8")
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            if request.headers.get("If-None-Match") == etag:
+                self.not_modified += 1
+                return web.Response(status=304, headers={"ETag": etag})
+            return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+        finally:
+            self.in_flight -= 1
+            self.latencies.append(time.perf_counter() - start)
+
+    def handle_blob(self, request):
+        # /storage/v1/b/<bucket>/o/<blob> returns metadata, /download/... with alt=media returns (a range of) the data
+        path = request.path.removeprefix("/download").removeprefix("/storage/v1/b/")
+        bucket_name, _, blob_name = path.partition("/o/")
+        data = self.blobs.get((bucket_name, blob_name))
+        if data is None:
+            return web.Response(status=404)
+        if not request.path.startswith("/download/"):
+            return web.json_response({"bucket": bucket_name, "name": blob_name, "generation": "1",
+                                      "size": str(len(data)),
+                                      "md5Hash": base64.b64encode(hashlib.md5(data).digest()).decode()})
+
+        first, _, last = request.headers.get("Range", "bytes=0-").removeprefix("bytes=").partition("-")
+        first, last = int(first), min(int(last) if last else len(data) - 1, len(data) - 1)
+        return web.Response(status=206, body=data[first:last + 1],
+                            headers={"Content-Range": f"bytes {first}-{last}/{len(data)}"})
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        return app
+
+    def start_in_thread(self, host="127.0.0.1"):
+        # Serves the site from a background thread, for clients that run in other threads or processes
+        started = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            self.runner = web.AppRunner(self.create_app())
+            self.loop.run_until_complete(self.runner.setup())
+            self.loop.run_until_complete(web.TCPSite(self.runner, host, 0).start())
+            started.set()
+            self.loop.run_forever()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=serve, daemon=True)
+        self.thread.start()
+        started.wait()
+        host, port = self.runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        # The loop is closed by the thread once run_forever returns
+        self.thread.join()
@@ -0,0 +1,66 @@
+import copy
+import gzip
+import json
+import os
+import random
+
+from src.gcs_client import BUCKET_NAME
+
+SAMPLE_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data")
+PORTFOLIO_PATHS = ["/current-portfolio/", "/current-portfolio/divestments/"]
+
+
+def synthetic_data(company_count, organization_count, seed=0):
+    # Companies are copies of the sample page data, most of them have a matching organization in the enrichment data
+    rng = random.Random(seed)
+    with open(os.path.join(SAMPLE_DATA_DIR, "current_portfolio_sample.json"), encoding="utf-8") as file:
+        listing_template = json.load(file)[0]
+    with open(os.path.join(SAMPLE_DATA_DIR, "company_details.json"), encoding="utf-8") as file:
+        details_template = json.load(file)
+
+    listings = {path: [] for path in PORTFOLIO_PATHS}
+    details = {}
+    organizations = []
+    funding_rounds = []
+
+    def add_organization(name, homepage_url):
+        organization_uuid = f"00000000-0000-0000-0000-{len(organizations):012d}"
+        organizations.append({
+            "uuid": organization_uuid, "name": name, "homepage_url": homepage_url,
+            "country_code": rng.choice(["USA", "SWE", "GBR", "DEU"]), "city": rng.choice(["Stockholm", "London"]),
+            "founded_on": "2001-01-01", "short_description": "A company that does things", "employee_count": "11-50",
+            "num_funding_rounds": 2.0, "last_funding_on": "2020-01-01", "total_funding_usd": rng.random() * 1e6,
+        })
+        for _ in range(rng.randint(0, 4)):
+            funding_rounds.append({
+                "org_uuid": organization_uuid, "investor_count": float(rng.randint(1, 5)),
+                "announced_on": "2019-06-01", "investment_type": rng.choice(["seed", "series_a", "series_b"]),
+                "raised_amount_usd": rng.random() * 1e7,
+            })
+
+    for index in range(company_count):
+        # Every fourth company is divested
+        portfolio_path = PORTFOLIO_PATHS[1] if index % 4 == 3 else PORTFOLIO_PATHS[0]
+        title = f"Company {index}"
+        path = f"{portfolio_path}company-{index}/"
+        website = f"https://www.company-{index}.com/"
+        exit_date = "2023-01-01" if portfolio_path == PORTFOLIO_PATHS[1] else None
+        listings[portfolio_path].append(listing_template | {"title": title, "path": path, "exitDate": exit_date})
+        details[path] = copy.deepcopy(details_template) | {"title": title, "path": path, "website": website,
+                                                           "exitDate": exit_date}
+        if rng.random() < 0.9:
+            add_organization(title, website)
+
+    for index in range(organization_count):
+        add_organization(f"Other company {index}", f"https://other-company-{index}.com")
+
+    blobs = {
+        (BUCKET_NAME, "interview-test-org.json.gz"): to_ndjson_gz(organizations),
+        (BUCKET_NAME, "interview-test-funding.json.gz"): to_ndjson_gz(funding_rounds),
+    }
+    return listings, details, blobs
+
+
+def to_ndjson_gz(records):
+    # No timestamp in the gzip header, so the same records always give the same blob and md5 hash
+    return gzip.compress("\n".join(json.dumps(record) for record in records).encode("utf-8"), mtime=0)
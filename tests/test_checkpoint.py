@@ -0,0 +1,181 @@
+import asyncio
+import glob
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.checkpoint import COMPANIES_FILENAME, Checkpoint, get_checkpoint_path
+from src.main import parse_args, run
+from src.page_data import page_data_async
+from src.pipeline import Pipeline
+from tests.standin_server import StandInSite
+from tests.synthetic_data import synthetic_data
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "checkpoint")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_partial_last_line_is_ignored(self):
+        checkpoint = Checkpoint(self.path, {"type": "current"})
+        checkpoint.record_company({"company_details_path": "/a/", "title": "A"})
+        checkpoint.record_company({"company_details_path": "/b/", "title": "B"})
+        checkpoint.close()
+        with open(os.path.join(self.path, COMPANIES_FILENAME), "ab") as file:
+            file.write(b'{"company_details_path": "/c/", "ti')
+
+        checkpoint = Checkpoint(self.path, {"type": "current"}, resume=True)
+        self.assertEqual(set(checkpoint.companies), {"/a/", "/b/"})
+        checkpoint.record_company({"company_details_path": "/d/", "title": "D"})
+        checkpoint.close()
+
+        checkpoint = Checkpoint(self.path, {"type": "current"}, resume=True)
+        self.assertEqual(set(checkpoint.companies), {"/a/", "/b/", "/d/"})
+        checkpoint.close(completed=True)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_other_options_start_from_scratch(self):
+        checkpoint = Checkpoint(self.path, {"type": "current"})
+        checkpoint.record_company({"company_details_path": "/a/", "title": "A"})
+        checkpoint.save_stage("scrape", [1, 2, 3])
+        checkpoint.close()
+
+        checkpoint = Checkpoint(self.path, {"type": "divested"}, resume=True)
+        self.assertEqual(checkpoint.companies, {})
+        self.assertEqual(checkpoint.completed_stages(), [])
+        checkpoint.close()
+
+    def test_nothing_is_recorded_after_close(self):
+        # A stage still running when a failed run closes its checkpoint finishes later
+        checkpoint = Checkpoint(self.path, {"command": "full"})
+        checkpoint.close()
+        checkpoint.save_stage("load_organizations", [1])
+        checkpoint.record_company({"company_details_path": "/a/", "title": "A"})
+
+        checkpoint = Checkpoint(self.path, {"command": "full"}, resume=True)
+        self.assertEqual((checkpoint.companies, checkpoint.completed_stages()), ({}, []))
+        checkpoint.close()
+
+    def test_second_run_on_a_checkpoint_fails(self):
+        checkpoint = Checkpoint(self.path, {"command": "full"})
+        checkpoint.record_company({"company_details_path": "/a/", "title": "A"})
+        with self.assertRaises(RuntimeError):
+            Checkpoint(self.path, {"command": "full"})
+        # The first run's checkpoint is untouched
+        checkpoint.save_stage("scrape", [1])
+        checkpoint.close()
+        checkpoint = Checkpoint(self.path, {"command": "full"}, resume=True)
+        self.assertEqual(set(checkpoint.companies), {"/a/"})
+        self.assertEqual(checkpoint.completed_stages(), ["scrape"])
+        checkpoint.close(completed=True)
+
+    def test_runs_with_other_options_use_other_directories(self):
+        scrape = get_checkpoint_path(self.path, {"command": "scrape", "type": ["current"]})
+        self.assertEqual(scrape, get_checkpoint_path(self.path, {"type": ["current"], "command": "scrape"}))
+        self.assertNotEqual(scrape, get_checkpoint_path(self.path, {"command": "enrich", "type": ["current"]}))
+        self.assertNotEqual(scrape, get_checkpoint_path(self.path, {"command": "scrape", "type": ["divested"]}))
+        self.assertTrue(os.path.basename(scrape).startswith("scrape-"))
+
+    def test_completed_stages_are_loaded(self):
+        calls = []
+
+        def stage(name, *results):
+            calls.append(name)
+            return sum(results) + 1
+
+        checkpoint = Checkpoint(self.path)
+        pipeline = Pipeline(checkpoint)
+        pipeline.add("load", partial_stage(stage, "load"))
+        pipeline.add("scrape", partial_stage(stage, "scrape"), checkpoint=True)
+        pipeline.add("merge", partial_stage(stage, "merge"), ["scrape", "load"], checkpoint=True)
+        pipeline.add("enrich", partial_stage(stage, "enrich"), ["merge", "load"])
+        self.assertEqual(pipeline.run()["enrich"], 5)
+        checkpoint.close()
+
+        # Scrape is only needed by merge, which is in the checkpoint
+        calls.clear()
+        pipeline.checkpoint = Checkpoint(self.path, resume=True)
+        results = pipeline.run()
+        self.assertEqual(results["enrich"], 5)
+        self.assertNotIn("scrape", results)
+        self.assertEqual(sorted(calls), ["enrich", "load"])
+        self.assertNotIn("scrape", pipeline.critical_path())
+        pipeline.checkpoint.close()
+
+
+def partial_stage(stage, name):
+    return lambda *results: stage(name, *results)
+
+
+class TestResume(unittest.TestCase):
+    def setUp(self):
+        listings, details, blobs = synthetic_data(20, 100)
+        self.site = StandInSite(listings, details, blobs=blobs)
+        self.base_url = self.site.start_in_thread()
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint_dir = os.path.join(self.directory.name, "checkpoint")
+        self.environment = mock.patch.dict(os.environ, {"STORAGE_EMULATOR_HOST": self.base_url})
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+        self.site.stop()
+        self.directory.cleanup()
+
+    def scrape(self, checkpoint):
+        self.site.reset()
+        return asyncio.run(page_data_async.scrape(["/current-portfolio/"], base_url=self.base_url, max_retries=0,
+                                                  checkpoint=checkpoint))
+
+    def test_scraped_companies_are_not_requested_again(self):
+        self.site.failures = {"/page-data/current-portfolio/company-1/page-data.json": 1}
+        checkpoint = Checkpoint(self.checkpoint_dir)
+        first = self.scrape(checkpoint)
+        checkpoint.close()
+        self.assertNotIn("description", first[1])
+
+        # Only the listing and the company that failed are requested again
+        checkpoint = Checkpoint(self.checkpoint_dir, resume=True)
+        resumed = self.scrape(checkpoint)
+        checkpoint.close()
+        self.assertEqual(sorted(self.site.requests), ["/page-data/current-portfolio/company-1/page-data.json",
+                                                      "/page-data/current-portfolio/page-data.json"])
+        self.assertEqual(resumed[:1] + resumed[2:], first[:1] + first[2:])
+        self.assertTrue(resumed[1]["description"])
+
+    def run_main(self, *arguments):
+        run(parse_args(["--base-url", self.base_url, "--no-cache", "--no-http-cache", "--max-retries", "0",
+                        "--enrichment-store", os.path.join(self.directory.name, "enrichment.sqlite3"),
+                        "--checkpoint-dir", self.checkpoint_dir,
+                        "--output-dir", os.path.join(self.directory.name, "results"), *arguments]))
+
+    def test_resumed_run_skips_completed_stages(self):
+        with mock.patch("src.main.write_results", side_effect=OSError("No space left on device")):
+            with self.assertRaises(OSError):
+                self.run_main("--checkpoint")
+        self.assertEqual(len(glob.glob(os.path.join(self.checkpoint_dir, "full-*", "stage_add_funding_rounds.pickle"))),
+                         1)
+
+        self.site.reset()
+        self.run_main("--resume")
+        self.assertEqual(self.site.requests, [])
+        self.assertEqual(len(glob.glob(os.path.join(self.directory.name, "results", "result_*"))), 1)
+        self.assertEqual([path for path in os.listdir(self.checkpoint_dir) if not path.endswith(".lock")], [])
+
+    def test_checkpoints_are_opt_in(self):
+        with mock.patch("src.main.Checkpoint", side_effect=AssertionError("No checkpoint without --checkpoint")):
+            self.run_main()
+        self.assertFalse(os.path.exists(self.checkpoint_dir))
+        with self.assertRaises(SystemExit):
+            parse_args(["--resume", "--stream"])
+        with self.assertRaises(SystemExit):
+            parse_args(["--checkpoint", "--serve"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from tests.test_playwright_intercept import browser_available
+
+
+@unittest.skipUnless(browser_available(), "Playwright browsers are not installed")
+class TestDomExtraction(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from playwright.sync_api import sync_playwright
+        cls.playwright = sync_playwright().start()
+        cls.browser = cls.playwright.chromium.launch(headless=True)
+        cls.page = cls.browser.new_page()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.browser.close()
+        cls.playwright.stop()
+
+    def load(self, fixture):
+        with open(f"tests/sample_data/site/{fixture}.html", encoding="utf-8") as file:
+            self.page.set_content(file.read())
+
+    def test_extract_company_listings(self):
+        from src.html_playwright.dom_extraction import extract_company_listings
+
+        self.load("listing")
+        self.assertEqual(extract_company_listings(self.page), [
+            {"title": "Acme", "sector": "Technology", "country": "Sweden", "fund": "EQT X", "entry": "2021",
+             "exit": None, "company_details_path": "/current-portfolio/acme/"},
+            {"title": "Globex", "sector": "Healthcare", "country": "Germany", "fund": "EQT IX", "entry": "2019",
+             "exit": "2023", "company_details_path": "/current-portfolio/globex/"},
+            {"title": "Initech", "sector": "Services", "country": "Finland", "fund": "EQT VIII", "entry": "2018",
+             "exit": None, "company_details_path": None},
+        ])
+
+    def test_extract_sub_page(self):
+        from src.html_playwright.dom_extraction import extract_sub_page
+
+        self.load("company")
+        self.assertEqual(extract_sub_page(self.page), {
+            "heading": "Acme",
+            "preamble": "Acme makes everything.",
+            "sector": "Technology",
+            "market": "Sweden",
+            "fund": ["EQT X", "EQT IX", "EQT VIII"],
+            "entry": "2021",
+            "web": "https://www.acme.com",
+            "description": "About. Acme was founded in 1950.",
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
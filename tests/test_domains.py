@@ -0,0 +1,48 @@
+import unittest
+
+import pandas
+import tldextract
+
+from src.domains import get_registered_domain, get_registered_domain_for_host, get_registered_domains
+
+URLS = [
+    "https://firststudentinc.com/",
+    "http://www.workwave.com/about?ref=eqt",
+    "manypets.com",
+    "https://shop.example.co.uk:8080/path",
+    "https://user@Example.CO.UK",
+    "https://192.168.0.1/",
+    "https://www.city.kawasaki.jp/",
+    "https://foo.bar.kawasaki.jp",
+    "http://xn--80ak6aa92e.com",
+    "ftp://files.example.com",
+    "//cdn.example.com/x",
+    "https://example.com./",
+    "not a url",
+    "",
+]
+
+
+class TestDomains(unittest.TestCase):
+    def test_matches_tldextract(self):
+        snapshot_extract = tldextract.TLDExtract(cache_dir=None, suffix_list_urls=())
+        for url in URLS:
+            self.assertEqual(get_registered_domain(url), snapshot_extract(url).registered_domain, url)
+        self.assertIsNone(get_registered_domain(None))
+        self.assertIsNone(get_registered_domain(float("nan")))
+
+    def test_host_is_extracted_once(self):
+        get_registered_domain_for_host.cache_clear()
+        for path in range(10):
+            get_registered_domain(f"https://www.example.com/{path}")
+        self.assertEqual(get_registered_domain_for_host.cache_info().misses, 1)
+
+    def test_get_registered_domains(self):
+        urls = pandas.Series(URLS + [None, "https://www.example.com/a", "https://www.example.com/a"])
+        self.assertEqual(get_registered_domains(urls).tolist(), [get_registered_domain(url) for url in urls])
+        self.assertEqual(get_registered_domains(urls.astype("string[pyarrow]")).tolist(),
+                         [get_registered_domain(url) for url in urls])
+
+
+if __name__ == '__main__':
+    unittest.main()
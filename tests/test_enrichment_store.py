@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+import pandas
+
+from src.enrichment_store import EnrichmentStore
+from src.gcs_client import BUCKET_NAME
+from src.enrichment import (FUNDING_ROUNDS_BLOB, ORGANIZATIONS_BLOB, add_funding_rounds, load_funding_rounds,
+                            load_organizations, lookup_company_data, lookup_funding_rounds, merge_company_data,
+                            prepare_funding_rounds, prepare_organizations)
+from tests.fake_storage import FakeStorageClient
+
+
+def organization(uuid, name, homepage_url, total_funding_usd=None):
+    return {"uuid": uuid, "name": name, "homepage_url": homepage_url, "country_code": "SWE", "city": "Stockholm",
+            "founded_on": "2001-01-01", "short_description": f"About {name}", "employee_count": "11-50",
+            "num_funding_rounds": 1.0, "last_funding_on": None, "total_funding_usd": total_funding_usd}
+
+
+ORGANIZATIONS = [
+    organization("a", "WorkWave", "https://www.workwave.com", 1000.0),
+    organization("b", "ManyPets", "https://manypets.com/uk/"),
+    # Same name and registered domain as the first, the last one is kept
+    organization("c", "WorkWave", "http://workwave.com/about", 2000.0),
+    organization("d", "No homepage", None),
+    organization("e", "Other", "https://other.co.uk"),
+]
+FUNDING_ROUNDS = [
+    {"org_uuid": "c", "investor_count": 2.0, "announced_on": "2020-01-01", "investment_type": "seed",
+     "raised_amount_usd": 100.0},
+    {"org_uuid": "b", "investor_count": None, "announced_on": "2019-01-01", "investment_type": "series_a",
+     "raised_amount_usd": None},
+    {"org_uuid": "c", "investor_count": 5.0, "announced_on": "2021-01-01", "investment_type": "series_a",
+     "raised_amount_usd": 500.0},
+]
+
+
+class TestEnrichmentStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = EnrichmentStore(os.path.join(self.directory.name, "enrichment.sqlite3"))
+        self.storage_client = FakeStorageClient()
+        self.organizations_blob = self.storage_client.upload_records(BUCKET_NAME, ORGANIZATIONS_BLOB, ORGANIZATIONS)
+        self.funding_rounds_blob = self.storage_client.upload_records(BUCKET_NAME, FUNDING_ROUNDS_BLOB,
+                                                                      FUNDING_ROUNDS)
+        self.companies = pandas.DataFrame({
+            "title": ["WorkWave", "ManyPets", "Unknown", "No website", "Other"],
+            "registered_domain": ["workwave.com", "manypets.com", "unknown.com", None, "other.co.uk"],
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def prepare(self):
+        prepare_organizations(self.store, storage_client=self.storage_client)
+        prepare_funding_rounds(self.store, storage_client=self.storage_client)
+
+    def test_lookups_match_merge(self):
+        self.prepare()
+        merged = add_funding_rounds(
+            merge_company_data(self.companies, load_organizations(storage_client=self.storage_client)),
+            load_funding_rounds(storage_client=self.storage_client))
+        looked_up = lookup_funding_rounds(lookup_company_data(self.companies, self.store), self.store)
+        self.assertEqual(list(looked_up.columns), list(merged.columns))
+        self.assertEqual(looked_up.to_json(orient="records"), merged.to_json(orient="records"))
+        self.assertEqual(list(looked_up["uuid"].fillna("")), ["c", "b", "", "", "e"])
+        self.assertEqual([len(rounds) for rounds in looked_up["funding_rounds"]], [2, 1, 0, 0, 0])
+
+    def test_unchanged_blob_is_not_downloaded_again(self):
+        self.prepare()
+        self.prepare()
+        self.assertEqual(self.organizations_blob.downloads, 1)
+        self.assertEqual(self.funding_rounds_blob.downloads, 1)
+
+    def test_new_generation_rebuilds_table(self):
+        self.prepare()
+        blob = self.storage_client.upload_records(BUCKET_NAME, ORGANIZATIONS_BLOB, ORGANIZATIONS[:2])
+        self.assertFalse(self.store.is_current("organizations", blob))
+        self.prepare()
+        self.assertTrue(self.store.is_current("organizations", blob))
+        self.assertEqual(self.funding_rounds_blob.downloads, 1)
+        self.assertEqual(list(lookup_company_data(self.companies, self.store)["uuid"].fillna("")),
+                         ["a", "b", "", "", ""])
+
+    def test_invalidate(self):
+        self.prepare()
+        self.store.invalidate()
+        self.assertFalse(self.store.is_current("organizations", self.organizations_blob))
+        self.assertTrue(lookup_company_data(self.companies, self.store)["uuid"].isna().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
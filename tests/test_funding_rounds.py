@@ -0,0 +1,48 @@
+import unittest
+
+import pandas
+
+from src.enrichment import FUNDING_ROUND_COLUMNS, attach_funding_rounds
+
+
+def query_funding_rounds(companies_data, funding_rounds):
+    # The per company query that attach_funding_rounds replaced, kept as a reference
+    result = []
+    for company in companies_data.itertuples():
+        if not isinstance(company.uuid, str):
+            result.append([])
+            continue
+        rounds = funding_rounds.query(f'org_uuid == "{company.uuid}"')
+        result.append(rounds[FUNDING_ROUND_COLUMNS].to_dict("records") if not rounds.empty else [])
+    return result
+
+
+class TestFundingRounds(unittest.TestCase):
+    def setUp(self):
+        self.funding_rounds = pandas.DataFrame({
+            "org_uuid": ["a", "b", "a", None, "c", "a"],
+            "investor_count": [1.0, None, 3.0, 2.0, 4.0, 1.0],
+            "announced_on": ["2020-01-01", "2019-05-05", "2021-02-02", "2018-01-01", "2017-03-03", "2015-01-01"],
+            "investment_type": ["seed", "series_a", "series_b", "seed", "grant", "angel"],
+            "raised_amount_usd": [100.0, 200.0, None, 50.0, 10.0, 5.0],
+        })
+        self.companies = pandas.DataFrame({
+            "title": ["A", "B", "No match", "No uuid", "A again"],
+            "uuid": ["a", "b", "x", float("nan"), "a"],
+        })
+
+    def test_matches_per_company_query(self):
+        expected_results = query_funding_rounds(self.companies, self.funding_rounds)
+        results = attach_funding_rounds(self.companies, self.funding_rounds)
+        self.assertEqual(
+            pandas.Series(results).to_json(orient="records"),
+            pandas.Series(expected_results).to_json(orient="records"))
+        self.assertEqual([len(rounds) for rounds in results], [3, 1, 0, 0, 3])
+
+    def test_keeps_funding_table_order(self):
+        results = attach_funding_rounds(self.companies, self.funding_rounds)
+        self.assertEqual([r["announced_on"] for r in results[0]], ["2020-01-01", "2021-02-02", "2015-01-01"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas
+
+from src.enrichment_store import BLOCKS_SOURCE, EnrichmentStore
+from src.fuzzy_matching import (MINHASH_BANDS, MINHASH_ROWS, BlockIndex, blocking_keys, match_companies,
+                                minhash_band_keys, name_tokens, rank_candidates)
+from src.gcs_client import BUCKET_NAME
+from src.enrichment import (ORGANIZATIONS_BLOB, index_organizations, load_organizations, lookup_company_data,
+                            merge_company_data, prepare_organizations)
+from tests.fake_storage import FakeStorageClient
+from tests.test_enrichment_store import organization
+
+ORGANIZATIONS = [
+    organization("a", "WorkWave Inc", "https://www.workwave.com"),
+    organization("b", "ManyPets", "https://manypets.io"),
+    organization("c", "Kfzteile24", "https://kfzteile24.de"),
+    organization("d", "Acme Capital", "https://acme-capital.com"),
+    organization("e", "Unrelated", "https://unrelated.com"),
+]
+
+
+def trigrams(name):
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TestBlockingKeys(unittest.TestCase):
+    def test_name_tokens(self):
+        self.assertEqual(name_tokens("WorkWave Group AB"), ["workwave"])
+        self.assertEqual(name_tokens("The Carlyle Group"), ["carlyle"])
+        self.assertEqual(name_tokens("AB Ltd"), ["ab"])
+        self.assertEqual(name_tokens("Société Générale & Co"), ["societe", "generale", "and"])
+
+    def test_keys_are_the_same_in_every_process(self):
+        self.assertEqual(blocking_keys("ManyPets", "manypets.com"), [
+            "d:manypets.com", "l:manypets", "n:manypets", "m0:3ee10795", "m1:52457e5e", "m2:6c92b646", "m3:dcfe7553"])
+
+    def test_band_collisions_follow_the_jaccard_similarity(self):
+        # Names a few characters apart share a band with probability 1 - (1 - s ** rows) ** bands, s being the Jaccard
+        # similarity of their trigrams, when the hash functions are independent
+        rng = random.Random(0)
+        shared = {0.5: [], 0.7: []}
+        for _ in range(6000):
+            name = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(8, 20)))
+            other = list(name)
+            for _ in range(rng.randint(1, 3)):
+                other[rng.randrange(len(other))] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+            other = "".join(other)
+            first, second = trigrams(name), trigrams(other)
+            similarity = round(len(first & second) / len(first | second), 1)
+            if similarity in shared:
+                shared[similarity].append(bool(set(minhash_band_keys(name)) & set(minhash_band_keys(other))))
+        for similarity, collisions in shared.items():
+            expected = 1 - (1 - similarity ** MINHASH_ROWS) ** MINHASH_BANDS
+            self.assertGreater(len(collisions), 500)
+            self.assertAlmostEqual(sum(collisions) / len(collisions), expected, delta=0.04)
+
+    def test_common_blocks_are_skipped(self):
+        with mock.patch("src.fuzzy_matching.MAX_BLOCK_SIZE", 2):
+            self.assertEqual(rank_candidates([[("a", "A"), ("b", "B"), ("c", "C")], [("b", "B")]]), [("b", "B")])
+
+
+class TestFuzzyMatching(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage_client = FakeStorageClient()
+        self.storage_client.upload_records(BUCKET_NAME, ORGANIZATIONS_BLOB, ORGANIZATIONS)
+        self.companies = pandas.DataFrame({
+            # Legal suffix, changed homepage, different spelling, no match at all
+            "title": ["WorkWave", "ManyPets", "KFZteile 24", "Acme Robotics"],
+            "registered_domain": ["workwave.com", "manypets.com", "kfzteile24.de", "acme-robotics.com"],
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_block_index(self):
+        index = BlockIndex(["workwave.com", "manypets.io", None], ["WorkWave Inc", "ManyPets", "No domain"])
+        matches = match_companies(["WorkWave", "ManyPets", "No domain"], ["workwave.com", "manypets.com", None],
+                                  index.find_candidates)
+        self.assertEqual([match[0] if match else None for match in matches],
+                         [("workwave.com", "WorkWave Inc"), ("manypets.io", "ManyPets"), None])
+        self.assertEqual(index.positions, {("workwave.com", "WorkWave Inc"): 0, ("manypets.io", "ManyPets"): 1})
+
+    def test_merge_and_store_lookup_match_the_same_organizations(self):
+        organizations = load_organizations(storage_client=self.storage_client)
+        merged = merge_company_data(self.companies, organizations, index_organizations(organizations))
+
+        store = EnrichmentStore(os.path.join(self.directory.name, "enrichment.sqlite3"))
+        prepare_organizations(store, storage_client=self.storage_client, fuzzy_matching=True)
+        looked_up = lookup_company_data(self.companies, store, fuzzy_threshold=0.8)
+
+        self.assertEqual(list(merged["uuid"].fillna("")), ["a", "b", "c", ""])
+        self.assertEqual(list(merged.columns)[-1], "match_confidence")
+        self.assertEqual(merged.to_json(orient="records"), looked_up.to_json(orient="records"))
+        self.assertEqual(merged["match_confidence"].iloc[0], 0.95)
+        self.assertTrue(0.8 <= merged["match_confidence"].iloc[2] < 0.95)
+        self.assertTrue(pandas.isna(merged["match_confidence"].iloc[3]))
+
+    def test_exact_matches_have_full_confidence(self):
+        companies = pandas.DataFrame({"title": ["Unrelated"], "registered_domain": ["unrelated.com"]})
+        organizations = load_organizations(storage_client=self.storage_client)
+        merged = merge_company_data(companies, organizations, index_organizations(organizations))
+        self.assertEqual(list(merged["match_confidence"]), [1.0])
+
+    def test_blocks_are_only_built_once_per_generation(self):
+        store = EnrichmentStore(os.path.join(self.directory.name, "enrichment.sqlite3"))
+        prepare_organizations(store, storage_client=self.storage_client)
+        blob = self.storage_client.bucket(BUCKET_NAME).get_blob(ORGANIZATIONS_BLOB)
+        self.assertFalse(store.is_current(BLOCKS_SOURCE, blob))
+        prepare_organizations(store, storage_client=self.storage_client, fuzzy_matching=True)
+        self.assertTrue(store.is_current(BLOCKS_SOURCE, blob))
+        with mock.patch.object(store, "replace_organization_blocks") as replace_organization_blocks:
+            prepare_organizations(store, storage_client=self.storage_client, fuzzy_matching=True)
+        replace_organization_blocks.assert_not_called()
+
+    def test_blocks_are_rebuilt_when_the_keys_change(self):
+        store = EnrichmentStore(os.path.join(self.directory.name, "enrichment.sqlite3"))
+        prepare_organizations(store, storage_client=self.storage_client, fuzzy_matching=True)
+        with mock.patch("src.enrichment.BLOCKS_SOURCE", "organization_blocks_v0"), \
+                mock.patch.object(store, "replace_organization_blocks") as replace_organization_blocks:
+            prepare_organizations(store, storage_client=self.storage_client, fuzzy_matching=True)
+        replace_organization_blocks.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pandas
+from google.api_core.exceptions import NotFound
+
+from src.gcs_client import (BUCKET_NAME, ORGANIZATION_DTYPES, BlobCache, fetch_enrichment_data, get_storage_client,
+                            read_enrichment_ndjson, read_enrichment_ndjson_parallel, split_lines)
+from tests.fake_storage import FakeStorageClient
+from tests.standin_server import StandInSite
+
+ORGANIZATIONS = [
+    {"uuid": "a", "name": "First Student", "homepage_url": "https://firststudentinc.com/", "num_funding_rounds": 1.0},
+    {"uuid": "b", "name": "WorkWave", "homepage_url": "https://www.workwave.com", "num_funding_rounds": None},
+]
+
+
+class TestBlobCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = BlobCache(self.directory.name)
+        self.storage_client = FakeStorageClient()
+        self.blob = self.storage_client.upload_records(BUCKET_NAME, "org.json.gz", ORGANIZATIONS)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def fetch(self):
+        return fetch_enrichment_data("org.json.gz", self.cache, self.storage_client)
+
+    def test_unchanged_blob_is_loaded_from_cache(self):
+        first = self.fetch()
+        second = self.fetch()
+        self.assertEqual(self.blob.downloads, 1)
+        self.assertTrue(first.equals(second))
+
+    def test_new_generation_is_downloaded(self):
+        self.fetch()
+        blob = self.storage_client.upload_records(BUCKET_NAME, "org.json.gz", ORGANIZATIONS[:1])
+        df = self.fetch()
+        self.assertEqual(blob.downloads, 1)
+        self.assertEqual(len(df.index), 1)
+
+    def test_expired_entry_is_downloaded(self):
+        self.fetch()
+        self.cache.max_age_seconds = 60
+        expired = self.cache.read_index()["org.json.gz"]["created"] + 61
+        with mock.patch("src.gcs_client.time.time", return_value=expired):
+            self.fetch()
+        self.assertEqual(self.blob.downloads, 2)
+
+    def test_invalidate(self):
+        self.fetch()
+        self.assertEqual(self.cache.invalidate(), ["org.json.gz"])
+        self.fetch()
+        self.assertEqual(self.blob.downloads, 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        other_blob = self.storage_client.upload_records(BUCKET_NAME, "funding.json.gz", ORGANIZATIONS)
+        self.fetch()
+        self.cache.max_size_bytes = self.cache.read_index()["org.json.gz"]["size"]
+        fetch_enrichment_data("funding.json.gz", self.cache, self.storage_client)
+        self.assertEqual(list(self.cache.read_index()), ["funding.json.gz"])
+        self.assertEqual(other_blob.downloads, 1)
+
+    def test_concurrent_threads_keep_every_entry(self):
+        # The organizations and funding rounds are loaded on separate threads sharing the cache
+        blobs = [self.blob, self.storage_client.upload_records(BUCKET_NAME, "funding.json.gz", ORGANIZATIONS)]
+        df = pandas.DataFrame.from_records(ORGANIZATIONS)
+        errors = []
+
+        def use_cache(blob):
+            try:
+                self.cache.put(blob, df)
+                for _ in range(100):
+                    self.assertIsNotNone(self.cache.get(blob))
+            except Exception as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=use_cache, args=(blob,)) for blob in blobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(self.cache.read_index()), ["funding.json.gz", "org.json.gz"])
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         ["funding.json.gz.1.parquet", "index.json", "org.json.gz.1.parquet"])
+
+
+def organization(uuid, name, homepage_url, employee_count, num_funding_rounds):
+    return {"uuid": uuid, "name": name, "homepage_url": homepage_url, "country_code": "USA", "city": None,
+            "founded_on": "1984-01-01", "short_description": f"About {name}", "employee_count": employee_count,
+            "num_funding_rounds": num_funding_rounds, "last_funding_on": None, "total_funding_usd": 1000.0,
+            "unused_column": [1, 2, 3]}
+
+
+class TestReadEnrichmentNdjson(unittest.TestCase):
+    def setUp(self):
+        records = [
+            organization("a", "First Student", "firststudentinc.com", "10001+", 1.0),
+            organization("b", "No homepage", None, "1-10", None),
+            organization("c", "WorkWave", "workwave.com", "1001-5000", None),
+            organization("d", "ManyPets", "manypets.com", None, 3.0),
+        ]
+        self.data = gzip.compress("\n".join(json.dumps(record) for record in records).encode("utf-8"))
+
+    def read(self, **kwargs):
+        return read_enrichment_ndjson(io.BytesIO(self.data), ORGANIZATION_DTYPES, ["homepage_url"], **kwargs)
+
+    def test_projects_filters_and_compacts_columns(self):
+        df = self.read(chunksize=1)
+        self.assertEqual(list(df.columns), list(ORGANIZATION_DTYPES))
+        self.assertEqual(list(df["uuid"]), ["a", "c", "d"])
+        self.assertEqual(df["employee_count"].dtype, "category")
+        self.assertEqual(df["name"].dtype, "string[pyarrow]")
+
+    def test_merged_output_matches_full_read(self):
+        companies = pandas.DataFrame({"title": ["WorkWave", "Unknown", "ManyPets"],
+                                      "registered_domain": ["workwave.com", "unknown.com", "manypets.com"]})
+
+        def merge_to_json(organizations):
+            organizations["registered_domain"] = organizations["homepage_url"].apply(str)
+            merged = pandas.merge(companies, organizations, how="left", left_on=["registered_domain", "title"],
+                                  right_on=["registered_domain", "name"])
+            return merged.to_json(orient="records", force_ascii=False)
+
+        full_read = pandas.read_json(io.BytesIO(self.data), lines=True, compression="gzip")
+        full_read = full_read.dropna(subset=["homepage_url"])[list(ORGANIZATION_DTYPES)]
+        self.assertEqual(merge_to_json(self.read(chunksize=2)), merge_to_json(full_read))
+
+    def test_parallel_read_matches_serial_read(self):
+        serial = self.read()
+        # Chunks of a few lines, so every worker gets some
+        parallel = read_enrichment_ndjson_parallel(io.BytesIO(self.data), ORGANIZATION_DTYPES, ["homepage_url"],
+                                                   workers=2, chunk_bytes=300)
+        self.assertTrue(parallel.equals(serial))
+        self.assertEqual(parallel.dtypes.to_dict(), serial.dtypes.to_dict())
+        self.assertEqual(list(parallel["employee_count"].cat.categories),
+                         list(serial["employee_count"].cat.categories))
+
+    def test_split_lines(self):
+        stream = io.BytesIO(b'{"a": 1}\n{"a": 22}\n{"a": 333}')
+        self.assertEqual(list(split_lines(stream, 4)), [b'{"a": 1}\n', b'{"a": 22}\n', b'{"a": 333}'])
+
+
+class TestStorageEmulator(unittest.TestCase):
+    def test_blob_is_served_by_stand_in(self):
+        # The benchmarks point the real storage client at the stand-in through STORAGE_EMULATOR_HOST
+        data = gzip.compress("\n".join(json.dumps(record) for record in ORGANIZATIONS).encode("utf-8"))
+        site = StandInSite({}, {}, blobs={(BUCKET_NAME, "org.json.gz"): data})
+        base_url = site.start_in_thread()
+        try:
+            with mock.patch.dict(os.environ, {"STORAGE_EMULATOR_HOST": base_url}), \
+                    tempfile.TemporaryDirectory() as directory:
+                df = fetch_enrichment_data("org.json.gz", BlobCache(directory), get_storage_client())
+        finally:
+            site.stop()
+        self.assertEqual(list(df["name"]), ["First Student", "WorkWave"])
+
+    def test_missing_blob_fails_the_same_with_the_cache(self):
+        site = StandInSite({}, {})
+        base_url = site.start_in_thread()
+        try:
+            with mock.patch.dict(os.environ, {"STORAGE_EMULATOR_HOST": base_url}), \
+                    tempfile.TemporaryDirectory() as directory:
+                for cache in [None, BlobCache(directory)]:
+                    with self.assertRaises(NotFound):
+                        fetch_enrichment_data("missing.json.gz", cache, get_storage_client())
+                self.assertEqual(os.listdir(directory), [])
+        finally:
+            site.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from aiohttp.test_utils import TestServer
+
+from src.http_cache import HttpCache
+from src.page_data.page_data_async import scrape
+from src.page_data.page_data_sync import fetch_company_details, get_body_cached
+from src.utils import read_json_file
+from tests.standin_server import StandInSite
+
+
+class TestHttpCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        listing = read_json_file("tests/sample_data/current_portfolio_sample.json")
+        details = read_json_file("tests/sample_data/company_details.json")
+        self.site = StandInSite({"/current-portfolio/": listing}, {company["path"]: details for company in listing})
+        # Cached pages are keyed on the full url, so every scrape in a test has to go to the same server
+        self.server = TestServer(self.site.create_app())
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.directory.cleanup()
+
+    async def scrape_stand_in(self, cache):
+        base_url = str(self.server.make_url("")).rstrip("/")
+        return await scrape(["/current-portfolio/"], base_url=base_url, backoff_base=0, cache=cache)
+
+    async def test_unchanged_pages_are_revalidated(self):
+        first = await self.scrape_stand_in(HttpCache(self.directory.name))
+        cache = HttpCache(self.directory.name)
+        second = await self.scrape_stand_in(cache)
+
+        self.assertEqual(first, second)
+        self.assertEqual((cache.hits, cache.revalidated, cache.misses), (0, 3, 0))
+        self.assertEqual(self.site.not_modified, 3)
+
+    async def test_fresh_pages_skip_the_network(self):
+        await self.scrape_stand_in(HttpCache(self.directory.name))
+        requests_before = len(self.site.requests)
+        cache = HttpCache(self.directory.name, max_age=60)
+        await self.scrape_stand_in(cache)
+
+        self.assertEqual((cache.hits, cache.revalidated, cache.misses), (3, 0, 0))
+        # Only the listing is requested again
+        self.assertEqual(len(self.site.requests) - requests_before, 1)
+
+    async def test_invalid_pages_are_not_cached(self):
+        await self.scrape_stand_in(HttpCache(self.directory.name))
+        path = next(path for path in self.site.pages if path.startswith("/page-data/current-portfolio/") and
+                    path != "/page-data/current-portfolio/page-data.json")
+        url = str(self.server.make_url(path))
+        # An error page answered with 200 drops the cached details instead of replacing them
+        self.site.html_pages[path] = "<html><body>Something went wrong</body></html>"
+        cache = HttpCache(self.directory.name)
+        await self.scrape_stand_in(cache)
+        self.assertIsNone(cache.lookup(url))
+
+        del self.site.html_pages[path]
+        cache = HttpCache(self.directory.name)
+        await self.scrape_stand_in(cache)
+        self.assertEqual((cache.hits, cache.revalidated, cache.misses), (0, 2, 1))
+        self.assertIsNotNone(cache.lookup(url))
+
+    def test_sync_truncated_details_are_not_cached(self):
+        cache = HttpCache(self.directory.name)
+        session = mock.Mock()
+        session.get.return_value = mock.Mock(status_code=200, content=b'{"result": {"data": {', headers={})
+        self.assertIsNone(fetch_company_details("https://eqtgroup.com/x", session, cache))
+        self.assertIsNone(cache.lookup("https://eqtgroup.com/x"))
+
+    def test_sync_conditional_request(self):
+        cache = HttpCache(self.directory.name)
+        session = mock.Mock()
+        details = read_json_file("tests/sample_data/company_details.json")
+        body = json.dumps({"result": {"data": {"sanityCompanyPage": details}}}).encode("utf-8")
+        session.get.return_value = mock.Mock(status_code=200, content=body, headers={"ETag": '"v1"'})
+        first = fetch_company_details("https://eqtgroup.com/x", session, cache)
+        self.assertIsNotNone(first)
+
+        session.get.return_value = mock.Mock(status_code=304, headers={})
+        self.assertEqual(get_body_cached("https://eqtgroup.com/x", session, cache), body)
+        self.assertEqual(fetch_company_details("https://eqtgroup.com/x", session, cache), first)
+        session.get.assert_called_with("https://eqtgroup.com/x", headers={"If-None-Match": '"v1"'})
+        self.assertEqual((cache.hits, cache.revalidated, cache.misses), (0, 2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from aiohttp.test_utils import TestServer
+
+from src.metrics import Histogram, Metrics
+from src.page_data.page_data_async import scrape
+from src.utils import read_json_file
+from tests.standin_server import StandInSite
+
+
+class TestMetrics(unittest.TestCase):
+    def test_disabled_registry_records_nothing(self):
+        registry = Metrics()
+        registry.increment("http_requests_total", status="200")
+        registry.set("rows", 10, stage="scraped")
+        registry.observe("http_request_duration_seconds", 0.1)
+        with registry.timer("stage"):
+            pass
+        self.assertEqual((registry.counters, registry.gauges, registry.histograms), ({}, {}, {}))
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in [0.05] * 98 + [0.5, 2.0]:
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative_counts(), [98, 99, 100])
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.99), 1.0)
+        self.assertEqual(histogram.quantile(1.0), 2.0)
+
+    def test_reports(self):
+        registry = Metrics(enabled=True)
+        registry.increment("http_requests_total", fetcher="async", status="200")
+        registry.increment("http_requests_total", fetcher="async", status="200")
+        registry.set("rows", 3, stage='a "quoted" stage')
+        registry.observe("http_request_duration_seconds", 0.02, fetcher="async")
+
+        with tempfile.TemporaryDirectory() as directory:
+            registry.write_json(os.path.join(directory, "metrics.json"))
+            registry.write_prometheus(os.path.join(directory, "metrics.prom"))
+            with open(os.path.join(directory, "metrics.json"), encoding="utf-8") as file:
+                report = json.load(file)
+            with open(os.path.join(directory, "metrics.prom"), encoding="utf-8") as file:
+                lines = file.read().splitlines()
+            mode = os.stat(os.path.join(directory, "metrics.prom")).st_mode & 0o777
+
+        self.assertEqual(report["counters"]["http_requests_total"],
+                         [{"labels": {"fetcher": "async", "status": "200"}, "value": 2}])
+        self.assertEqual(report["histograms"]["http_request_duration_seconds"][0]["count"], 1)
+        self.assertIn('eqt_scraper_http_requests_total{fetcher="async",status="200"} 2', lines)
+        self.assertIn('eqt_scraper_rows{stage="a \\"quoted\\" stage"} 3', lines)
+        self.assertIn('eqt_scraper_http_request_duration_seconds_bucket{fetcher="async",le="0.025"} 1', lines)
+        self.assertIn('eqt_scraper_http_request_duration_seconds_count{fetcher="async"} 1', lines)
+        if os.name == "posix":
+            self.assertEqual(mode, 0o644)
+
+
+class TestFetcherMetrics(unittest.IsolatedAsyncioTestCase):
+    async def test_async_fetcher_records_requests_and_retries(self):
+        listing = read_json_file("tests/sample_data/current_portfolio_sample.json")
+        details = read_json_file("tests/sample_data/company_details.json")
+        site = StandInSite({"/current-portfolio/": listing}, {company["path"]: details for company in listing},
+                           failures={"/page-data/current-portfolio/workwave/page-data.json": 2})
+
+        registry = Metrics(enabled=True)
+        with mock.patch("src.page_data.page_data_async.metrics", registry):
+            async with TestServer(site.create_app()) as server:
+                await scrape(["/current-portfolio/"], base_url=str(server.make_url("")).rstrip("/"), backoff_base=0)
+
+        self.assertEqual(registry.counters[("http_requests_total", (("fetcher", "async"), ("status", "200")))], 4)
+        self.assertEqual(registry.counters[("http_requests_total", (("fetcher", "async"), ("status", "503")))], 2)
+        self.assertEqual(registry.counters[("http_retries_total", (("fetcher", "async"),))], 2)
+        self.assertEqual(registry.histograms[("http_request_duration_seconds", (("fetcher", "async"),))].count, 6)
+        self.assertGreater(registry.counters[("http_downloaded_bytes_total", (("fetcher", "async"),))], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,10 @@
+import random
+import time
 import unittest
 from unittest import mock
 
-from src.page_data.page_data_sync import extract_details, get_description, get_company_data
+from src.page_data.page_data_extraction import extract_details, get_description
+from src.page_data.page_data_sync import get_company_data
 from src.utils import read_json_file
 
 
@@ -17,6 +20,15 @@ def mocked_extract_details(*args, **kwargs):
     return {"extracted_details": "mocked"}
 
 
+def mocked_fetch_company_details_slow(url, *args, **kwargs):
+    time.sleep(random.uniform(0, 0.02))
+    return {"company_details": url}
+
+
+def mocked_extract_details_url(company_details):
+    return {"extracted_details": company_details["company_details"]}
+
+
 class TestPageData(unittest.TestCase):
     def test_get_description(self):
         expected_results = "About\nHeadquartered in Cincinnati, Ohio, First Student and First Transit are dedicated to providing safe, reliable and cost-effective transportation services to school districts, cities, enterprises and their constituents. First Student is the clear market leader in student transportation and focuses on providing contracted services for home-to-school transportation, including for special education, homeless and other student populations. First Transit operates a comprehensive portfolio of complementary public transportation services on behalf of cities, municipalities, and businesses, including fixed route buses and trains, paratransit services, shuttle buses, outsourced vehicle maintenance and other services.Market trends and drivers\nStudent and public transportation are critical components of the US and Canadian educational and economic ecosystems, with student success metrics and funding directly correlated to student attendance, and millions of individuals across the socioeconomic spectrum relying on public transportation daily to get to work, access healthcare, and contribute to the broader economy. As a result of the essential nature of services provided, the public transportation end market is highly stable through economic cycle and benefits from favourable tailwinds including increasing demand for outsourcing and for safer, smarter and more environmentally friendly transportation options. The growing capital intensity and operational complexity associated with digitizing operations and electrifying the fleet will place greater demand across the value chain and favor large, resource-rich outsourced providers, such as First Student and First Transit, who bring best-in-class safety, reliability, capital, and technological expertise to districts and governments.Investment potential\nEQT Infrastructure is committed to building upon the success First Student and First Transit have achieved by making investments in organizational, operational, digital, and sustainability initiatives to further improve and differentiate the Company’s service offering. Most notably, EQT Infrastructure intends to help future-proof the Company by investing in the electrification of its fleet and accelerating its transition to renewable fuel sources in order to support passenger health and reduce environmental impact."
@@ -126,6 +138,15 @@ class TestPageData(unittest.TestCase):
         data = get_company_data(cps)
         self.assertEqual(data, expected_results)
 
+    @mock.patch('src.page_data.page_data_sync.fetch_company_details', side_effect=mocked_fetch_company_details_slow)
+    @mock.patch('src.page_data.page_data_sync.extract_details', side_effect=mocked_extract_details_url)
+    def test_get_companies_threaded_keeps_order(self, _mocked_extract_details, _mocked_fetch_company_details):
+        cps = read_json_file("tests/sample_data/current_portfolio_sample.json") * 5
+        data = get_company_data(cps, threads=4)
+        self.assertEqual([company["title"] for company in data], [company["title"] for company in cps])
+        self.assertEqual([company["extracted_details"] for company in data],
+                         [f"https://eqtgroup.com/page-data{company["path"]}page-data.json" for company in cps])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from aiohttp.test_utils import TestServer
+
+from src.page_data.page_data_async import scrape
+from src.utils import read_json_file
+from tests.standin_server import StandInSite
+
+
+class TestPageDataAsync(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.listing = read_json_file("tests/sample_data/current_portfolio_sample.json")
+        self.details = read_json_file("tests/sample_data/company_details.json")
+
+    async def scrape_stand_in(self, site, **kwargs):
+        async with TestServer(site.create_app()) as server:
+            base_url = str(server.make_url("")).rstrip("/")
+            return await scrape(["/current-portfolio/"], base_url=base_url, backoff_base=0, **kwargs)
+
+    async def test_scrape_retries_server_errors(self):
+        site = StandInSite({"/current-portfolio/": self.listing},
+                           {company["path"]: self.details for company in self.listing},
+                           failures={"/page-data/current-portfolio/workwave/page-data.json": 2})
+        data = await self.scrape_stand_in(site)
+
+        self.assertEqual([company["title"] for company in data], ["First Student and First Transit", "WorkWave",
+                                                                  "ManyPets"])
+        self.assertTrue(all(company["registered_domain"] == "firststudentinc.com" for company in data))
+        self.assertEqual(site.requests.count("/page-data/current-portfolio/workwave/page-data.json"), 3)
+
+    async def test_scrape_gives_up_after_max_retries(self):
+        site = StandInSite({"/current-portfolio/": self.listing},
+                           {company["path"]: self.details for company in self.listing},
+                           failures={"/page-data/current-portfolio/manypets/page-data.json": 10})
+        data = await self.scrape_stand_in(site, max_retries=2)
+
+        self.assertNotIn("description", data[2])
+        self.assertIn("description", data[0])
+        self.assertEqual(site.requests.count("/page-data/current-portfolio/manypets/page-data.json"), 3)
+
+    async def test_scrape_caps_requests_in_flight(self):
+        listing = [company | {"path": f"/current-portfolio/company-{i}/"} for i, company in
+                   enumerate(self.listing * 10)]
+        site = StandInSite({"/current-portfolio/": listing}, {company["path"]: self.details for company in listing},
+                           delay=0.01)
+        data = await self.scrape_stand_in(site, max_concurrent_requests=4)
+
+        self.assertEqual(len(data), 30)
+        self.assertLessEqual(site.max_in_flight, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import json
+import unittest
+
+import msgspec
+
+from src.page_data.page_data_extraction import (CompanyDetails, decode_details, decode_listing, extract_details,
+                                                get_listing_data)
+from src.utils import read_json_file
+
+
+def page_data(data):
+    return json.dumps({"componentChunkName": "component---src-templates-company-page-tsx", "path": "/x/",
+                       "result": {"data": data, "pageContext": {"id": "1"}}, "staticQueryHashes": []}).encode("utf-8")
+
+
+class TestPageDataExtraction(unittest.TestCase):
+    def test_decoded_details_extract_like_dicts(self):
+        company_details = read_json_file("tests/sample_data/company_details.json")
+        decoded = decode_details(page_data({"sanityCompanyPage": company_details}))
+        self.assertIsInstance(decoded, CompanyDetails)
+        self.assertEqual(extract_details(decoded), extract_details(company_details))
+
+    def test_missing_details(self):
+        self.assertIsNone(decode_details(page_data({"sanityCompanyPage": None})))
+        self.assertIsNone(decode_details(b'{"result": {}}'))
+        with self.assertRaises(msgspec.DecodeError):
+            decode_details(page_data({"sanityCompanyPage": {"website": ["not", "a", "string"]}}))
+
+    def test_listing(self):
+        nodes = read_json_file("tests/sample_data/current_portfolio_sample.json")
+        nodes[0]["fund"].append({})
+        nodes[1]["fund"].append({"title": None})
+        companies = decode_listing(page_data({"allSanityCompanyPage": {"nodes": nodes, "totalCount": 3}}))
+        self.assertEqual([get_listing_data(company) for company in companies],
+                         [get_listing_data(company) for company in nodes])
+        # A fund without a title is listed as "", one with a null title as None
+        self.assertEqual(get_listing_data(companies[0])["fund"][-1], "")
+        self.assertIsNone(get_listing_data(companies[1])["fund"][-1])
+
+    def test_company_of_other_types_is_skipped(self):
+        nodes = read_json_file("tests/sample_data/current_portfolio_sample.json")
+        nodes[1]["sector"] = {"title": "Services"}
+        with self.assertLogs(level="WARNING"):
+            companies = decode_listing(page_data({"allSanityCompanyPage": {"nodes": nodes, "totalCount": 3}}))
+        self.assertEqual([company.path for company in companies], [node["path"] for node in nodes[:1] + nodes[2:]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+from concurrent.futures import wait
+from unittest import mock
+
+from src.pipeline import Pipeline
+
+
+def sleep_and_return(seconds, value):
+    def stage(*_):
+        time.sleep(seconds)
+        return value
+    return stage
+
+
+class TestPipeline(unittest.TestCase):
+    def test_independent_stages_overlap(self):
+        pipeline = Pipeline()
+        pipeline.add("scrape", sleep_and_return(0.2, "companies"))
+        pipeline.add("load_organizations", sleep_and_return(0.1, "organizations"))
+        pipeline.add("merge", lambda companies, organizations: f"{companies}+{organizations}",
+                     ["scrape", "load_organizations"])
+        results = pipeline.run()
+
+        self.assertEqual(results["merge"], "companies+organizations")
+        # The organizations were loaded while the scrape was running
+        self.assertLess(pipeline.timings["load_organizations"][0], pipeline.timings["scrape"][1])
+        self.assertEqual(pipeline.critical_path(), ["scrape", "merge"])
+        self.assertGreaterEqual(pipeline.timings["merge"][0], pipeline.timings["scrape"][1])
+
+    def test_failed_stage_cancels_the_stages_that_have_not_started(self):
+        started = threading.Event()
+        release = threading.Event()
+        loaded = []
+
+        def fail():
+            started.wait(5)
+            raise RuntimeError("The scrape failed")
+
+        def load_organizations():
+            started.set()
+            release.wait(5)
+            loaded.append(True)
+            return "organizations"
+
+        index_organizations = mock.Mock(return_value="index")
+        pipeline = Pipeline()
+        pipeline.add("scrape", fail)
+        pipeline.add("load_organizations", load_organizations)
+        pipeline.add("index_organizations", index_organizations, ["load_organizations"])
+        pipeline.add("merge", lambda *_: None, ["scrape", "index_organizations"])
+        with self.assertRaisesRegex(RuntimeError, "The scrape failed"):
+            pipeline.run()
+        # The error is raised while load_organizations is still running, the stage waiting on it never runs
+        self.assertEqual(loaded, [])
+        release.set()
+        wait(pipeline.futures.values(), timeout=5)
+        self.assertEqual(loaded, [True])
+        index_organizations.assert_not_called()
+
+    def test_unknown_dependency(self):
+        pipeline = Pipeline()
+        with self.assertRaises(ValueError):
+            pipeline.add("merge", lambda: None, ["scrape"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from src.page_data.page_data_sync import get_company_data
+from src.utils import read_json_file
+
+
+def browser_available():
+    try:
+        from playwright.sync_api import sync_playwright
+        with sync_playwright() as p:
+            p.chromium.launch(headless=True).close()
+        return True
+    except Exception:
+        return False
+
+
+class RecordingHandler(SimpleHTTPRequestHandler):
+    requested_paths = []
+
+    def do_GET(self):
+        self.requested_paths.append(self.path)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipUnless(browser_available(), "Playwright browsers are not installed")
+class TestPlaywrightIntercept(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Static copy of the site: an html page that loads its page data for every path, plus the page data itself
+        cls.directory = tempfile.mkdtemp()
+        cls.listing = read_json_file("tests/sample_data/current_portfolio_sample.json")
+        details = read_json_file("tests/sample_data/company_details.json")
+        pages = {"/current-portfolio/": {"result": {"data": {"allSanityCompanyPage": {"nodes": cls.listing}}}}}
+        for company in cls.listing:
+            pages[company["path"]] = {"result": {"data": {"sanityCompanyPage": details}}}
+        for path, page_data in pages.items():
+            os.makedirs(os.path.join(cls.directory, path.strip("/")), exist_ok=True)
+            shutil.copy("tests/sample_data/site/page.html", os.path.join(cls.directory, path.strip("/"), "index.html"))
+            page_data_directory = os.path.join(cls.directory, "page-data", path.strip("/"))
+            os.makedirs(page_data_directory, exist_ok=True)
+            with open(os.path.join(page_data_directory, "page-data.json"), "w", encoding="utf-8") as file:
+                json.dump(page_data, file)
+
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), partial(RecordingHandler, directory=cls.directory))
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        shutil.rmtree(cls.directory)
+
+    def test_captured_page_data_matches_page_data_scraper(self):
+        from src.html_playwright.playwright_intercept import scrape_website
+
+        data = scrape_website(f"{self.base_url}/current-portfolio/")
+        expected_results = get_company_data(self.listing, base_url=self.base_url)
+        self.assertEqual(data, expected_results)
+        self.assertFalse([path for path in RecordingHandler.requested_paths if path.startswith("/static/")])
+
+
+@unittest.skipUnless(importlib.util.find_spec("playwright"), "Playwright is not installed")
+class TestFailedDetails(unittest.TestCase):
+    def test_cause_is_logged(self):
+        from src.html_playwright import playwright_intercept
+
+        listing = read_json_file("tests/sample_data/current_portfolio_sample.json")[:1]
+        listing_body = json.dumps({"result": {"data": {"allSanityCompanyPage": {"nodes": listing}}}}).encode()
+        # No browser is started, the listing is captured and the details page times out
+        timeout = playwright_intercept.PlaywrightError("Timeout 30000ms exceeded")
+        with mock.patch.object(playwright_intercept, "sync_playwright"), \
+                mock.patch.object(playwright_intercept, "capture_page_data", side_effect=[listing_body, timeout]), \
+                self.assertLogs(level="WARNING") as logs:
+            data = playwright_intercept.scrape_website("https://eqtgroup.com/current-portfolio/")
+        self.assertEqual(len(data), 1)
+        self.assertIn("Timeout 30000ms exceeded", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import importlib.util
+import unittest
+from unittest import mock
+
+
+@unittest.skipUnless(importlib.util.find_spec("playwright"), "Playwright is not installed")
+class TestBrowserReuse(unittest.TestCase):
+    def setUp(self):
+        from src.html_playwright import playwright_mp
+
+        self.module = playwright_mp
+        # No browser is started, every launch gives a new stand-in browser with its own page
+        self.playwright = mock.MagicMock()
+        self.browsers = []
+        self.playwright.chromium.launch.side_effect = self.launch
+        self.finalizers = []
+        patches = [
+            mock.patch.object(playwright_mp, "sync_playwright", return_value=mock.Mock(start=lambda: self.playwright)),
+            mock.patch.object(playwright_mp, "Finalize",
+                              side_effect=lambda obj, callback, exitpriority: self.finalizers.append(callback)),
+            mock.patch.object(playwright_mp, "extract_sub_page", side_effect=lambda page: {"page": page}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(playwright_mp.worker_state.clear)
+
+    def launch(self, **kwargs):
+        browser = mock.MagicMock()
+        self.browsers.append(browser)
+        return browser
+
+    def scrape(self, count):
+        return [self.module.scrape_sub_page({"company_details_path": f"/company-{index}/"}) for index in range(count)]
+
+    def test_browser_is_recycled_after_pages_per_browser(self):
+        self.module.init_worker(2, "http://localhost")
+        results = self.scrape(5)
+        self.assertEqual(len(self.browsers), 3)
+        self.assertEqual([browser.close.call_count for browser in self.browsers], [1, 1, 0])
+        # The same page is reused until its browser is recycled
+        pages = [browser.new_page.return_value for browser in self.browsers]
+        self.assertEqual([result["page"] for result in results], [pages[0], pages[0], pages[1], pages[1], pages[2]])
+        pages[0].goto.assert_any_call("http://localhost/company-0/")
+
+    def test_browser_is_never_recycled_with_zero(self):
+        self.module.init_worker(0)
+        self.scrape(5)
+        self.assertEqual(len(self.browsers), 1)
+        self.browsers[0].close.assert_not_called()
+
+    def test_finalizer_closes_browser_and_playwright(self):
+        self.module.init_worker(2)
+        self.scrape(3)
+        stop_worker, = self.finalizers
+        stop_worker()
+        self.assertTrue(all(browser.close.called for browser in self.browsers))
+        self.playwright.stop.assert_called_once()
+
+    def test_companies_without_details_open_no_page(self):
+        self.module.init_worker(1)
+        self.assertEqual(self.module.scrape_sub_page({"company_details_path": None}), {})
+        self.assertEqual(len(self.browsers), 1)
+        self.browsers[0].new_page.return_value.goto.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import asyncio
+import email.utils
+import time
+import unittest
+
+from src.page_data import page_data_async, page_data_sync
+from src.rate_control import RateController, parse_retry_after
+from tests.standin_server import StandInSite
+from tests.synthetic_data import synthetic_data
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateController(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.controller = RateController(20, initial_limit=4, clock=self.clock)
+
+    def round_trip(self, latency=0.1, status=200, retry_after=None):
+        self.controller.start()
+        self.clock.now += latency
+        self.controller.finish(latency, status, retry_after)
+
+    def test_window_grows_by_one_per_round_trip(self):
+        for _ in range(4):
+            self.round_trip()
+        self.assertAlmostEqual(self.controller.limit, 5, delta=0.1)
+        for _ in range(200):
+            self.round_trip()
+        self.assertEqual(self.controller.limit, 20)
+
+    def test_throttling_halves_the_window_once_per_round_trip(self):
+        for _ in range(200):
+            self.round_trip()
+        self.round_trip(status=429)
+        self.round_trip(latency=0, status=503)
+        self.assertEqual(self.controller.limit, 10)
+        self.clock.now += 1
+        self.round_trip(status=None)
+        self.assertEqual(self.controller.limit, 5)
+        self.assertEqual(self.controller.throttled, 3)
+
+    def test_rising_latency_shrinks_the_window(self):
+        for _ in range(20):
+            self.round_trip()
+        limit = self.controller.limit
+        self.round_trip(latency=0.5)
+        self.assertAlmostEqual(self.controller.limit, limit * 0.9)
+
+    def test_full_window_and_retry_after(self):
+        for _ in range(4):
+            self.controller.start()
+        self.assertIsNone(self.controller.wait_time())
+        self.controller.finish(0.1, 429, retry_after=2)
+        for _ in range(3):
+            self.controller.finish(0.1, 200)
+        self.assertEqual(self.controller.wait_time(), 2)
+        self.clock.now += 2
+        self.assertEqual(self.controller.wait_time(), 0)
+
+    def test_requests_per_second_ceiling(self):
+        controller = RateController(20, max_rps=4, adaptive=False, clock=self.clock)
+        self.assertEqual(controller.limit, 20)
+        controller.start()
+        self.assertEqual(controller.wait_time(), 0.25)
+        self.clock.now += 0.25
+        self.assertEqual(controller.wait_time(), 0)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3)
+        self.assertAlmostEqual(parse_retry_after(email.utils.formatdate(time.time() + 60, usegmt=True)), 60, delta=2)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class TestThrottledSite(unittest.TestCase):
+    def setUp(self):
+        listings, details, _ = synthetic_data(60, 0)
+        self.listings = {"/current-portfolio/": listings["/current-portfolio/"]}
+        self.site = StandInSite(self.listings, details, delay=0.02, capacity=4, throttle_above=6, retry_after=0.1)
+        self.base_url = self.site.start_in_thread()
+
+    def tearDown(self):
+        self.site.stop()
+
+    def scrape(self, rate_controller=None):
+        self.site.reset()
+        return asyncio.run(page_data_async.scrape(["/current-portfolio/"], base_url=self.base_url, max_retries=3,
+                                                  rate_controller=rate_controller))
+
+    def test_async_adaptive_concurrency_avoids_error_storms(self):
+        self.scrape()
+        throttled_without_control = self.site.throttled
+
+        company_data = self.scrape(RateController(20))
+        self.assertTrue(all(company["description"] for company in company_data))
+        self.assertLess(self.site.throttled, throttled_without_control / 4)
+
+    def test_sync_adaptive_concurrency(self):
+        with page_data_sync.create_session(pool_size=10, max_retries=3,
+                                           rate_controller=RateController(10)) as session:
+            companies = page_data_sync.fetch_companies(f"{self.base_url}/page-data/current-portfolio/page-data.json",
+                                                       session)
+            company_data = page_data_sync.get_company_data(companies, session, threads=10, base_url=self.base_url)
+        self.assertTrue(all(company["description"] for company in company_data))
+        self.assertLessEqual(self.site.max_in_flight, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
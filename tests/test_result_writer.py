@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas
+import pyarrow
+import pyarrow.parquet as pq
+
+from src.result_writer import NdjsonSink, get_output_path, write_results
+
+HTML_SCRAPER_RESULT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results",
+                                   "scraped_with_playwright_sp.json")
+
+
+class TestResultWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.df = pandas.DataFrame({
+            "title": ["Acme", "Globex"],
+            "fund": [["EQT X", "EQT IX"], "EQT VIII"],
+            "board": [[{"title": "Chairperson", "name": "Jane Doe", "person": None}], None],
+            "management": [[], [{"title": "CEO", "name": "John Doe", "person": {"title": "John Doe"}}]],
+            "total_funding_usd": [1000.0, float("nan")],
+            "country_code": pandas.Series(["SWE", None], dtype="category"),
+            "funding_rounds": [[{"investor_count": 1.0, "announced_on": "2020-01-01", "investment_type": "seed",
+                                 "raised_amount_usd": float("nan")}], []],
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_output_path(self):
+        path = get_output_path(self.directory, "companies_{format}", "ndjson", "gzip")
+        self.assertEqual(path, os.path.join(self.directory, "companies_ndjson.ndjson.gz"))
+        path = get_output_path(self.directory, "companies", "parquet", "zstd")
+        self.assertEqual(path, os.path.join(self.directory, "companies.parquet"))
+
+    def test_ndjson_matches_json(self):
+        json_path = write_results(self.df, self.directory, "result", "json")
+        ndjson_path = write_results(self.df, self.directory, "result", "ndjson", "gzip")
+        with open(json_path, encoding="utf-8") as file:
+            expected_records = json.load(file)
+        with gzip.open(ndjson_path, "rt", encoding="utf-8") as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(records, expected_records)
+
+    def test_parquet_nested_columns(self):
+        path = write_results(self.df, self.directory, "result", "parquet", "zstd")
+        table = pq.read_table(path)
+        self.assertEqual(table.schema.field("funding_rounds").type.value_type.field("raised_amount_usd").type,
+                         pyarrow.float64())
+        records = table.to_pylist()
+        self.assertEqual(records[0]["fund"], ["EQT X", "EQT IX"])
+        self.assertEqual(records[1]["fund"], ["EQT VIII"])
+        self.assertEqual(records[0]["board"], [{"title": "Chairperson", "name": "Jane Doe", "person": None}])
+        self.assertIsNone(records[1]["board"])
+        self.assertEqual(records[1]["management"][0]["person"], {"title": "John Doe"})
+        self.assertIsNone(records[0]["funding_rounds"][0]["raised_amount_usd"])
+        self.assertIsNone(records[1]["total_funding_usd"])
+
+    def test_failed_stream_leaves_no_partial_file(self):
+        path = os.path.join(self.directory, "result.ndjson.gz")
+        with self.assertRaises(OSError):
+            with NdjsonSink(path, "gzip") as sink:
+                sink.write({"title": "Acme"})
+                raise OSError("Connection reset")
+        self.assertEqual(os.listdir(self.directory), [])
+
+        with NdjsonSink(path, "gzip") as sink:
+            sink.write({"title": "Acme"})
+        self.assertEqual(os.listdir(self.directory), ["result.ndjson.gz"])
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            self.assertEqual([json.loads(line) for line in file], [{"title": "Acme"}])
+
+    def test_parquet_html_scraper_columns(self):
+        # board_member, co-ceo and the like hold a string when a detail occurs once and a list when it repeats
+        df = pandas.read_json(HTML_SCRAPER_RESULT)
+        records = pq.read_table(write_results(df, self.directory, "result", "parquet")).to_pylist()
+        self.assertEqual(len(records), len(df.index))
+        board_members = [value for value in df["board_member"] if value is not None]
+        self.assertEqual([record["board_member"] for record in records if record["board_member"] is not None],
+                         [value if isinstance(value, list) else [value] for value in board_members])
+        self.assertEqual(pq.read_schema(os.path.join(self.directory, "result.parquet")).field("co-ceo").type,
+                         pyarrow.list_(pyarrow.string()))
+
+    def test_parquet_list_of_other_values_is_json_text(self):
+        df = pandas.DataFrame({"title": ["Acme", "Globex"], "details": [[{"name": "Jane Doe"}], "Unknown"]})
+        records = pq.read_table(write_results(df, self.directory, "result", "parquet")).to_pylist()
+        self.assertEqual([record["details"] for record in records], ['[{"name": "Jane Doe"}]', "Unknown"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from src import main
+from src.service import PortfolioService
+
+COMPANIES = [
+    {"title": "WorkWave", "registered_domain": "workwave.com"},
+    {"title": "ManyPets", "registered_domain": "manypets.com"},
+    {"title": "No website", "registered_domain": None},
+]
+
+
+class FakeSources:
+    def __init__(self):
+        self.version = 1
+        self.loads = 0
+        self.scrapes = 0
+
+    def load_enrichment(self):
+        self.loads += 1
+        return {"WorkWave": "a"}
+
+    async def scrape(self):
+        self.scrapes += 1
+        for company in COMPANIES:
+            await asyncio.sleep(0)
+            yield company
+
+
+class TestPortfolioService(unittest.TestCase):
+    def setUp(self):
+        self.sources = FakeSources()
+        self.enrich_threads = set()
+        self.service = PortfolioService(self.sources.load_enrichment, lambda: self.sources.version, self.sources.scrape,
+                                        self.enrich)
+
+    def enrich(self, company, lookup):
+        self.enrich_threads.add(threading.current_thread())
+        return company | {"uuid": lookup.get(company["title"])}
+
+    def request(self, *paths, update=True, text=False):
+        async def get_all():
+            async with TestClient(TestServer(self.service.create_app())) as client:
+                if update:
+                    await self.service.update()
+                responses = []
+                for path in paths:
+                    response = await client.get(path)
+                    responses.append((response.status, await (response.text() if text else response.json())))
+                return responses
+
+        return asyncio.run(get_all())
+
+    def test_lookups(self):
+        (status, companies), (_, by_title), (_, by_domain), (missing, _) = self.request(
+            "/companies", "/companies/title/workwave", "/companies/domain/https://www.manypets.com/uk/",
+            "/companies/title/unknown")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(companies), 3)
+        self.assertEqual(by_title, [{"title": "WorkWave", "registered_domain": "workwave.com", "uuid": "a"}])
+        self.assertEqual([company["title"] for company in by_domain], ["ManyPets"])
+        self.assertEqual(missing, 404)
+        # Enriching doesn't block the event loop answering requests
+        self.assertNotIn(threading.main_thread(), self.enrich_threads)
+
+    def test_not_ready_before_first_scrape(self):
+        (status, _), (_, health) = self.request("/companies", "/health", update=False)
+        self.assertEqual(status, 503)
+        self.assertFalse(health["ready"])
+
+    def test_enrichment_is_only_reloaded_when_it_changes(self):
+        async def updates():
+            await self.service.update()
+            await self.service.update(rescrape=False)
+            self.sources.version = 2
+            await self.service.update(rescrape=False)
+
+        asyncio.run(updates())
+        self.assertEqual(self.sources.loads, 2)
+        # A new version of the enrichment data enriches the portfolio again
+        self.assertEqual(self.sources.scrapes, 2)
+
+    def test_serve_records_metrics(self):
+        with mock.patch("sys.argv", ["main.py", "--serve"]), mock.patch("src.main.run"), \
+                mock.patch.object(main.metrics, "enabled", False):
+            main.main()
+            self.assertTrue(main.metrics.enabled)
+            _, (status, text) = self.request("/health", "/metrics", text=True)
+        self.assertEqual(status, 200)
+        self.assertIn('service_requests_total{route="/health",status="200"}', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
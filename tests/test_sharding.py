@@ -0,0 +1,135 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from src.main import parse_args, run
+from src.result_writer import read_ndjson
+from src.sharding import LISTED_FIELD, POSITION_FIELD, SHARD_FIELD, Shard, merge_shards, shard_of
+from tests.standin_server import StandInSite
+from tests.synthetic_data import synthetic_data
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "main.py")
+SHARD_COUNT = 3
+
+
+class TestShard(unittest.TestCase):
+    def test_every_company_is_in_one_shard(self):
+        paths = [f"/current-portfolio/company-{index}/" for index in range(1000)]
+        shards = [Shard(index, 4) for index in range(1, 5)]
+        selected = [shard.select(paths, lambda path: path) for shard in shards]
+        self.assertEqual(sorted(path for paths in selected for path in paths), sorted(paths))
+        # Roughly a quarter each
+        for paths in selected:
+            self.assertLess(abs(len(paths) - 250), 60)
+        self.assertEqual(sorted(position for shard in shards for position in shard.positions), list(range(1000)))
+
+    def test_shard_of_is_stable(self):
+        # Python's hash() of a str changes with PYTHONHASHSEED, so this is the same in every process
+        self.assertEqual(shard_of("/current-portfolio/company-1/", 1000), 601)
+        self.assertEqual(shard_of(None, 7), shard_of("", 7))
+
+    def test_invalid_shards(self):
+        for shard in ["0/3", "4/3", "3", "a/b"]:
+            with self.assertRaises(SystemExit):
+                parse_args(["scrape", "--shard", shard])
+        with self.assertRaises(SystemExit):
+            parse_args(["--shard", "1/2", "--stream"])
+        with self.assertRaises(SystemExit):
+            parse_args(["--shard", "1/2", "--output-format", "parquet"])
+
+
+class TestMergeShards(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_shard(self, shard, positions, listed=5):
+        path = os.path.join(self.directory.name, f"result_shard-{shard.replace('/', '-of-')}.ndjson")
+        with open(path, "w", encoding="utf-8") as file:
+            for position in positions:
+                record = {"title": f"Company {position}", POSITION_FIELD: position, SHARD_FIELD: shard,
+                          LISTED_FIELD: listed}
+                file.write(json.dumps(record) + "\n")
+        return path
+
+    def test_merged_in_listing_order(self):
+        paths = [self.write_shard("1/2", [1, 4]), self.write_shard("2/2", [0, 2, 3])]
+        self.assertEqual(merge_shards(paths), [{"title": f"Company {position}"} for position in range(5)])
+
+    def test_missing_companies_and_repeated_shards(self):
+        first = self.write_shard("1/2", [0, 3])
+        second = self.write_shard("2/2", [1])
+        with self.assertRaises(ValueError):
+            merge_shards([first, second])
+        with self.assertRaises(ValueError):
+            merge_shards([first, first])
+
+    def test_missing_shard_with_the_last_positions(self):
+        paths = [self.write_shard("1/3", [0, 2]), self.write_shard("2/3", [1]), self.write_shard("3/3", [3, 4])]
+        # Positions 0 to 2 have no gap, only the shard count and the listed total show that 3/3 is missing
+        with self.assertRaisesRegex(ValueError, "3/3"):
+            merge_shards(paths[:2])
+        with self.assertRaisesRegex(ValueError, "different runs"):
+            merge_shards([*paths[:2], self.write_shard("3/3", [3, 4], listed=6)])
+
+    def test_empty_shard(self):
+        paths = [self.write_shard("1/2", [0, 1], listed=2), self.write_shard("2/2", [])]
+        self.assertEqual(merge_shards(paths), [{"title": "Company 0"}, {"title": "Company 1"}])
+
+
+class TestShardedRun(unittest.TestCase):
+    def setUp(self):
+        listings, details, blobs = synthetic_data(60, 300)
+        self.site = StandInSite(listings, details, blobs=blobs)
+        self.base_url = self.site.start_in_thread()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.site.stop()
+        self.directory.cleanup()
+
+    def arguments(self, name):
+        return ["--base-url", self.base_url, "--no-cache", "--no-http-cache", "--max-retries", "0",
+                "--enrichment-store", os.path.join(self.directory.name, "enrichment.sqlite3"),
+                "--checkpoint-dir", os.path.join(self.directory.name, "checkpoint"),
+                "--output-dir", os.path.join(self.directory.name, name), "--log-level", "WARNING"]
+
+    def output(self, name):
+        path, = glob.glob(os.path.join(self.directory.name, name, "result_*"))
+        return path
+
+    def test_merged_shards_are_the_same_as_an_unsharded_run(self):
+        # Every shard runs in its own process, like on separate machines, sharing only the enrichment store
+        environment = dict(os.environ, STORAGE_EMULATOR_HOST=self.base_url)
+        processes = [subprocess.Popen([sys.executable, MAIN_PATH, "full", "--fuzzy-matching",
+                                       "--shard", f"{index}/{SHARD_COUNT}", *self.arguments("shards")],
+                                      env=environment, stderr=subprocess.PIPE, text=True)
+                     for index in range(1, SHARD_COUNT + 1)]
+        for process in processes:
+            _, stderr = process.communicate()
+            self.assertEqual(process.returncode, 0, stderr[-2000:])
+        shard_paths = sorted(glob.glob(os.path.join(self.directory.name, "shards", "result_*_shard-*-of-3.ndjson")))
+        self.assertEqual(len(shard_paths), SHARD_COUNT)
+        self.assertEqual(sum(len(read_ndjson(path)) for path in shard_paths), 60)
+        # Each shard requested only the details of its own companies
+        detail_requests = [path for path in self.site.requests if "/company-" in path]
+        self.assertEqual(len(detail_requests), 60)
+        self.assertEqual(len(set(detail_requests)), 60)
+
+        process = subprocess.run([sys.executable, MAIN_PATH, "full", "--fuzzy-matching", "--output-format", "ndjson",
+                                  *self.arguments("unsharded")], env=environment, capture_output=True, text=True)
+        self.assertEqual(process.returncode, 0, process.stderr[-2000:])
+        run(parse_args(["merge", "--input", *reversed(shard_paths),
+                        "--output-dir", os.path.join(self.directory.name, "merged")]))
+        with open(self.output("merged"), "rb") as merged, open(self.output("unsharded"), "rb") as unsharded:
+            self.assertEqual(merged.read(), unsharded.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
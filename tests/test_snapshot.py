@@ -0,0 +1,114 @@
+import glob
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.main import parse_args, run
+from src.snapshot import DeltaSink, SnapshotDiff, fingerprint
+from tests.standin_server import StandInSite
+from tests.synthetic_data import synthetic_data
+
+
+class TestSnapshotDiff(unittest.TestCase):
+    def setUp(self):
+        records = [
+            {"company_details_path": "/a/", "title": "A", "fund": ["EQT X"], "total_funding_usd": 1.5},
+            {"company_details_path": "/b/", "title": "B", "fund": [], "total_funding_usd": None},
+        ]
+        snapshot_diff = SnapshotDiff({})
+        for record in records:
+            snapshot_diff.diff(record)
+        self.previous = snapshot_diff.current
+
+    def test_fingerprint_is_stable(self):
+        record = {"title": "A", "fund": ["EQT X"], "num_funding_rounds": 2.0, "total_funding_usd": 0.123456789012345}
+        reordered = {"total_funding_usd": 0.1234567890, "num_funding_rounds": 2, "fund": ["EQT X"], "title": "A"}
+        self.assertEqual(fingerprint(record), fingerprint(reordered))
+        self.assertNotEqual(fingerprint(record)[0], fingerprint(record | {"fund": ["EQT Y"]})[0])
+
+    def test_changes(self):
+        snapshot_diff = SnapshotDiff(self.previous)
+        unchanged = snapshot_diff.diff({"title": "A", "company_details_path": "/a/", "fund": ["EQT X"],
+                                        "total_funding_usd": 1.5})
+        added = snapshot_diff.diff({"company_details_path": "/c/", "title": "C"})
+        changed = snapshot_diff.diff({"company_details_path": "/b/", "title": "B", "fund": ["EQT X"]})
+        removed = list(snapshot_diff.removed())
+
+        self.assertIsNone(unchanged)
+        self.assertEqual(added["change"], "added")
+        self.assertEqual(added["record"], {"company_details_path": "/c/", "title": "C"})
+        self.assertEqual(changed["fields"], {"fund": ["EQT X"]})
+        self.assertEqual(changed["removed_fields"], ["total_funding_usd"])
+        self.assertEqual(changed["previous_fingerprint"], self.previous["/b/"]["fingerprint"])
+        self.assertEqual(removed, [])
+        self.assertEqual(snapshot_diff.counts, {"added": 1, "changed": 1, "removed": 0})
+
+    def test_removed(self):
+        snapshot_diff = SnapshotDiff(self.previous)
+        snapshot_diff.diff({"company_details_path": "/a/", "title": "A", "fund": ["EQT X"], "total_funding_usd": 1.5})
+        removed, = snapshot_diff.removed()
+        self.assertEqual(removed, {"change": "removed", "key": "/b/",
+                                   "previous_fingerprint": self.previous["/b/"]["fingerprint"]})
+
+    def test_failed_run_leaves_no_delta(self):
+        with tempfile.TemporaryDirectory() as directory:
+            delta_path = os.path.join(directory, "delta.ndjson")
+            with self.assertRaises(OSError):
+                with DeltaSink(delta_path, os.path.join(directory, "snapshot.ndjson")) as sink:
+                    sink.write({"company_details_path": "/a/", "title": "A"})
+                    raise OSError("Connection reset")
+            self.assertEqual(os.listdir(directory), [])
+
+
+class TestDeltaOutput(unittest.TestCase):
+    def setUp(self):
+        listings, details, blobs = synthetic_data(20, 100)
+        self.site = StandInSite(listings, details, blobs=blobs)
+        self.base_url = self.site.start_in_thread()
+        self.directory = tempfile.TemporaryDirectory()
+        self.environment = mock.patch.dict(os.environ, {"STORAGE_EMULATOR_HOST": self.base_url})
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+        self.site.stop()
+        self.directory.cleanup()
+
+    def run_main(self, name, *arguments):
+        output_dir = os.path.join(self.directory.name, name)
+        run(parse_args(["--base-url", self.base_url, "--no-cache", "--no-http-cache", "--max-retries", "0",
+                        "--enrichment-store", os.path.join(self.directory.name, "enrichment.sqlite3"),
+                        "--snapshot", os.path.join(self.directory.name, "snapshot.ndjson"),
+                        "--output-dir", output_dir, "--delta", *arguments]))
+        path, = glob.glob(os.path.join(output_dir, "delta_*.ndjson"))
+        with open(path, encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+
+    def test_only_changes_are_written(self):
+        first = self.run_main("first")
+        self.assertEqual(len(first), 20)
+        self.assertTrue(all(change["change"] == "added" for change in first))
+
+        # The same companies streamed give the same fingerprints, nothing changed
+        self.assertEqual(self.run_main("unchanged", "--stream", "--delta-only"), [])
+        self.assertEqual(glob.glob(os.path.join(self.directory.name, "unchanged", "result_*")), [])
+
+        listing = self.site.pages["/page-data/current-portfolio/page-data.json"]["result"]["data"]
+        listing["allSanityCompanyPage"]["nodes"] = [node for node in listing["allSanityCompanyPage"]["nodes"]
+                                                    if node["title"] != "Company 5"]
+        details = self.site.pages["/page-data/current-portfolio/company-2/page-data.json"]["result"]["data"]
+        details["sanityCompanyPage"]["website"] = "https://www.company-two.com/"
+        changes = {change["key"]: change for change in self.run_main("changed")}
+
+        self.assertEqual(set(changes), {"/current-portfolio/company-5/", "/current-portfolio/company-2/"})
+        self.assertEqual(changes["/current-portfolio/company-5/"]["change"], "removed")
+        changed = changes["/current-portfolio/company-2/"]
+        self.assertEqual(changed["change"], "changed")
+        self.assertEqual(changed["fields"]["website"], "https://www.company-two.com/")
+        self.assertNotIn("title", changed["fields"])
+
+
+if __name__ == '__main__':
+    unittest.main()
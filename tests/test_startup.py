@@ -0,0 +1,84 @@
+import glob
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src import main
+from src.enrichment_store import STORE_PATH
+from src.fuzzy_matching import MATCH_THRESHOLD
+from src.service import REFRESH_INTERVAL_MINUTES, SCRAPE_INTERVAL_MINUTES
+from tests.importtime import HEAVY_MODULES, run_with_importtime
+from tests.standin_server import StandInSite
+from tests.synthetic_data import synthetic_data
+
+
+class TestStartup(unittest.TestCase):
+    def test_help_imports_no_heavy_modules(self):
+        # How long the imports take is measured by benchmarks/bench_startup.py, outside the unit tests
+        process, imports = run_with_importtime("--help")
+        self.assertEqual(process.returncode, 0)
+        self.assertIn("scrape", process.stdout)
+        self.assertEqual(HEAVY_MODULES & set(imports), set())
+
+    def test_repeated_defaults(self):
+        self.assertEqual(main.STORE_PATH, STORE_PATH)
+        self.assertEqual(main.MATCH_THRESHOLD, MATCH_THRESHOLD)
+        self.assertEqual(main.SCRAPE_INTERVAL_MINUTES, SCRAPE_INTERVAL_MINUTES)
+        self.assertEqual(main.REFRESH_INTERVAL_MINUTES, REFRESH_INTERVAL_MINUTES)
+
+    def test_arguments_without_command_run_full(self):
+        args = main.parse_args(["--skip-funding-rounds"])
+        self.assertEqual(args.command, "full")
+        self.assertTrue(args.skip_funding_rounds)
+        self.assertEqual(args.output_format, "json")
+        self.assertEqual(main.parse_args(["--stream"]).output_format, "ndjson")
+        self.assertEqual(main.parse_args(["scrape"]).output_format, "ndjson")
+        with self.assertRaises(SystemExit):
+            main.parse_args(["scrape", "--skip-funding-rounds"])
+
+
+class TestCommands(unittest.TestCase):
+    def setUp(self):
+        listings, details, blobs = synthetic_data(20, 100)
+        self.site = StandInSite(listings, details, blobs=blobs)
+        self.base_url = self.site.start_in_thread()
+        self.directory = tempfile.TemporaryDirectory()
+        self.environment = mock.patch.dict(os.environ, {"STORAGE_EMULATOR_HOST": self.base_url})
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+        self.site.stop()
+        self.directory.cleanup()
+
+    def read_output(self, name, pattern):
+        path, = glob.glob(os.path.join(self.directory.name, name, pattern))
+        with open(path, encoding="utf-8") as file:
+            return path, [json.loads(line) for line in file]
+
+    def test_scrape_then_enrich_is_the_same_as_full(self):
+        process, imports = run_with_importtime(
+            "scrape", "--base-url", self.base_url, "--no-http-cache", "--max-retries", "0",
+            "--output-dir", os.path.join(self.directory.name, "scraped"),
+            "--checkpoint-dir", os.path.join(self.directory.name, "checkpoint"))
+        self.assertEqual(process.returncode, 0, process.stderr[-2000:])
+        self.assertEqual(HEAVY_MODULES & set(imports), {"aiohttp"})
+        scraped_path, scraped = self.read_output("scraped", "scraped_*.ndjson")
+        self.assertEqual(len(scraped), 20)
+
+        enrichment_arguments = ["--no-cache", "--enrichment-store", os.path.join(self.directory.name, "enrichment.db"),
+                                "--checkpoint-dir", os.path.join(self.directory.name, "checkpoint"),
+                                "--output-format", "ndjson"]
+        main.run(main.parse_args(["enrich", "--input", scraped_path, *enrichment_arguments,
+                                  "--output-dir", os.path.join(self.directory.name, "enriched")]))
+        main.run(main.parse_args(["full", "--base-url", self.base_url, "--no-http-cache", *enrichment_arguments,
+                                  "--output-dir", os.path.join(self.directory.name, "full")]))
+        _, enriched = self.read_output("enriched", "result_*.ndjson")
+        _, full = self.read_output("full", "result_*.ndjson")
+        self.assertEqual(enriched, full)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import glob
+import json
+import math
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.main import parse_args, run
+from src.page_data.page_data_async import HttpClient, iter_company_data, open_session
+from tests.standin_server import StandInSite
+from tests.synthetic_data import synthetic_data
+
+
+def read_records(directory, name):
+    path, = glob.glob(os.path.join(directory, f"{name}.ndjson"))
+    with open(path, encoding="utf-8") as file:
+        return sorted((json.loads(line) for line in file), key=lambda record: record["company_details_path"])
+
+
+def same_values(first, second):
+    # pandas writes floats with 10 decimals, the streamed records keep every digit
+    if isinstance(first, dict) and isinstance(second, dict):
+        return list(first) == list(second) and all(same_values(first[key], second[key]) for key in first)
+    if isinstance(first, list) and isinstance(second, list):
+        return len(first) == len(second) and all(same_values(a, b) for a, b in zip(first, second))
+    if isinstance(first, float) and isinstance(second, float):
+        return math.isclose(first, second, rel_tol=1e-9, abs_tol=1e-9)
+    return first == second
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        listings, details, blobs = synthetic_data(30, 200)
+        # One company never gets its details
+        self.site = StandInSite(listings, details, blobs=blobs,
+                                failures={"/page-data/current-portfolio/company-1/page-data.json": 10})
+        self.base_url = self.site.start_in_thread()
+        self.directory = tempfile.TemporaryDirectory()
+        self.environment = mock.patch.dict(os.environ, {"STORAGE_EMULATOR_HOST": self.base_url})
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+        self.site.stop()
+        self.directory.cleanup()
+
+    def run_main(self, name, *arguments):
+        run(parse_args(["--base-url", self.base_url, "--no-cache", "--no-http-cache", "--max-retries", "0",
+                        "--enrichment-store", os.path.join(self.directory.name, "enrichment.sqlite3"),
+                        "--output-dir", self.directory.name, "--output-filename", name, "--output-format", "ndjson",
+                        *arguments]))
+        return read_records(self.directory.name, name)
+
+    def test_stream_matches_batch(self):
+        batch = self.run_main("batch")
+        stream = self.run_main("stream", "--stream")
+        self.assertEqual(len(stream), 30)
+        self.assertTrue(same_values(stream, batch))
+        self.assertIsNone(stream[1]["description"])
+
+    def test_stream_matches_batch_without_store(self):
+        batch = self.run_main("batch", "--no-enrichment-store", "--fuzzy-matching")
+        stream = self.run_main("stream", "--no-enrichment-store", "--fuzzy-matching", "--stream")
+        self.assertTrue(same_values(stream, batch))
+        self.assertIn("match_confidence", stream[0])
+
+    def test_stream_only_works_with_async_page_data(self):
+        with mock.patch("sys.stderr"), self.assertRaises(SystemExit):
+            parse_args(["--stream", "--synchronous"])
+        with mock.patch("sys.stderr"), self.assertRaises(SystemExit):
+            parse_args(["--stream", "--output-format", "parquet"])
+
+
+class TestIterCompanyData(unittest.TestCase):
+    def test_pending_companies_are_bounded(self):
+        listings, details, _ = synthetic_data(40, 0)
+        site = StandInSite(listings, details, delay=0.01)
+        base_url = site.start_in_thread()
+
+        async def collect():
+            async with open_session() as session:
+                client = HttpClient(session, max_concurrent_requests=100)
+                companies = [company for nodes in listings.values() for company in nodes]
+                return [company async for company in iter_company_data(client, companies, base_url, max_pending=5)]
+
+        try:
+            company_data = asyncio.run(collect())
+        finally:
+            site.stop()
+        self.assertEqual(len(company_data), 40)
+        self.assertLessEqual(site.max_in_flight, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()